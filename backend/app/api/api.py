@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 from app.api.endpoints import (
+    admin,
     ai,
     billing,
     bundles,
@@ -32,3 +33,4 @@ api_router.include_router(reorder.router, tags=["reorder"])
 api_router.include_router(team.router, prefix="/team", tags=["team"])
 api_router.include_router(billing.router, tags=["billing"])
 api_router.include_router(unit_sizes.router, tags=["unit-sizes"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
@@ -4,6 +4,7 @@ from typing import Any, cast
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from app.core.config import settings
 from app.core.supabase import get_supabase
 
 
@@ -243,3 +244,19 @@ def get_current_user_context(
         owner_id=owner_id,
         allowed_location_ids=allowed_location_ids,
     )
+
+
+def require_admin(current_user=Depends(get_current_user)):
+    """Allow only users listed in ADMIN_EMAILS (operator endpoints)."""
+    admin_emails = {
+        email.strip().lower()
+        for email in settings.ADMIN_EMAILS.split(",")
+        if email.strip()
+    }
+    email = (getattr(current_user, "email", None) or "").lower()
+    if not email or email not in admin_emails:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return current_user
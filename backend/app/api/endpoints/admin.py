@@ -0,0 +1,37 @@
+"""
+Admin Endpoints - operator views on Gemini usage.
+
+Restricted to users listed in ADMIN_EMAILS.
+"""
+
+from fastapi import APIRouter, Depends, Query
+
+from app.api.deps import require_admin
+from app.core.gemini_usage import get_usage_registry
+
+router = APIRouter()
+
+
+@router.get("/gemini-usage")
+def get_gemini_usage(
+    top_tenants: int = Query(20, ge=1, le=500),
+    recent: int = Query(0, ge=0, le=200),
+    _admin=Depends(require_admin),
+):
+    """
+    Token, latency and cost aggregates since process start.
+
+    Per worker process - with several workers, enable GEMINI_USAGE_PERSIST
+    and query the gemini_usage table for fleet-wide numbers.
+    """
+    registry = get_usage_registry()
+    snapshot = registry.snapshot(top_tenants=top_tenants)
+    if recent:
+        snapshot["recent"] = registry.recent(limit=recent)
+    return snapshot
+
+
+@router.get("/gemini-usage/{tenant_id}")
+def get_tenant_gemini_usage(tenant_id: str, _admin=Depends(require_admin)):
+    """Aggregates and recent calls for a single tenant (owner user id)."""
+    return get_usage_registry().tenant_snapshot(tenant_id)
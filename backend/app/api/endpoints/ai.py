@@ -1,4 +1,3 @@
-import base64
 import logging
 
 from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, status
@@ -7,23 +6,18 @@ from app.api.deps import get_current_user
 from app.core.gemini import GeminiError
 from app.core.supabase import get_supabase
 from app.services.product_recognition import (
-    recognize_product,
-    recognize_multiple_products,
+    arecognize_product,
+    arecognize_multiple_products,
 )
-from app.services.invoice_extraction import extract_invoice
-from app.utils.query_helpers import escape_like_pattern
+from app.services.category_cache import get_system_categories
+from app.services.invoice_extraction import aextract_invoice
+from app.services.product_catalog import catalog_upsert, get_product_catalog
+from app.utils.payload_helpers import decode_base64_payload
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-def _strip_data_prefix(value: str) -> str:
-    """Strip data URL prefix from base64 string."""
-    if "," in value:
-        return value.split(",", 1)[1]
-    return value
-
-
 @router.post("/ai/recognize-product")
 async def recognize_product_endpoint(
     request: Request,
@@ -32,36 +26,32 @@ async def recognize_product_endpoint(
 ):
     """Recognize a single product from an image using AI."""
     supabase = get_supabase()
-    image_base64: str | None = None
+    image_bytes: bytes | None = None
     save_if_new = False
 
     if image is not None:
         image_bytes = await image.read()
-        image_base64 = base64.b64encode(image_bytes).decode("utf-8")
         form = await request.form()
         save_if_new = str(form.get("save_if_new", "false")).lower() == "true"
         mime_type = image.content_type or "image/jpeg"
     else:
         payload = await request.json()
-        image_base64 = payload.get("image")
+        image_bytes = decode_base64_payload(payload.get("image"))
         save_if_new = bool(payload.get("save_if_new", False))
         mime_type = payload.get("mime_type", "image/jpeg")
 
-    if not image_base64:
+    if not image_bytes:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Image is required",
         )
 
-    image_base64 = _strip_data_prefix(image_base64)
-
-    categories_resp = (
-        supabase.table("categories").select("name").eq("is_system", True).execute()
-    )
-    categories = [row["name"] for row in categories_resp.data or []]
+    categories = get_system_categories(supabase)
 
     try:
-        recognition = recognize_product(image_base64, categories, mime_type=mime_type)
+        recognition = await arecognize_product(
+            image_bytes, categories, mime_type=mime_type, tenant_id=current_user.id
+        )
     except GeminiError as e:
         logger.error(f"AI recognition failed: {e}")
         raise HTTPException(
@@ -70,34 +60,14 @@ async def recognize_product_endpoint(
         ) from e
 
     existing_match = None
-    is_new = True
-
+    catalog = get_product_catalog(current_user.id, supabase)
     if recognition.barcode:
-        existing = (
-            supabase.table("products")
-            .select("*")
-            .eq("user_id", current_user.id)
-            .eq("barcode", recognition.barcode)
-            .limit(1)
-            .execute()
-        )
-        if existing.data:
-            existing_match = existing.data[0]
-            is_new = False
-
+        existing_match = catalog.find_by_barcodes([recognition.barcode])
     if existing_match is None:
-        query = (
-            supabase.table("products")
-            .select("*")
-            .eq("user_id", current_user.id)
-            .ilike("name", escape_like_pattern(recognition.product_name))
+        existing_match = catalog.find_by_name(
+            recognition.product_name, recognition.brand
         )
-        if recognition.brand:
-            query = query.ilike("brand", escape_like_pattern(recognition.brand))
-        response = query.limit(1).execute()
-        if response.data:
-            existing_match = response.data[0]
-            is_new = False
+    is_new = existing_match is None
 
     saved_product = None
     if save_if_new and is_new:
@@ -119,6 +89,8 @@ async def recognize_product_endpoint(
             .execute()
         )
         saved_product = insert_resp.data[0] if insert_resp.data else None
+        if saved_product:
+            catalog_upsert(current_user.id, [saved_product])
         existing_match = saved_product
         is_new = saved_product is not None
 
@@ -137,33 +109,27 @@ async def recognize_multiple_endpoint(
 ):
     """Recognize multiple products from an image (e.g., shelf scan)."""
     supabase = get_supabase()
-    image_base64: str | None = None
+    image_bytes: bytes | None = None
 
     if image is not None:
         image_bytes = await image.read()
-        image_base64 = base64.b64encode(image_bytes).decode("utf-8")
         mime_type = image.content_type or "image/jpeg"
     else:
         payload = await request.json()
-        image_base64 = payload.get("image")
+        image_bytes = decode_base64_payload(payload.get("image"))
         mime_type = payload.get("mime_type", "image/jpeg")
 
-    if not image_base64:
+    if not image_bytes:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Image is required",
         )
 
-    image_base64 = _strip_data_prefix(image_base64)
-
-    categories_resp = (
-        supabase.table("categories").select("name").eq("is_system", True).execute()
-    )
-    categories = [row["name"] for row in categories_resp.data or []]
+    categories = get_system_categories(supabase)
 
     try:
-        products = recognize_multiple_products(
-            image_base64, categories, mime_type=mime_type
+        products = await arecognize_multiple_products(
+            image_bytes, categories, mime_type=mime_type, tenant_id=current_user.id
         )
     except GeminiError as e:
         logger.error(f"AI multi-recognition failed: {e}")
@@ -182,28 +148,27 @@ async def extract_invoice_endpoint(
     current_user=Depends(get_current_user),
 ):
     """Extract invoice data from a PDF or image using AI."""
-    file_base64: str | None = None
+    file_bytes: bytes | None = None
     mime_type = "application/pdf"
 
     if file is not None:
         file_bytes = await file.read()
-        file_base64 = base64.b64encode(file_bytes).decode("utf-8")
         mime_type = file.content_type or mime_type
     else:
         payload = await request.json()
-        file_base64 = payload.get("file")
+        file_bytes = decode_base64_payload(payload.get("file"))
         mime_type = payload.get("mime_type", mime_type)
 
-    if not file_base64:
+    if not file_bytes:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="File is required",
         )
 
-    file_base64 = _strip_data_prefix(file_base64)
-
     try:
-        extraction = extract_invoice(file_base64, mime_type=mime_type)
+        extraction = await aextract_invoice(
+            file_bytes, mime_type=mime_type, tenant_id=current_user.id
+        )
     except GeminiError as e:
         logger.error(f"AI invoice extraction failed: {e}")
         raise HTTPException(
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from app.api.deps import UserContext, get_current_user_context
 from app.core.supabase import get_supabase
 from app.schemas.category import CategoryCreate, CategoryOut
+from app.services.category_cache import invalidate_category_cache
 
 router = APIRouter()
 
@@ -54,4 +55,5 @@ def create_category(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Category creation failed",
         )
+    invalidate_category_cache()
     return data
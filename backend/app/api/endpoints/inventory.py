@@ -14,6 +14,7 @@ from app.schemas.inventory import (
     InventorySessionOut,
     InventorySessionUpdate,
 )
+from app.services.recognition_memory import get_recognition_memory
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +46,17 @@ def _log_inventory_action(
         logger.warning(f"Failed to write inventory audit log: {exc}")
 
 
+def _confirm_scan(
+    supabase, tenant_id: str, scan_id: str | None, product_id: str
+) -> None:
+    """The user counted the scanned product - teach the recognition memory."""
+    if not scan_id:
+        return
+    memory = get_recognition_memory()
+    if memory is not None:
+        memory.confirm(tenant_id, scan_id, product_id, supabase)
+
+
 def _recalculate_totals(supabase, session_id: str):
     items = (
         supabase.table("inventory_items")
@@ -718,16 +730,19 @@ def add_session_item(
 
     total_qty = full_qty + partial_qty
 
+    product = (
+        supabase.table("products")
+        .select("id, last_price")
+        .eq("id", payload.product_id)
+        .eq("user_id", current_user.effective_owner_id)
+        .execute()
+    )
+    # Only the tenant's own products may be learned for a scan
+    scan_id = payload.scan_id if product.data else None
+
     # Get unit_price from product if not provided
     unit_price = payload.unit_price
     if unit_price is None:
-        product = (
-            supabase.table("products")
-            .select("last_price")
-            .eq("id", payload.product_id)
-            .eq("user_id", current_user.effective_owner_id)
-            .execute()
-        )
         unit_price = product.data[0]["last_price"] if product.data else 0
 
     # Check for existing item in session (duplicate handling)
@@ -782,6 +797,12 @@ def add_session_item(
                     before_data=existing_item,
                     after_data=update_resp.data[0],
                 )
+                _confirm_scan(
+                    supabase,
+                    current_user.effective_owner_id,
+                    scan_id,
+                    payload.product_id,
+                )
             _recalculate_totals(supabase, session_id)
             return update_resp.data[0]
 
@@ -814,6 +835,12 @@ def add_session_item(
                     before_data=existing_item,
                     after_data=update_resp.data[0],
                 )
+                _confirm_scan(
+                    supabase,
+                    current_user.effective_owner_id,
+                    scan_id,
+                    payload.product_id,
+                )
             _recalculate_totals(supabase, session_id)
             return update_resp.data[0]
 
@@ -860,6 +887,9 @@ def add_session_item(
         before_data=None,
         after_data=data,
     )
+    _confirm_scan(
+        supabase, current_user.effective_owner_id, scan_id, payload.product_id
+    )
 
     _recalculate_totals(supabase, session_id)
     return data
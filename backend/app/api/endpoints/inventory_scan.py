@@ -3,27 +3,67 @@ Inventory Scan Endpoints - KI-powered product scanning for inventory sessions.
 
 Provides endpoints for:
 - Single product scan (photo → recognize → add to session)
-- Shelf scan (photo → recognize multiple → batch add)
+- Shelf scan (photo → recognize multiple → batch add), also streamed
+- Batch scan (many photos → recognized concurrently → streamed per photo)
 """
 
-import base64
+import asyncio
 import logging
-from typing import Any, cast
-
-from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, status
+import threading
+from typing import Any, AsyncIterator, cast
+
+import anyio
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Form,
+    HTTPException,
+    Request,
+    UploadFile,
+    status,
+)
+from fastapi.responses import StreamingResponse
 
 from app.api.deps import UserContext, get_current_user_context
+from app.core.config import settings
 from app.core.gemini import GeminiError
 from app.core.supabase import get_supabase
 from app.services.product_recognition import (
-    recognize_product,
-    recognize_multiple_products,
+    arecognize_product,
+    arecognize_shelf,
+    astream_shelf,
+)
+from app.schemas.gemini_responses import ProductRecognitionResponse
+from app.schemas.inventory import (
+    BatchScanItem,
+    ScanResult,
+    ShelfScanResult,
+    ShelfScanStreamItem,
+)
+from app.services.barcode_decoder import (
+    barcode_candidates,
+    decode_barcodes,
+    record_fast_path_hit,
 )
-from app.schemas.inventory import ScanResult, ShelfScanResult
+from app.services.category_cache import (
+    get_system_categories,
+    get_system_category_name,
+)
+from app.services.image_preprocessing import NormalizedImage, normalize_image
+from app.services.product_catalog import catalog_upsert, get_product_catalog
+from app.services.recognition_cache import image_fingerprint
+from app.services.recognition_memory import get_recognition_memory
+from app.services.shelf_tiling import TileTiming
+from app.utils.payload_helpers import decode_base64_payload
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# An identical photo hash is strong evidence, not proof (similar labels
+# can share one) - reported below the barcode path's 1.0
+REMEMBERED_PHOTO_CONFIDENCE = 0.9
+
 
 def _verify_scan_session_access(
     supabase, session_id: str, current_user: UserContext
@@ -74,43 +114,110 @@ def _verify_scan_session_access(
     return session
 
 
-def _strip_data_prefix(value: str) -> str:
-    """Strip data URL prefix from base64 string."""
-    if "," in value:
-        return value.split(",", 1)[1]
-    return value
+def _find_remembered_product(
+    supabase,
+    user_id: str,
+    fingerprint: int | None = None,
+    recognition: ProductRecognitionResponse | None = None,
+) -> dict[str, Any] | None:
+    """Product the user confirmed for this photo or reading before."""
+    memory = get_recognition_memory()
+    if memory is None:
+        return None
+
+    if recognition is not None:
+        product_id = memory.find_by_label(user_id, recognition, supabase)
+    else:
+        product_id = memory.find_by_image(user_id, fingerprint, supabase)
+    if not product_id:
+        return None
+
+    product = get_product_catalog(user_id, supabase).get(product_id)
+    if product is None:
+        memory.forget_product(user_id, product_id)
+    return product
+
+
+def _remember_scan(
+    user_id: str,
+    fingerprint: int | None,
+    recognition: ProductRecognitionResponse | None,
+) -> str | None:
+    """scan_id the client passes back to add_session_item to teach memory."""
+    memory = get_recognition_memory()
+    if memory is None:
+        return None
+    return memory.remember_scan(user_id, fingerprint, recognition)
 
 
 def _find_existing_product(supabase, user_id: str, recognition) -> dict | None:
-    """Find existing product by barcode or name match."""
+    """Find existing product by barcode, confirmed reading or name match."""
+    catalog = get_product_catalog(user_id, supabase)
+
     # First try barcode match (most accurate) - normalize case
     if recognition.barcode:
-        existing = (
-            supabase.table("products")
-            .select("*")
-            .eq("user_id", user_id)
-            .eq("barcode", recognition.barcode.upper())
-            .limit(1)
-            .execute()
-        )
-        if existing.data:
-            return existing.data[0]
+        existing = catalog.find_by_barcodes([recognition.barcode.upper()])
+        if existing:
+            return existing
+
+    # Same brand/name/size was confirmed in an earlier inventory
+    remembered = _find_remembered_product(supabase, user_id, recognition=recognition)
+    if remembered:
+        return remembered
 
     # Then try name + brand match (case-insensitive)
-    query = (
-        supabase.table("products")
-        .select("*")
-        .eq("user_id", user_id)
-        .ilike("name", f"%{recognition.product_name}%")
-    )
-    if recognition.brand:
-        query = query.ilike("brand", f"%{recognition.brand}%")
-    response = query.limit(1).execute()
+    return catalog.find_by_name(recognition.product_name, recognition.brand)
 
-    if response.data:
-        return response.data[0]
 
-    return None
+def _prepare_scan_image(
+    image_bytes: bytes, mime_type: str
+) -> tuple[NormalizedImage, list[str], int | None]:
+    """Normalize once; decode barcodes and fingerprint the normalized image."""
+    image = normalize_image(image_bytes, mime_type)
+    return image, decode_barcodes(image.data), image_fingerprint(image.data)
+
+
+def _find_product_by_barcodes(
+    supabase, user_id: str, barcodes: list[str]
+) -> dict[str, Any] | None:
+    """Find a tenant product by any locally decoded barcode."""
+    candidates = [
+        candidate for code in barcodes for candidate in barcode_candidates(code)
+    ]
+    return get_product_catalog(user_id, supabase).find_by_barcodes(candidates)
+
+
+def _recognition_from_product(
+    supabase, product: dict[str, Any], confidence: float = 1.0
+) -> ProductRecognitionResponse:
+    """Describe a known product in the recognition format the app expects."""
+    category = "Unbekannt"
+    category_id = product.get("category_id")
+    system_name = (
+        get_system_category_name(category_id, supabase) if category_id else None
+    )
+    if system_name:
+        category = system_name
+    elif category_id:
+        category_resp = (
+            supabase.table("categories")
+            .select("name")
+            .eq("id", product["category_id"])
+            .limit(1)
+            .execute()
+        )
+        if category_resp.data:
+            category = category_resp.data[0].get("name") or category
+
+    return ProductRecognitionResponse(
+        brand=product.get("brand") or "",
+        product_name=product.get("name") or "",
+        variant=product.get("variant"),
+        size_display=product.get("size"),
+        category=category,
+        confidence=confidence,
+        barcode=product.get("barcode"),
+    )
 
 
 def _check_duplicate_in_session(
@@ -127,35 +234,208 @@ def _check_duplicate_in_session(
     return existing.data[0] if existing.data else None
 
 
+def _product_payload(user_id: str, recognition) -> dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "name": recognition.product_name,
+        "brand": recognition.brand,
+        "variant": recognition.variant,
+        "size": recognition.size_display,
+        "unit": "Stück",
+        "barcode": recognition.barcode,
+        "ai_description": f"{recognition.brand or ''} {recognition.product_name}".strip(),
+        "ai_confidence": recognition.confidence,
+    }
+
+
 def _create_product_from_recognition(
     supabase, user_id: str, recognition
 ) -> dict[str, Any] | None:
     """Auto-create a new product from AI recognition."""
     insert_resp = (
         supabase.table("products")
-        .insert(
-            {
-                "user_id": user_id,
-                "name": recognition.product_name,
-                "brand": recognition.brand,
-                "variant": recognition.variant,
-                "size": recognition.size_display,
-                "unit": "Stück",
-                "barcode": recognition.barcode,
-                "ai_description": f"{recognition.brand or ''} {recognition.product_name}".strip(),
-                "ai_confidence": recognition.confidence,
-            }
-        )
+        .insert(_product_payload(user_id, recognition))
         .execute()
     )
 
     if insert_resp.data and isinstance(insert_resp.data, list) and insert_resp.data:
         if isinstance(insert_resp.data[0], dict):
-            return cast(dict[str, Any], insert_resp.data[0])
+            product = cast(dict[str, Any], insert_resp.data[0])
+            catalog_upsert(user_id, [product])
+            return product
+
+    return None
+
+
+async def _read_scan_image(
+    request: Request, image: UploadFile | None
+) -> tuple[bytes, bool, str]:
+    """Image bytes, auto_create flag and MIME type from upload or base64 JSON."""
+    image_bytes: bytes | None = None
+
+    if image is not None:
+        image_bytes = await image.read()
+        form = await request.form()
+        auto_create = str(form.get("auto_create", "true")).lower() == "true"
+        mime_type = image.content_type or "image/jpeg"
+    else:
+        payload = await request.json()
+        image_bytes = decode_base64_payload(payload.get("image"))
+        auto_create = bool(payload.get("auto_create", True))
+        mime_type = payload.get("mime_type", "image/jpeg")
+
+    if not image_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Image is required",
+        )
+
+    return image_bytes, auto_create, mime_type
+
+
+def _resolve_shelf_recognition(
+    supabase,
+    session_id: str,
+    tenant_user_id: str,
+    recognition: ProductRecognitionResponse,
+    auto_create: bool,
+) -> ScanResult:
+    """Match (or auto-create) one shelf product and check the session."""
+    existing_product = _find_existing_product(supabase, tenant_user_id, recognition)
+    is_new = existing_product is None
+
+    if is_new and auto_create:
+        existing_product = _create_product_from_recognition(
+            supabase, tenant_user_id, recognition
+        )
+        if existing_product:
+            is_new = False
+
+    duplicate_in_session = None
+    if existing_product:
+        duplicate_in_session = _check_duplicate_in_session(
+            supabase, session_id, existing_product["id"]
+        )
+
+    # Check if category needs user confirmation
+    needs_category = recognition.category == "Unbekannt" or recognition.confidence < 0.8
+
+    return ScanResult(
+        recognized_product=recognition.model_dump(),
+        matched_product=existing_product,
+        is_new=is_new,
+        duplicate_in_session=duplicate_in_session,
+        suggested_quantity=None,  # User enters manually
+        needs_category=needs_category,
+        scan_id=_remember_scan(tenant_user_id, None, recognition),
+    )
+
+
+def _match_loaded_product(
+    products: list[dict[str, Any]], recognition: ProductRecognitionResponse
+) -> dict[str, Any] | None:
+    """_find_existing_product() over rows not inserted yet (no catalog)."""
+    if recognition.barcode:
+        barcode = recognition.barcode.upper()
+        for product in products:
+            if product.get("barcode") == barcode:
+                return product
+
+    name = recognition.product_name.lower()
+    brand = (recognition.brand or "").lower()
+    for product in products:
+        if name not in (product.get("name") or "").lower():
+            continue
+        if brand and brand not in (product.get("brand") or "").lower():
+            continue
+        return product
 
     return None
 
 
+def _resolve_shelf_recognitions(
+    supabase,
+    session_id: str,
+    tenant_user_id: str,
+    recognitions: list[ProductRecognitionResponse],
+    auto_create: bool,
+) -> list[ScanResult]:
+    """
+    Bulk variant of _resolve_shelf_recognition() for a whole shelf.
+
+    Products are matched in the product catalog; new products are created
+    with one insert and session duplicates fetched with one query, instead
+    of 3-4 queries per product.
+    """
+    if not recognitions:
+        return []
+
+    matches: list[dict[str, Any] | None] = [
+        _find_existing_product(supabase, tenant_user_id, recognition)
+        for recognition in recognitions
+    ]
+
+    if auto_create:
+        # New products matching an earlier new one on this shelf share its row
+        pending: list[dict[str, Any]] = []
+        pending_index: dict[int, int] = {}
+        for index, recognition in enumerate(recognitions):
+            if matches[index] is not None:
+                continue
+            earlier = _match_loaded_product(pending, recognition)
+            if earlier is not None:
+                pending_index[index] = pending.index(earlier)
+                continue
+            pending_index[index] = len(pending)
+            pending.append(_product_payload(tenant_user_id, recognition))
+
+        if pending:
+            insert_resp = supabase.table("products").insert(pending).execute()
+            created = [
+                cast(dict[str, Any], row)
+                for row in insert_resp.data or []
+                if isinstance(row, dict)
+            ]
+            catalog_upsert(tenant_user_id, created)
+            if len(created) == len(pending):
+                for index, position in pending_index.items():
+                    matches[index] = created[position]
+                logger.info(f"Auto-created {len(created)} products")
+            else:
+                logger.warning(
+                    f"Bulk product insert returned {len(created)}/{len(pending)} rows"
+                )
+
+    product_ids = sorted({product["id"] for product in matches if product})
+    session_items: dict[str, dict[str, Any]] = {}
+    if product_ids:
+        existing = (
+            supabase.table("inventory_items")
+            .select("*")
+            .eq("session_id", session_id)
+            .in_("product_id", product_ids)
+            .execute()
+        )
+        for row in existing.data or []:
+            if isinstance(row, dict):
+                session_items.setdefault(row["product_id"], row)
+
+    return [
+        ScanResult(
+            recognized_product=recognition.model_dump(),
+            matched_product=product,
+            is_new=product is None,
+            duplicate_in_session=session_items.get(product["id"]) if product else None,
+            suggested_quantity=None,  # User enters manually
+            needs_category=(
+                recognition.category == "Unbekannt" or recognition.confidence < 0.8
+            ),
+            scan_id=_remember_scan(tenant_user_id, None, recognition),
+        )
+        for recognition, product in zip(recognitions, matches)
+    ]
+
+
 @router.post("/inventory/sessions/{session_id}/scan", response_model=ScanResult)
 async def scan_for_inventory(
     session_id: str,
@@ -168,56 +448,76 @@ async def scan_for_inventory(
 
     Flow:
     1. Receive image (file upload or base64)
-    2. Send to Gemini for product recognition
-    3. Check if product exists in user's database
-    4. If not found and auto_create=true, create new product
-    5. Check if product already in this session (duplicate warning)
-    6. Return scan result with all info for frontend
+    2. Decode barcode locally - known product returns without Gemini
+    3. Photo confirmed in an earlier inventory returns without Gemini
+    4. Send to Gemini for product recognition
+    5. Check if product exists in user's database
+    6. If not found and auto_create=true, create new product
+    7. Check if product already in this session (duplicate warning)
+    8. Return scan result with all info for frontend
 
     The frontend then shows the result and lets user enter quantity.
+    Passing the result's scan_id to add_session_item teaches the
+    recognition memory which product the photo showed.
     """
     supabase = get_supabase()
 
     _verify_scan_session_access(supabase, session_id, current_user)
+    tenant_user_id = current_user.effective_owner_id
 
     # Get image from request
-    image_base64: str | None = None
-    auto_create = False
+    image_bytes, auto_create, mime_type = await _read_scan_image(request, image)
 
-    if image is not None:
-        image_bytes = await image.read()
-        image_base64 = base64.b64encode(image_bytes).decode("utf-8")
-        form = await request.form()
-        auto_create = str(form.get("auto_create", "true")).lower() == "true"
-        mime_type = image.content_type or "image/jpeg"
-    else:
-        payload = await request.json()
-        image_base64 = payload.get("image")
-        auto_create = bool(payload.get("auto_create", True))
-        mime_type = payload.get("mime_type", "image/jpeg")
+    # Normalize once - barcode decoder, memory and Gemini share the result
+    normalized, barcodes, fingerprint = await anyio.to_thread.run_sync(
+        _prepare_scan_image, image_bytes, mime_type
+    )
 
-    if not image_base64:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Image is required",
+    # Fast path: locally decoded barcode of a known product, no model call
+    known_product = None
+    confidence = 1.0
+    if barcodes:
+        known_product = _find_product_by_barcodes(supabase, tenant_user_id, barcodes)
+        if known_product:
+            record_fast_path_hit()
+            logger.info(f"Barcode fast path hit: {known_product['id']}")
+
+    # Fast path: this photo was confirmed in an earlier inventory
+    if known_product is None:
+        known_product = _find_remembered_product(
+            supabase, tenant_user_id, fingerprint=fingerprint
+        )
+        confidence = REMEMBERED_PHOTO_CONFIDENCE
+        if known_product:
+            logger.info(f"Recognition memory hit: {known_product['id']}")
+
+    if known_product:
+        return ScanResult(
+            recognized_product=_recognition_from_product(
+                supabase, known_product, confidence
+            ).model_dump(),
+            matched_product=known_product,
+            is_new=False,
+            duplicate_in_session=_check_duplicate_in_session(
+                supabase, session_id, known_product["id"]
+            ),
+            suggested_quantity=None,
+            needs_category=False,
+            scan_id=_remember_scan(tenant_user_id, fingerprint, None),
         )
-
-    image_base64 = _strip_data_prefix(image_base64)
 
     # Get categories for recognition
-    categories_resp = (
-        supabase.table("categories").select("name").eq("is_system", True).execute()
-    )
-    categories_data = categories_resp.data or []
-    categories = [
-        cast(str, row["name"])
-        for row in categories_data
-        if isinstance(row, dict) and isinstance(row.get("name"), str)
-    ]
+    categories = get_system_categories(supabase)
 
     # Call Gemini for product recognition
     try:
-        recognition = recognize_product(image_base64, categories, mime_type=mime_type)
+        recognition = await arecognize_product(
+            normalized.data,
+            categories,
+            mime_type=normalized.mime_type,
+            tenant_id=tenant_user_id,
+            preprocessed=True,
+        )
     except GeminiError as e:
         logger.error(f"AI recognition failed: {e}")
         raise HTTPException(
@@ -225,7 +525,9 @@ async def scan_for_inventory(
             detail=f"KI-Service nicht erreichbar. Bitte erneut versuchen.",
         ) from e
 
-    tenant_user_id = current_user.effective_owner_id
+    # A locally decoded barcode is more reliable than the model's reading
+    if barcodes and recognition.barcode not in barcodes:
+        recognition.barcode = barcodes[0]
 
     # Check if product exists in user's database
     existing_product = _find_existing_product(supabase, tenant_user_id, recognition)
@@ -257,6 +559,7 @@ async def scan_for_inventory(
         duplicate_in_session=duplicate_in_session,
         suggested_quantity=None,  # User enters manually
         needs_category=needs_category,
+        scan_id=_remember_scan(tenant_user_id, fingerprint, recognition),
     )
 
 
@@ -274,8 +577,9 @@ async def scan_shelf_for_inventory(
 
     Flow:
     1. Receive image of shelf
-    2. Send to Gemini for multi-product recognition (with quantity estimation)
-    3. For each recognized product:
+    2. Send to Gemini for multi-product recognition (with quantity estimation);
+       large photos are recognized as parallel tiles and merged
+    3. For all recognized products at once (a handful of queries in total):
        - Check if exists in database
        - Auto-create if requested
        - Check for duplicates in session
@@ -290,44 +594,15 @@ async def scan_shelf_for_inventory(
     tenant_user_id = current_user.effective_owner_id
 
     # Get image
-    image_base64: str | None = None
-    auto_create = True
-
-    if image is not None:
-        image_bytes = await image.read()
-        image_base64 = base64.b64encode(image_bytes).decode("utf-8")
-        form = await request.form()
-        auto_create = str(form.get("auto_create", "true")).lower() == "true"
-        mime_type = image.content_type or "image/jpeg"
-    else:
-        payload = await request.json()
-        image_base64 = payload.get("image")
-        auto_create = bool(payload.get("auto_create", True))
-        mime_type = payload.get("mime_type", "image/jpeg")
-
-    if not image_base64:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Image is required",
-        )
-
-    image_base64 = _strip_data_prefix(image_base64)
+    image_bytes, auto_create, mime_type = await _read_scan_image(request, image)
 
     # Get categories
-    categories_resp = (
-        supabase.table("categories").select("name").eq("is_system", True).execute()
-    )
-    categories_data = categories_resp.data or []
-    categories = [
-        cast(str, row["name"])
-        for row in categories_data
-        if isinstance(row, dict) and isinstance(row.get("name"), str)
-    ]
+    categories = get_system_categories(supabase)
 
     # Call Gemini for multi-product recognition
     try:
-        products = recognize_multiple_products(
-            image_base64, categories, mime_type=mime_type
+        shelf = await arecognize_shelf(
+            image_bytes, categories, mime_type=mime_type, tenant_id=tenant_user_id
         )
     except GeminiError as e:
         logger.error(f"AI shelf scan failed: {e}")
@@ -337,41 +612,347 @@ async def scan_shelf_for_inventory(
         ) from e
 
     # Process each recognized product
-    results: list[ScanResult] = []
-    for recognition in products:
-        existing_product = _find_existing_product(supabase, tenant_user_id, recognition)
-        is_new = existing_product is None
-
-        if is_new and auto_create:
-            existing_product = _create_product_from_recognition(
-                supabase, tenant_user_id, recognition
+    results = _resolve_shelf_recognitions(
+        supabase, session_id, tenant_user_id, shelf.products, auto_create
+    )
+
+    return ShelfScanResult(
+        products=results,
+        total_recognized=len(results),
+        tiles=[timing.as_dict() for timing in shelf.tiles],
+    )
+
+
+async def _stream_shelf_scan(
+    supabase,
+    session_id: str,
+    tenant_user_id: str,
+    image_bytes: bytes,
+    mime_type: str,
+    categories: list[str],
+    auto_create: bool,
+) -> AsyncIterator[str]:
+    tiles: list[TileTiming] = []
+    total = 0
+    error: str | None = None
+    try:
+        async for recognition in astream_shelf(
+            image_bytes,
+            categories,
+            mime_type=mime_type,
+            tenant_id=tenant_user_id,
+            tile_timings=tiles,
+        ):
+            # Supabase calls block - keep the Gemini stream flowing meanwhile
+            result = await anyio.to_thread.run_sync(
+                _resolve_shelf_recognition,
+                supabase,
+                session_id,
+                tenant_user_id,
+                recognition,
+                auto_create,
             )
-            if existing_product:
-                is_new = False
+            total += 1
+            yield ShelfScanStreamItem(product=result).model_dump_json() + "\n"
+    except GeminiError as e:
+        logger.error(f"AI shelf scan stream failed: {e}")
+        error = "KI-Service nicht erreichbar. Bitte erneut versuchen."
 
-        duplicate_in_session = None
-        if existing_product:
-            duplicate_in_session = _check_duplicate_in_session(
-                supabase, session_id, existing_product["id"]
+    yield ShelfScanStreamItem(
+        done=True,
+        total_recognized=total,
+        tiles=[timing.as_dict() for timing in tiles],
+        error=error,
+    ).model_dump_json() + "\n"
+
+
+@router.post("/inventory/sessions/{session_id}/scan-shelf/stream")
+async def scan_shelf_stream_for_inventory(
+    session_id: str,
+    request: Request,
+    image: UploadFile | None = None,
+    current_user: UserContext = Depends(get_current_user_context),
+):
+    """
+    Streaming variant of the shelf scan.
+
+    Accepts the same input as /scan-shelf and responds with NDJSON: one
+    ShelfScanStreamItem per product as soon as it is recognized and
+    resolved, then a final item with done=true, the total and tile
+    timings. A failed scan ends with done=true and error set.
+    """
+    supabase = get_supabase()
+
+    _verify_scan_session_access(supabase, session_id, current_user)
+    tenant_user_id = current_user.effective_owner_id
+
+    image_bytes, auto_create, mime_type = await _read_scan_image(request, image)
+    categories = get_system_categories(supabase)
+
+    return StreamingResponse(
+        _stream_shelf_scan(
+            supabase,
+            session_id,
+            tenant_user_id,
+            image_bytes,
+            mime_type,
+            categories,
+            auto_create,
+        ),
+        media_type="application/x-ndjson",
+    )
+
+
+def _load_session_items(supabase, session_id: str) -> dict[str, dict[str, Any]]:
+    """Items already counted in the session, by product id."""
+    response = (
+        supabase.table("inventory_items")
+        .select("*")
+        .eq("session_id", session_id)
+        .execute()
+    )
+    return {
+        row["product_id"]: cast(dict[str, Any], row)
+        for row in response.data or []
+        if isinstance(row, dict) and row.get("product_id")
+    }
+
+
+class _BatchScanContext:
+    """
+    State loaded once per batch and shared by all of its images.
+
+    Loading and the lookups/creates below are blocking Supabase calls, so
+    they run in worker threads (anyio.to_thread), never on the event loop.
+    """
+
+    def __init__(
+        self,
+        supabase,
+        session_id: str,
+        tenant_user_id: str,
+        auto_create: bool,
+    ):
+        self.supabase = supabase
+        self.tenant_user_id = tenant_user_id
+        self.auto_create = auto_create
+        self.categories = get_system_categories(supabase)
+        self.catalog = get_product_catalog(tenant_user_id, supabase)
+        self.session_items = _load_session_items(supabase, session_id)
+        self.semaphore = asyncio.Semaphore(max(1, settings.SCAN_BATCH_CONCURRENCY))
+        # Concurrent images must not both create the same product
+        self._resolve_lock = threading.Lock()
+
+    def find_known_product(
+        self, barcodes: list[str], fingerprint: int | None
+    ) -> tuple[dict[str, Any] | None, float]:
+        """Barcode fast path, then a photo confirmed in an earlier inventory."""
+        if barcodes:
+            product = _find_product_by_barcodes(
+                self.supabase, self.tenant_user_id, barcodes
+            )
+            if product:
+                record_fast_path_hit()
+                return product, 1.0
+        product = _find_remembered_product(
+            self.supabase, self.tenant_user_id, fingerprint=fingerprint
+        )
+        return product, REMEMBERED_PHOTO_CONFIDENCE
+
+    def known_product_result(
+        self, product: dict[str, Any], fingerprint: int | None, confidence: float
+    ) -> ScanResult:
+        return ScanResult(
+            recognized_product=_recognition_from_product(
+                self.supabase, product, confidence
+            ).model_dump(),
+            matched_product=product,
+            is_new=False,
+            duplicate_in_session=self.session_items.get(product["id"]),
+            suggested_quantity=None,
+            needs_category=False,
+            scan_id=_remember_scan(self.tenant_user_id, fingerprint, None),
+        )
+
+    def resolve(
+        self, recognition: ProductRecognitionResponse, fingerprint: int | None
+    ) -> ScanResult:
+        with self._resolve_lock:
+            product = _find_existing_product(
+                self.supabase, self.tenant_user_id, recognition
             )
+            is_new = product is None
+
+            if is_new and self.auto_create:
+                # Added to the catalog, so later photos match instead of re-creating
+                product = _create_product_from_recognition(
+                    self.supabase, self.tenant_user_id, recognition
+                )
+                if product:
+                    is_new = False
+                    logger.info(f"Auto-created product: {product['id']}")
 
-        # Check if category needs user confirmation
         needs_category = (
             recognition.category == "Unbekannt" or recognition.confidence < 0.8
         )
+        return ScanResult(
+            recognized_product=recognition.model_dump(),
+            matched_product=product,
+            is_new=is_new,
+            duplicate_in_session=(
+                self.session_items.get(product["id"]) if product else None
+            ),
+            suggested_quantity=None,
+            needs_category=needs_category,
+            scan_id=_remember_scan(self.tenant_user_id, fingerprint, recognition),
+        )
+
+
+async def _scan_batch_image(
+    context: _BatchScanContext,
+    index: int,
+    filename: str | None,
+    image_bytes: bytes,
+    mime_type: str,
+) -> BatchScanItem:
+    if not image_bytes:
+        return BatchScanItem(index=index, filename=filename, error="Image is required")
+
+    async with context.semaphore:
+        try:
+            normalized, barcodes, fingerprint = await anyio.to_thread.run_sync(
+                _prepare_scan_image, image_bytes, mime_type
+            )
+
+            known_product, confidence = await anyio.to_thread.run_sync(
+                context.find_known_product, barcodes, fingerprint
+            )
+            if known_product:
+                return BatchScanItem(
+                    index=index,
+                    filename=filename,
+                    result=await anyio.to_thread.run_sync(
+                        context.known_product_result,
+                        known_product,
+                        fingerprint,
+                        confidence,
+                    ),
+                )
+
+            recognition = await arecognize_product(
+                normalized.data,
+                context.categories,
+                mime_type=normalized.mime_type,
+                tenant_id=context.tenant_user_id,
+                preprocessed=True,
+            )
+        except GeminiError as e:
+            logger.error(f"AI recognition failed for batch image {index}: {e}")
+            return BatchScanItem(
+                index=index,
+                filename=filename,
+                error="KI-Service nicht erreichbar. Bitte erneut versuchen.",
+            )
+
+    if barcodes and recognition.barcode not in barcodes:
+        recognition.barcode = barcodes[0]
+
+    return BatchScanItem(
+        index=index,
+        filename=filename,
+        result=await anyio.to_thread.run_sync(
+            context.resolve, recognition, fingerprint
+        ),
+    )
+
+
+async def _scan_batch_image_or_error(
+    context: _BatchScanContext,
+    index: int,
+    filename: str | None,
+    image_bytes: bytes,
+    mime_type: str,
+) -> BatchScanItem:
+    """_scan_batch_image(), with any other failure reported for its index."""
+    try:
+        return await _scan_batch_image(
+            context, index, filename, image_bytes, mime_type
+        )
+    except Exception:
+        logger.exception(f"Batch scan image {index} failed")
+        return BatchScanItem(
+            index=index,
+            filename=filename,
+            error="Bild konnte nicht verarbeitet werden.",
+        )
+
 
-        results.append(
-            ScanResult(
-                recognized_product=recognition.model_dump(),
-                matched_product=existing_product,
-                is_new=is_new,
-                duplicate_in_session=duplicate_in_session,
-                suggested_quantity=None,  # User enters manually
-                needs_category=needs_category,
+async def _stream_batch_scan(
+    context: _BatchScanContext, uploads: list[tuple[str | None, bytes, str]]
+) -> AsyncIterator[str]:
+    tasks = [
+        asyncio.create_task(
+            _scan_batch_image_or_error(
+                context, index, filename, image_bytes, mime_type
             )
         )
+        for index, (filename, image_bytes, mime_type) in enumerate(uploads)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            yield item.model_dump_json() + "\n"
+    finally:
+        # Client went away - don't keep spending Gemini calls
+        for task in tasks:
+            task.cancel()
 
-    return ShelfScanResult(
-        products=results,
-        total_recognized=len(results),
+
+@router.post("/inventory/sessions/{session_id}/scan-batch")
+async def scan_batch_for_inventory(
+    session_id: str,
+    images: list[UploadFile] = File(...),
+    auto_create: bool = Form(True),
+    current_user: UserContext = Depends(get_current_user_context),
+):
+    """
+    Scan many product photos of one session in a single request.
+
+    Session access, categories, the tenant's product catalog and the
+    session's items are loaded once. Photos are recognized concurrently
+    (at most SCAN_BATCH_CONCURRENCY at a time) and matched against the
+    catalog in memory.
+
+    Responds with NDJSON: one BatchScanItem per photo, in the order the
+    photos finish. A failed photo yields a line with its index and "error"
+    set.
+    """
+    if len(images) > settings.SCAN_BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.SCAN_BATCH_MAX_IMAGES} images per batch",
+        )
+
+    supabase = get_supabase()
+    _verify_scan_session_access(supabase, session_id, current_user)
+
+    # Read uploads now - the files are closed once the endpoint returns
+    uploads = [
+        (image.filename, await image.read(), image.content_type or "image/jpeg")
+        for image in images
+    ]
+
+    context = await anyio.to_thread.run_sync(
+        _BatchScanContext,
+        supabase,
+        session_id,
+        current_user.effective_owner_id,
+        auto_create,
+    )
+    logger.info(
+        f"Batch scan of {len(uploads)} images, {len(context.catalog)} known products"
+    )
+
+    return StreamingResponse(
+        _stream_batch_scan(context, uploads), media_type="application/x-ndjson"
     )
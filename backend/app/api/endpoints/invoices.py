@@ -1,12 +1,10 @@
-import base64
 import logging
-import mimetypes
-from io import BytesIO
+import tempfile
+from contextlib import aclosing
 from zipfile import BadZipFile, ZipFile
-from datetime import datetime, timezone
-from pathlib import Path
+from datetime import datetime, timedelta, timezone
 import re
-from typing import Any
+from typing import Any, AsyncIterator
 
 from pydantic import BaseModel
 
@@ -14,38 +12,51 @@ import anyio
 
 from fastapi import (
     APIRouter,
-    BackgroundTasks,
     Body,
     Depends,
     HTTPException,
     UploadFile,
     status,
 )
+from fastapi.responses import StreamingResponse
 
 from app.api.deps import UserContext, get_current_user_context
+from app.core.config import settings
+from app.core.jobs import (
+    Job,
+    JobStore,
+    NewJob,
+    PermanentJobError,
+    enqueue_job,
+    enqueue_jobs,
+    job_handler,
+    register_sweep,
+)
 from app.core.supabase import get_supabase
-from app.schemas.invoice import InvoiceItemOut, InvoiceOut
+from app.schemas.invoice import InvoiceItemOut, InvoiceOut, InvoiceZipStreamItem
 from app.services.invoice_extraction import extract_invoice
+from app.services.invoice_templates import confirm_template_candidate
+from app.services.invoice_zip import (
+    SpooledZipFile,
+    StoredEntry,
+    guess_mime_type,
+    select_entries,
+    store_entries,
+)
 from app.services.storage_service import get_storage_service
+from app.services.product_catalog import (
+    catalog_upsert,
+    get_product_catalog,
+    invalidate_product_catalog,
+)
 from app.services.product_matcher import (
     match_products_for_user,
     match_products_for_invoice,
 )
-from app.utils.query_helpers import escape_like_pattern
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-ALLOWED_INVOICE_EXTENSIONS = {
-    ".pdf",
-    ".png",
-    ".jpg",
-    ".jpeg",
-    ".tif",
-    ".tiff",
-}
-
-
 class BulkMatchItem(BaseModel):
     item_id: str
     product_id: str
@@ -55,29 +66,41 @@ class BulkMatchRequest(BaseModel):
     matches: list[BulkMatchItem]
 
 
-def _guess_mime_type(file_name: str) -> str:
-    mime_type, _ = mimetypes.guess_type(file_name)
-    if mime_type:
-        return mime_type
-    if file_name.lower().endswith(".pdf"):
-        return "application/pdf"
-    return "application/octet-stream"
-
-
-def _is_allowed_invoice_file(file_name: str) -> bool:
-    return file_name.lower().endswith(tuple(ALLOWED_INVOICE_EXTENSIONS))
-
-
 def _normalize_alias_text(value: str | None) -> str:
     if not value:
         return ""
     return re.sub(r"\s+", " ", value).strip().lower()
 
 
-def _process_invoice_background(invoice_id: str, user_id: str) -> None:
-    # Runs in Starlette's threadpool (BackgroundTasks sync function).
+INVOICE_JOB_KIND = "invoice.process"
+
+
+def enqueue_invoice_processing(
+    invoice_id: str, user_id: str, takeover: bool = False
+) -> str:
+    """Queue processing for the worker (one active job per invoice)."""
+    return enqueue_job(
+        INVOICE_JOB_KIND,
+        {"invoice_id": invoice_id, "user_id": user_id, "takeover": takeover},
+        user_id=user_id,
+        dedupe_key=invoice_id,
+    )
+
+
+@job_handler(INVOICE_JOB_KIND)
+def process_invoice_job(job: Job) -> None:
+    # Runs in the worker process (python -m app.worker).
+    invoice_id = job.payload["invoice_id"]
+    user_id = job.payload["user_id"]
     supabase = None
 
+    # Lock states: pending/error normally. A retry after an expired lease
+    # (worker killed mid-run) or an orphan sweep takes over "processing" -
+    # the job lease guarantees nobody else is working on it.
+    lock_states = ["pending", "error"]
+    if job.attempts > 1 or job.payload.get("takeover"):
+        lock_states.append("processing")
+
     try:
         supabase = get_supabase()
         storage = get_storage_service()
@@ -94,13 +117,12 @@ def _process_invoice_background(invoice_id: str, user_id: str) -> None:
             )
             .eq("id", invoice_id)
             .eq("user_id", user_id)
-            .in_("status", ["pending", "error"])
-            .neq("status", "processing")
+            .in_("status", lock_states)
             .execute()
         )
 
         if not lock_resp.data:
-            # Already processing (or not found) -> no-op.
+            # Already processed (or not found) -> no-op.
             return
 
         invoice_resp = (
@@ -113,34 +135,40 @@ def _process_invoice_background(invoice_id: str, user_id: str) -> None:
 
         invoice_data = invoice_resp.data[0] if invoice_resp.data else None
         if not isinstance(invoice_data, dict):
-            raise ValueError(f"Invoice {invoice_id} not found for user {user_id}")
+            raise PermanentJobError(
+                f"Invoice {invoice_id} not found for user {user_id}"
+            )
 
         invoice: dict[str, Any] = invoice_data
 
         storage_key = invoice.get("file_url")
         if not isinstance(storage_key, str) or not storage_key:
-            raise ValueError(f"Invalid invoice file_url for invoice {invoice_id}")
+            raise PermanentJobError(f"Invalid invoice file_url for invoice {invoice_id}")
 
         file_bytes = anyio.run(storage.download, storage_key)
         file_name = invoice.get("file_name")
-        mime_type = _guess_mime_type(file_name if isinstance(file_name, str) else "")
+        mime_type = guess_mime_type(file_name if isinstance(file_name, str) else "")
         _process_invoice(supabase, invoice, file_bytes=file_bytes, mime_type=mime_type)
     except Exception as exc:
+        retrying = not (job.final_attempt or isinstance(exc, PermanentJobError))
         logger.exception(
-            "Invoice processing failed in background (invoice_id=%s user_id=%s): %s",
+            "Invoice processing failed (invoice_id=%s user_id=%s attempt=%s/%s): %s",
             invoice_id,
             user_id,
+            job.attempts,
+            job.max_attempts,
             exc,
         )
 
-        # Persist ANY background failure (including pre-download issues).
+        # Persist ANY failure (including pre-download issues). While a
+        # retry is pending the invoice waits as "pending".
         if supabase is not None:
             try:
                 (
                     supabase.table("invoices")
                     .update(
                         {
-                            "status": "error",
+                            "status": "pending" if retrying else "error",
                             "processing_error": str(exc),
                         }
                     )
@@ -154,8 +182,59 @@ def _process_invoice_background(invoice_id: str, user_id: str) -> None:
                     invoice_id,
                     user_id,
                 )
+        raise
 
-        return
+
+@register_sweep
+def requeue_orphaned_invoices(store: JobStore) -> None:
+    """
+    Queue invoices that wait without an active job.
+
+    Covers invoices left in "processing" by the old in-process background
+    tasks (redeploys) and uploads whose enqueue failed. Invoices whose
+    last job failed for good are marked as errors instead of looping.
+    """
+    supabase = get_supabase()
+    cutoff = datetime.now(timezone.utc) - timedelta(
+        seconds=settings.JOB_ORPHAN_GRACE_SECONDS
+    )
+    response = (
+        supabase.table("invoices")
+        .select("id, user_id, status")
+        .in_("status", ["pending", "processing"])
+        .lt("created_at", cutoff.isoformat())
+        .limit(500)
+        .execute()
+    )
+    requeued = 0
+    for invoice in response.data or []:
+        if not isinstance(invoice, dict):
+            continue
+        latest = store.latest_status(INVOICE_JOB_KIND, invoice["id"])
+        if latest in ("queued", "running"):
+            continue
+        if latest == "failed":
+            (
+                supabase.table("invoices")
+                .update(
+                    {
+                        "status": "error",
+                        "processing_error": "Processing was interrupted repeatedly",
+                    }
+                )
+                .eq("id", invoice["id"])
+                .in_("status", ["pending", "processing"])
+                .execute()
+            )
+            continue
+        enqueue_invoice_processing(
+            invoice["id"],
+            invoice["user_id"],
+            takeover=invoice["status"] == "processing",
+        )
+        requeued += 1
+    if requeued:
+        logger.warning(f"Requeued {requeued} orphaned invoice(s)")
 
 
 def require_owner(current_user: UserContext) -> None:
@@ -166,6 +245,22 @@ def require_owner(current_user: UserContext) -> None:
         )
 
 
+def _enqueue_or_fail(supabase, invoice_id: str, user_id: str) -> None:
+    """Queue processing; a failure stays visible on the invoice."""
+    try:
+        enqueue_invoice_processing(invoice_id, user_id)
+    except Exception as exc:
+        # The orphan sweep picks pending invoices up later
+        logger.exception("Queueing invoice %s failed: %s", invoice_id, exc)
+        (
+            supabase.table("invoices")
+            .update({"processing_error": f"Queueing failed: {exc}"})
+            .eq("id", invoice_id)
+            .eq("user_id", user_id)
+            .execute()
+        )
+
+
 def _now_iso():
     return datetime.now(timezone.utc).isoformat()
 
@@ -210,13 +305,14 @@ def _process_invoice_items(supabase, invoice_id: str, user_id: str, extraction):
     except Exception as exc:
         logger.warning("Alias lookup failed: %s", exc)
 
+    catalog = get_product_catalog(user_id, supabase)
     for item in extraction.items:
         raw_text = item.description
         normalized_name = item.normalized_name or raw_text
         unit_price = item.unit_price_gross or item.unit_price_net
         total_price = item.total_gross
 
-        matched = None
+        matched: list[dict[str, Any]] = []
         match_confidence = None
         matched_product_id = None
 
@@ -227,38 +323,25 @@ def _process_invoice_items(supabase, invoice_id: str, user_id: str, extraction):
 
         if not matched_product_id and normalized_name:
             first_word = normalized_name.split()[0] if normalized_name.split() else ""
-            matched = (
-                supabase.table("products")
-                .select("id, brand")
-                .eq("user_id", user_id)
-                .ilike("name", escape_like_pattern(first_word))
-                .limit(5)
-                .execute()
-            )
-            if matched.data and item.normalized_brand:
+            matched = catalog.find_all_by_name(first_word, limit=5) if first_word else []
+            if matched and item.normalized_brand:
                 matched_brands = [
                     p
-                    for p in matched.data
+                    for p in matched
                     if p.get("brand")
                     and item.normalized_brand.lower() in p["brand"].lower()
                 ]
                 if matched_brands:
-                    matched.data = [matched_brands[0]]
+                    matched = [matched_brands[0]]
                     match_confidence = 0.9
 
-        if not matched_product_id and (not matched or not matched.data):
-            matched = (
-                supabase.table("products")
-                .select("id")
-                .eq("user_id", user_id)
-                .ilike("name", escape_like_pattern(raw_text))
-                .limit(1)
-                .execute()
-            )
-            match_confidence = 0.7 if matched.data else None
+        if not matched_product_id and not matched:
+            exact = catalog.find_by_name(raw_text)
+            matched = [exact] if exact else []
+            match_confidence = 0.7 if matched else None
 
         if not matched_product_id:
-            matched_product_id = matched.data[0]["id"] if matched and matched.data else None
+            matched_product_id = matched[0]["id"] if matched else None
 
         if matched_product_id and not match_confidence:
             match_confidence = 0.8
@@ -301,17 +384,23 @@ def _process_invoice_items(supabase, invoice_id: str, user_id: str, extraction):
             .eq("user_id", user_id)
             .execute()
         )
+    if product_updates:
+        invalidate_product_catalog(user_id)
 
 
 def _process_invoice(supabase, invoice, file_bytes: bytes, mime_type: str):
     user_id = invoice["user_id"]
-    file_base64 = base64.b64encode(file_bytes).decode("utf-8")
 
     try:
         supabase.table("invoice_items").delete().eq(
             "invoice_id", invoice["id"]
         ).execute()
-        extraction = extract_invoice(file_base64, mime_type=mime_type)
+        extraction = extract_invoice(
+            file_bytes,
+            mime_type=mime_type,
+            tenant_id=user_id,
+            invoice_id=invoice["id"],
+        )
         _process_invoice_items(supabase, invoice["id"], user_id, extraction)
 
         (
@@ -367,7 +456,6 @@ def list_invoices(current_user: UserContext = Depends(get_current_user_context))
 )
 async def upload_invoice(
     file: UploadFile,
-    background_tasks: BackgroundTasks,
     current_user: UserContext = Depends(get_current_user_context),
 ):
     require_owner(current_user)
@@ -377,7 +465,7 @@ async def upload_invoice(
     file_bytes = await file.read()
 
     safe_filename = file.filename or "invoice.pdf"
-    upload_mime_type = file.content_type or _guess_mime_type(safe_filename)
+    upload_mime_type = file.content_type or guess_mime_type(safe_filename)
 
     # Generate storage key with user isolation
     storage_key = storage.generate_key(
@@ -429,7 +517,7 @@ async def upload_invoice(
             detail="Invoice creation failed",
         )
 
-    background_tasks.add_task(_process_invoice_background, invoice_id, current_user.id)
+    _enqueue_or_fail(supabase, invoice_id, current_user.id)
 
     refreshed = (
         supabase.table("invoices")
@@ -441,130 +529,220 @@ async def upload_invoice(
     return refreshed.data[0] if refreshed.data else invoice_data
 
 
-@router.post("/invoices/upload-zip", status_code=status.HTTP_201_CREATED)
-async def upload_invoice_zip(
-    file: UploadFile,
-    background_tasks: BackgroundTasks,
-    current_user: UserContext = Depends(get_current_user_context),
-):
-    require_owner(current_user)
-    supabase = get_supabase()
-    storage = get_storage_service()
+# Copy chunk when spooling an uploaded archive to disk
+ZIP_SPOOL_CHUNK_BYTES = 1024 * 1024
+
 
+async def _open_uploaded_zip(file: UploadFile) -> ZipFile:
+    """Spool the upload to a temporary file and open it as a ZIP archive."""
     if not file.filename or not file.filename.lower().endswith(".zip"):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Please upload a .zip file",
         )
 
-    file_bytes = await file.read()
+    # Our own file: the archive stays readable while a streamed response
+    # is still uploading entries; deleted when the ZipFile is closed
+    spool = tempfile.TemporaryFile()
+    try:
+        while chunk := await file.read(ZIP_SPOOL_CHUNK_BYTES):
+            spool.write(chunk)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
 
     try:
-        zip_file = ZipFile(BytesIO(file_bytes))
+        return SpooledZipFile(spool)
     except BadZipFile:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid ZIP file",
         )
 
-    created: list[str] = []
-    errors: list[dict[str, str]] = []
-    valid_entries = 0
-
-    with zip_file:
-        for info in zip_file.infolist():
-            if info.is_dir():
-                continue
-
-            entry_name = Path(info.filename).name
-            if not entry_name:
-                continue
 
-            if not _is_allowed_invoice_file(entry_name):
-                errors.append(
-                    {
-                        "file": entry_name,
-                        "error": "Unsupported file type",
-                    }
+def _enqueue_invoices(stored: list[StoredEntry], user_id: str) -> list[str]:
+    """One job per invoice, written at once; empty when queueing failed."""
+    try:
+        return enqueue_jobs(
+            INVOICE_JOB_KIND,
+            [
+                NewJob(
+                    payload={
+                        "invoice_id": item.entry.invoice_id,
+                        "user_id": user_id,
+                        "takeover": False,
+                    },
+                    user_id=user_id,
+                    dedupe_key=item.entry.invoice_id,
                 )
-                continue
-
-            valid_entries += 1
+                for item in stored
+            ],
+        )
+    except Exception as exc:
+        # The orphan sweep picks pending invoices up later
+        logger.exception("Queueing %s ZIP invoices failed: %s", len(stored), exc)
+        return []
 
-            try:
-                entry_bytes = zip_file.read(info)
-                if not entry_bytes:
-                    raise ValueError("File is empty")
 
-                upload_mime_type = _guess_mime_type(entry_name)
+async def _ingest_zip(
+    supabase, zip_file: ZipFile, user_id: str
+) -> AsyncIterator[InvoiceZipStreamItem]:
+    """
+    Store all entries, then create their invoices and jobs in bulk.
 
-                storage_key = storage.generate_key(
-                    user_id=current_user.id,
-                    category="invoices",
-                    filename=entry_name,
-                    include_date=True,
-                )
+    Yields a "stored" (or "error") item per entry as soon as it is in
+    storage, a "queued" item per invoice once its row and job exist, and
+    a final item with done=true.
+    """
+    storage = get_storage_service()
+    stored: list[StoredEntry] = []
+    failed = 0
 
-                await storage.upload(entry_bytes, storage_key, upload_mime_type)
+    with zip_file:
+        entries, skipped = select_entries(zip_file)
+        for error in skipped:
+            failed += 1
+            yield InvoiceZipStreamItem(
+                file=error["file"], status="error", error=error["error"]
+            )
 
-                invoice_resp = (
-                    supabase.table("invoices")
-                    .insert(
+        inserted = False
+        try:
+            # Closed before the archive: running uploads still read from it
+            async with aclosing(
+                store_entries(zip_file, entries, storage, user_id)
+            ) as results:
+                async for item in results:
+                    if item.ok:
+                        stored.append(item)
+                        yield InvoiceZipStreamItem(
+                            file=item.entry.file_name,
+                            invoice_id=item.entry.invoice_id,
+                            status="stored",
+                        )
+                    else:
+                        failed += 1
+                        yield InvoiceZipStreamItem(
+                            file=item.entry.file_name,
+                            status="error",
+                            error=item.error,
+                        )
+
+            if stored:
+                # One statement for the whole archive
+                supabase.table("invoices").insert(
+                    [
                         {
-                            "user_id": current_user.id,
-                            "file_url": storage_key,
-                            "file_name": entry_name,
-                            "file_size": len(entry_bytes),
+                            "id": item.entry.invoice_id,
+                            "user_id": user_id,
+                            "file_url": item.storage_key,
+                            "file_name": item.entry.file_name,
+                            "file_size": item.entry.info.file_size,
                             "status": "pending",
                             "processing_error": None,
                             "processed_at": None,
                         }
-                    )
-                    .execute()
+                        for item in stored
+                    ]
+                ).execute()
+            inserted = True
+        except Exception as exc:
+            logger.exception(
+                "Invoice ZIP upload failed (user_id=%s): %s", user_id, exc
+            )
+            for item in stored:
+                failed += 1
+                yield InvoiceZipStreamItem(
+                    file=item.entry.file_name,
+                    status="error",
+                    error="Invoice creation failed",
                 )
+        finally:
+            if not inserted:
+                # Also on client disconnect: no files without invoices. The
+                # cancelled scope would cancel the deletes, so shield them
+                with anyio.CancelScope(shield=True):
+                    for item in stored:
+                        await storage.delete(item.storage_key)
+
+    if not inserted:
+        yield InvoiceZipStreamItem(done=True, created=0, failed=failed)
+        return
 
-                invoice_data = invoice_resp.data[0] if invoice_resp.data else None
-                if not isinstance(invoice_data, dict):
-                    await storage.delete(storage_key)
-                    raise ValueError("Invoice creation failed")
-
-                invoice_id = invoice_data.get("id")
-                if not isinstance(invoice_id, str) or not invoice_id:
-                    await storage.delete(storage_key)
-                    raise ValueError("Invoice creation failed")
+    job_ids = _enqueue_invoices(stored, user_id)
+    for index, item in enumerate(stored):
+        yield InvoiceZipStreamItem(
+            file=item.entry.file_name,
+            invoice_id=item.entry.invoice_id,
+            job_id=job_ids[index] if index < len(job_ids) else None,
+            status="queued",
+        )
+    yield InvoiceZipStreamItem(done=True, created=len(stored), failed=failed)
 
-                background_tasks.add_task(
-                    _process_invoice_background, invoice_id, current_user.id
-                )
-                created.append(invoice_id)
-            except Exception as exc:
-                logger.exception(
-                    "Invoice ZIP upload failed for %s (user_id=%s): %s",
-                    entry_name,
-                    current_user.id,
-                    exc,
-                )
-                errors.append(
-                    {
-                        "file": entry_name,
-                        "error": str(exc),
-                    }
-                )
 
-    if valid_entries == 0:
+async def _open_zip_upload(file: UploadFile, current_user: UserContext) -> ZipFile:
+    require_owner(current_user)
+    zip_file = await _open_uploaded_zip(file)
+    entries, _ = select_entries(zip_file)
+    if not entries:
+        zip_file.close()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="ZIP contains no supported invoice files",
         )
+    return zip_file
+
+
+@router.post("/invoices/upload-zip", status_code=status.HTTP_201_CREATED)
+async def upload_invoice_zip(
+    file: UploadFile,
+    current_user: UserContext = Depends(get_current_user_context),
+):
+    zip_file = await _open_zip_upload(file, current_user)
+
+    created: list[str] = []
+    job_ids: list[str] = []
+    errors: list[dict[str, str]] = []
+    async for item in _ingest_zip(get_supabase(), zip_file, current_user.id):
+        if item.status == "error":
+            errors.append({"file": item.file or "", "error": item.error or ""})
+        elif item.status == "queued" and item.invoice_id:
+            created.append(item.invoice_id)
+            if item.job_id:
+                job_ids.append(item.job_id)
 
     return {
         "created": len(created),
         "failed": len(errors),
         "errors": errors,
         "invoice_ids": created,
+        "job_ids": job_ids,
     }
 
 
+@router.post("/invoices/upload-zip/stream", status_code=status.HTTP_201_CREATED)
+async def upload_invoice_zip_stream(
+    file: UploadFile,
+    current_user: UserContext = Depends(get_current_user_context),
+):
+    """
+    Streaming variant of /invoices/upload-zip.
+
+    Responds with NDJSON InvoiceZipStreamItem lines: "stored" as each
+    file reaches storage (with its invoice id), "error" for skipped or
+    failed files, "queued" per invoice (with its job id) once all rows
+    are inserted, and a last line with done=true and the counts.
+    """
+    zip_file = await _open_zip_upload(file, current_user)
+
+    async def lines() -> AsyncIterator[str]:
+        async for item in _ingest_zip(get_supabase(), zip_file, current_user.id):
+            yield item.model_dump_json(exclude_none=True) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @router.get("/invoices/{invoice_id}", response_model=InvoiceOut)
 def get_invoice(
     invoice_id: str, current_user: UserContext = Depends(get_current_user_context)
@@ -590,7 +768,6 @@ def get_invoice(
 @router.post("/invoices/{invoice_id}/process", response_model=InvoiceOut)
 async def process_invoice(
     invoice_id: str,
-    background_tasks: BackgroundTasks,
     current_user: UserContext = Depends(get_current_user_context),
 ):
     require_owner(current_user)
@@ -613,7 +790,7 @@ async def process_invoice(
     if invoice_data.get("status") in ("processing", "processed"):
         return invoice_data
 
-    background_tasks.add_task(_process_invoice_background, invoice_id, current_user.id)
+    _enqueue_or_fail(supabase, invoice_id, current_user.id)
 
     refreshed = (
         supabase.table("invoices")
@@ -727,6 +904,7 @@ def match_invoice_item(
                 or datetime.now(timezone.utc).date().isoformat(),
             }
         ).eq("id", product_id).eq("user_id", current_user.id).execute()
+        invalidate_product_catalog(current_user.id)
 
     try:
         normalized_raw = _normalize_alias_text(item.get("raw_text"))
@@ -745,6 +923,9 @@ def match_invoice_item(
     except Exception as exc:
         logger.warning("Failed to store invoice alias: %s", exc)
 
+    # Every item matched by the user: the layout may become a template
+    confirm_template_candidate(supabase, current_user.id, invoice_id)
+
     return updated.data[0] if updated.data else item
 
 
@@ -918,6 +1099,10 @@ def bulk_match_invoice_items(
 
         updated_count += 1
 
+    if updated_count:
+        invalidate_product_catalog(current_user.id)
+        confirm_template_candidate(supabase, current_user.id, invoice_id)
+
     return {
         "updated": updated_count,
         "requested": len(payload.matches),
@@ -1021,6 +1206,8 @@ def auto_create_products_from_invoice(
                     }
                 ).eq("id", item["id"]).execute()
 
+    catalog_upsert(current_user.id, created_products)
+
     return {
         "message": f"{len(created_products)} products created",
         "created": created_products,
@@ -2,6 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status
 from app.api.deps import UserContext, get_current_user_context
 from app.core.supabase import get_supabase
 from app.schemas.product import ProductCreate, ProductOut, ProductUpdate
+from app.services.product_catalog import (
+    catalog_remove,
+    catalog_upsert,
+    get_product_catalog,
+)
 from app.utils.query_helpers import escape_like_pattern, normalize_search_query
 
 router = APIRouter()
@@ -60,6 +65,7 @@ def create_product(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Product creation failed",
         )
+    catalog_upsert(tenant_user_id, [data])
     return data
 
 
@@ -121,6 +127,7 @@ def update_product(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found",
         )
+    catalog_upsert(tenant_user_id, [data])
     return data
 
 
@@ -151,6 +158,7 @@ def delete_product(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found",
         )
+    catalog_remove(tenant_user_id, product_id)
     return data
 
 
@@ -166,15 +174,8 @@ def search_products(
     if not normalized_q:
         return []
 
-    response = (
-        supabase.table("products")
-        .select("*")
-        .eq("user_id", tenant_user_id)
-        .ilike("name", escape_like_pattern(normalized_q))
-        .limit(20)
-        .execute()
-    )
-    return response.data or []
+    # Name matches first, then all-words and fuzzy (typo) matches
+    return get_product_catalog(tenant_user_id, supabase).search(normalized_q, limit=20)
 
 
 @router.get("/products/barcode/{code}", response_model=ProductOut)
@@ -185,15 +186,7 @@ def get_by_barcode(
     supabase = get_supabase()
     tenant_user_id = current_user.effective_owner_id
 
-    response = (
-        supabase.table("products")
-        .select("*")
-        .eq("user_id", tenant_user_id)
-        .eq("barcode", code)
-        .limit(1)
-        .execute()
-    )
-    data = response.data[0] if response.data else None
+    data = get_product_catalog(tenant_user_id, supabase).find_by_barcodes([code])
     if data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -13,6 +13,145 @@ class Settings(BaseSettings):
     # Google Gemini AI
     GOOGLE_GEMINI_API_KEY: str
 
+    # Gemini connection pool (one shared client per process)
+    GEMINI_MAX_CONNECTIONS: int = 20
+    GEMINI_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    GEMINI_KEEPALIVE_EXPIRY_SECONDS: float = 120.0
+    GEMINI_HTTP2: bool = True
+    GEMINI_WARMUP_ON_STARTUP: bool = True
+
+    # Gemini scheduler (per process): bound in-flight calls, 0 = no per-tenant cap
+    GEMINI_MAX_IN_FLIGHT: int = 8
+    GEMINI_MAX_IN_FLIGHT_PER_TENANT: int = 0
+    GEMINI_QUEUE_TIMEOUT_SECONDS: float = 120.0
+
+    # Gemini resilience: retries on 429/5xx, circuit breaker, hedged single scans
+    GEMINI_RETRY_MAX_ATTEMPTS: int = 3
+    GEMINI_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    GEMINI_RETRY_MAX_DELAY_SECONDS: float = 8.0
+    GEMINI_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    GEMINI_CIRCUIT_RESET_SECONDS: float = 30.0
+    GEMINI_HEDGE_ENABLED: bool = False
+    GEMINI_HEDGE_PERCENTILE: float = 0.95
+    GEMINI_HEDGE_MIN_DELAY_SECONDS: float = 1.0
+    GEMINI_HEDGE_DEFAULT_DELAY_SECONDS: float = 3.0
+
+    # Gemini usage accounting (USD per 1M tokens; thinking billed as output)
+    GEMINI_PRICE_INPUT_PER_MILLION: float = 0.50
+    GEMINI_PRICE_CACHED_INPUT_PER_MILLION: float = 0.05
+    GEMINI_PRICE_OUTPUT_PER_MILLION: float = 3.00
+    GEMINI_USAGE_PERSIST: bool = False  # Write calls to the gemini_usage table
+    GEMINI_USAGE_FLUSH_SIZE: int = 50
+
+    # Gemini context caching of static prompt prefixes (live backend only)
+    GEMINI_CONTEXT_CACHE_ENABLED: bool = True
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS: int = 3600  # Extended while in use
+    GEMINI_CONTEXT_CACHE_MIN_CHARS: int = 2000  # Shorter prefixes stay inline
+    GEMINI_CONTEXT_CACHE_RETRY_SECONDS: float = 3600.0  # After a refused create
+
+    # Gemini model backend: "live", "record", "replay" or "synthetic"
+    GEMINI_BACKEND: str = "live"
+    GEMINI_RECORDINGS_DIR: str = "/tmp/crewinventur/gemini_recordings"
+    # Median latency per thinking level (ms), log-normal spread
+    GEMINI_SYNTHETIC_LATENCY_MS: str = "minimal:900,low:1500,medium:4000,high:9000"
+    GEMINI_SYNTHETIC_LATENCY_SIGMA: float = 0.35
+    GEMINI_SYNTHETIC_ERROR_RATE: float = 0.0  # Share of injected 503s
+    GEMINI_SYNTHETIC_MAX_ITEMS: int = 12
+
+    # Product recognition cache (perceptual image hash)
+    RECOGNITION_CACHE_BACKEND: str = "memory"  # "memory", "disk" or "off"
+    RECOGNITION_CACHE_PATH: str = "/tmp/crewinventur/recognition_cache.sqlite3"
+    RECOGNITION_CACHE_MAX_ENTRIES: int = 5000
+    RECOGNITION_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    RECOGNITION_CACHE_MAX_DISTANCE: int = 3  # Hamming distance for near duplicates
+    RECOGNITION_CACHE_MIN_CONFIDENCE: float = 0.8
+
+    # Recognition memory: products confirmed for earlier scans (per tenant)
+    RECOGNITION_MEMORY_ENABLED: bool = True
+    RECOGNITION_MEMORY_PERSIST: bool = True  # recognition_memory table
+    RECOGNITION_MEMORY_MAX_ENTRIES: int = 5000  # Per tenant and key kind
+    RECOGNITION_MEMORY_TTL_SECONDS: int = 300  # Picks up other workers' entries
+    RECOGNITION_MEMORY_PENDING_TTL_SECONDS: int = 6 * 3600  # scan_id validity
+
+    # Tiered thinking: cheapest level first, escalate uncertain answers
+    RECOGNITION_THINKING_TIERS: str = "minimal,low"
+    SHELF_THINKING_TIERS: str = "low,medium"
+    RECOGNITION_ESCALATION_CONFIDENCE: float = 0.7
+    SHELF_ESCALATION_UNCERTAIN_SHARE: float = 0.3  # Share of uncertain items
+
+    # Shelf tiling: large shelf photos are recognized as overlapping tiles
+    SHELF_TILING_ENABLED: bool = True
+    SHELF_TILING_MIN_EDGE: int = 2000  # Longest edge (px) from which to tile
+    SHELF_TILE_SIZE: int = 1536
+    SHELF_TILE_OVERLAP: float = 0.15  # Share of the tile edge shared with neighbours
+    SHELF_TILE_MAX_TILES: int = 9
+    SHELF_MERGE_SIMILARITY: float = 0.85  # Name/brand ratio for seam duplicates
+
+    # Image preprocessing before upload to Gemini
+    IMAGE_PREPROCESSING_ENABLED: bool = True
+    IMAGE_MAX_EDGE: int = 1600
+    IMAGE_SHELF_MAX_EDGE: int = 3072
+    IMAGE_OUTPUT_FORMAT: str = "JPEG"  # "JPEG" or "WEBP"
+    IMAGE_QUALITY: int = 85
+
+    # In-process product catalog index (barcode/name/fuzzy lookups)
+    PRODUCT_CATALOG_TTL_SECONDS: int = 300  # Picks up changes from other workers
+    PRODUCT_CATALOG_MAX_TENANTS: int = 500
+    PRODUCT_CATALOG_MIN_SIMILARITY: float = 0.3  # Trigram similarity for fuzzy hits
+
+    # System category list used in every recognition prompt
+    CATEGORY_CACHE_TTL_SECONDS: int = 600
+
+    # Invoice PDFs: local text layer, text-only fast path for digital invoices
+    INVOICE_PDF_MAX_PAGES: int = 20
+    INVOICE_TEXT_MAX_CHARS: int = 40000
+    INVOICE_TEXT_ONLY_ENABLED: bool = True
+    INVOICE_TEXT_ONLY_THINKING: str = "medium"
+    INVOICE_TEXT_ONLY_MIN_CONFIDENCE: float = 0.7  # Below: redo with the PDF
+
+    # Durable background jobs: "supabase" (jobs table) or "sqlite" (tests/dev)
+    JOB_QUEUE_BACKEND: str = "supabase"
+    JOB_QUEUE_SQLITE_PATH: str = "/tmp/crewinventur/jobs.sqlite3"
+    JOB_WORKER_CONCURRENCY: int = 2  # Jobs per worker process
+    JOB_WORKER_EMBEDDED: bool = False  # Also run a worker in the API process (dev)
+    JOB_LEASE_SECONDS: int = 120  # Visibility timeout, extended while running
+    JOB_POLL_SECONDS: float = 2.0
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BASE_DELAY_SECONDS: float = 10.0
+    JOB_RETRY_MAX_DELAY_SECONDS: float = 600.0
+    JOB_SWEEP_SECONDS: float = 300.0  # Requeue orphaned invoices
+    JOB_ORPHAN_GRACE_SECONDS: float = 600.0  # Age before an invoice counts as orphaned
+    JOB_SHUTDOWN_GRACE_SECONDS: float = 25.0  # Railway sends SIGKILL after 30s
+    # /health/jobs is unhealthy when due jobs waited this long and no worker
+    # held a lease or finished a job in that time (worker service missing)
+    JOB_STALL_SECONDS: float = 300.0
+
+    # Scanned invoice PDFs: pages rendered in a process pool, extracted per page
+    INVOICE_RENDER_WORKERS: int = 4  # 1 = render in the API process
+    INVOICE_RENDER_SCALE: float = 2.0
+    INVOICE_PAGE_CONCURRENCY: int = 4  # Pages of one invoice in flight at once
+
+    # Learned per-supplier invoice templates (deterministic line parsing)
+    INVOICE_TEMPLATES_ENABLED: bool = True
+    INVOICE_TEMPLATE_MIN_SAMPLES: int = 2  # User-confirmed invoices before use
+    INVOICE_TEMPLATE_LINE_AGREEMENT: float = 0.8  # Share of items per layout
+    INVOICE_TEMPLATE_CACHE_TTL_SECONDS: int = 300  # Picks up other workers' templates
+
+    # ZIP invoice uploads: entries streamed to storage concurrently
+    INVOICE_ZIP_UPLOAD_CONCURRENCY: int = 4
+    INVOICE_ZIP_MAX_ENTRIES: int = 500
+    INVOICE_ZIP_MAX_ENTRY_BYTES: int = 50 * 1024 * 1024  # Uncompressed
+
+    # Batch scan endpoint: images per request, recognized concurrently
+    SCAN_BATCH_MAX_IMAGES: int = 50
+    SCAN_BATCH_CONCURRENCY: int = 4
+
+    # Local EAN/UPC decoding (zxing-cpp) before calling Gemini
+    BARCODE_FAST_PATH_ENABLED: bool = True
+
+    # Comma-separated emails allowed to use operator endpoints
+    ADMIN_EMAILS: str = ""
+
     # Security - CRITICAL: Must be set in production
     SECRET_KEY: str  # No default value - requires explicit setting
 
@@ -26,6 +165,7 @@ class Settings(BaseSettings):
     R2_BUCKET_NAME: str = "crewinventurki-uploads"
     R2_PUBLIC_URL: str | None = None
     STORAGE_PROVIDER: str = "local"  # "local" or "r2"
+    STORAGE_UPLOAD_CHUNK_BYTES: int = 8 * 1024 * 1024  # Multipart part size (min 5 MB)
 
     # CORS Origins (comma-separated list)
     CORS_ORIGINS: str = "http://localhost:5173,https://crewinventurki.pages.dev,capacitor://localhost,https://localhost,http://localhost"
@@ -2,20 +2,45 @@
 Gemini 3 Flash API Integration.
 
 Uses the new google-genai SDK with:
-- Structured output (Pydantic JSON Schema)
+- Structured output (Pydantic JSON Schema, compiled once per schema)
 - Configurable thinking levels
 - Native multimodal support
+- A process-wide priority scheduler that bounds in-flight calls
+- Retries with jittered backoff, a per-model circuit breaker and optional
+  hedged requests for fast single scans
+- Token, latency and cost accounting per call (see gemini_usage)
+- Pluggable live / record / replay / synthetic backends (see gemini_backends)
+- Streamed list output, yielding each item as soon as it is complete
+- Static prompt prefixes (system_prompt) served from provider-side context
+  caches (see gemini_context_cache)
 """
 
+import asyncio
+import itertools
+import json
 import logging
-from enum import Enum
-from typing import Any, Type
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from enum import Enum, IntEnum
+from typing import Any, AsyncIterator, Iterator, Optional, Type
 
+import httpx
 from google import genai
+from google.genai import _transformers as genai_transformers
+from google.genai import errors as genai_errors
 from google.genai import types
 from pydantic import BaseModel
 
 from app.core.config import settings
+from app.core.gemini_backends import get_gemini_backend
+from app.core.gemini_context_cache import get_context_cache
+from app.core.gemini_usage import record_gemini_call
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +59,18 @@ class ThinkingLevel(str, Enum):
     HIGH = "high"        # Deep reasoning (invoices, complex extraction)
 
 
+class GeminiPriority(IntEnum):
+    """
+    Scheduling classes for Gemini calls - lower value is served first.
+
+    Staff waiting at the shelf beat background invoice work.
+    """
+    INTERACTIVE_SCAN = 0    # Single product scan, user is waiting
+    SHELF_SCAN = 1          # Multi-product scan, user is waiting
+    INVOICE_EXTRACTION = 2  # Background invoice processing
+    BULK_MATCH = 3          # Smart-match over many invoice items
+
+
 class GeminiError(Exception):
     """Base exception for Gemini API errors."""
     pass
@@ -49,22 +86,1231 @@ class GeminiParseError(GeminiError):
     pass
 
 
+class GeminiOverloadedError(GeminiAPIError):
+    """Raised when a call waited too long for a free scheduler slot."""
+    pass
+
+
+class GeminiUnavailableError(GeminiAPIError):
+    """Raised without calling the API while the circuit breaker is open."""
+    pass
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (httpx[http2])."""
+    try:
+        import h2  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+class GeminiClientManager:
+    """
+    Process-wide owner of the Gemini SDK client.
+
+    Creating a genai.Client per call means a fresh TLS handshake and
+    connection setup for every scan. This manager builds one client with
+    pooled, bounded httpx transports (sync + async), keeps connections
+    alive between calls and closes them from the FastAPI lifespan hook.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client: genai.Client | None = None
+        self._http_client: httpx.Client | None = None
+        self._async_http_client: httpx.AsyncClient | None = None
+        self._http2 = False
+        self._created_at: float | None = None
+        self._last_success_at: float | None = None
+        self._last_error: str | None = None
+        self._last_error_at: float | None = None
+
+    def _build_http_clients(self) -> tuple[httpx.Client, httpx.AsyncClient]:
+        limits = httpx.Limits(
+            max_connections=settings.GEMINI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GEMINI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.GEMINI_KEEPALIVE_EXPIRY_SECONDS,
+        )
+        http2 = settings.GEMINI_HTTP2 and _http2_available()
+        if settings.GEMINI_HTTP2 and not http2:
+            logger.warning("h2 not installed, Gemini client falls back to HTTP/1.1")
+        self._http2 = http2
+
+        # Timeouts are handled per request by the SDK (HttpOptions.timeout)
+        return (
+            httpx.Client(http2=http2, limits=limits, timeout=None),
+            httpx.AsyncClient(http2=http2, limits=limits, timeout=None),
+        )
+
+    @property
+    def client(self) -> genai.Client:
+        """Return the shared client, creating it on first use."""
+        if self._client is not None:
+            return self._client
+
+        with self._lock:
+            if self._client is None:
+                http_client, async_http_client = self._build_http_clients()
+                self._client = genai.Client(
+                    api_key=settings.GOOGLE_GEMINI_API_KEY,
+                    http_options=types.HttpOptions(
+                        httpx_client=http_client,
+                        httpx_async_client=async_http_client,
+                    ),
+                )
+                self._http_client = http_client
+                self._async_http_client = async_http_client
+                self._created_at = time.time()
+                logger.info(
+                    "Gemini client initialized (max_connections=%s, http2=%s)",
+                    settings.GEMINI_MAX_CONNECTIONS,
+                    self._http2,
+                )
+        return self._client
+
+    def record_success(self) -> None:
+        self._last_success_at = time.time()
+
+    def record_failure(self, exc: BaseException) -> None:
+        self._last_error = f"{type(exc).__name__}: {exc}"
+        self._last_error_at = time.time()
+
+    def warm_up(self) -> None:
+        """Open a pooled connection ahead of the first scan (best effort)."""
+        try:
+            self.health_check(probe=True)
+        except Exception as exc:
+            logger.warning("Gemini warm-up failed: %s", exc)
+
+    def health_check(self, probe: bool = False) -> dict[str, Any]:
+        """
+        Report client state.
+
+        Args:
+            probe: Also make a lightweight models.get call to verify
+                connectivity (and keep a pooled connection warm).
+        """
+        status = {
+            "initialized": self._client is not None,
+            "model": MODEL_NAME,
+            "http2": self._http2,
+            "created_at": self._created_at,
+            "last_success_at": self._last_success_at,
+            "last_error": self._last_error,
+            "last_error_at": self._last_error_at,
+        }
+
+        if probe:
+            started = time.perf_counter()
+            try:
+                self.client.models.get(model=MODEL_NAME)
+                self.record_success()
+                status["reachable"] = True
+            except Exception as exc:
+                self.record_failure(exc)
+                status["reachable"] = False
+                status["last_error"] = self._last_error
+            status["probe_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        return status
+
+    async def aclose(self) -> None:
+        """Close pooled connections (called on application shutdown)."""
+        with self._lock:
+            http_client = self._http_client
+            async_http_client = self._async_http_client
+            self._client = None
+            self._http_client = None
+            self._async_http_client = None
+
+        if async_http_client is not None:
+            await async_http_client.aclose()
+        if http_client is not None:
+            http_client.close()
+        if http_client is not None or async_http_client is not None:
+            logger.info("Gemini client closed")
+
+
+# Singleton instance
+_client_manager: Optional[GeminiClientManager] = None
+
+
+def get_gemini_client_manager() -> GeminiClientManager:
+    """Get the Gemini client manager singleton."""
+    global _client_manager
+    if _client_manager is None:
+        _client_manager = GeminiClientManager()
+    return _client_manager
+
+
+@dataclass
+class _Waiter:
+    priority: GeminiPriority
+    tenant_id: str
+    seq: int
+    enqueued_at: float
+    event: threading.Event | None = None
+    loop: asyncio.AbstractEventLoop | None = None
+    future: "asyncio.Future[None] | None" = None
+    granted: bool = False
+
+
+@dataclass
+class _PriorityStats:
+    completed: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    timeouts: int = 0
+
+
+@dataclass
+class GeminiSlot:
+    """A granted scheduler slot, released via GeminiScheduler.release()."""
+    priority: GeminiPriority
+    tenant_id: str
+    wait_seconds: float
+    released: bool = field(default=False, repr=False)
+
+
+class GeminiScheduler:
+    """
+    Concurrency governor for Gemini calls.
+
+    Bounds the number of in-flight requests per process. Waiting calls are
+    served by priority class first; within a class the tenant with the
+    fewest calls in flight goes next (then FIFO), so one tenant's 80-PDF
+    ZIP upload can't starve everybody else.
+
+    Works for both worker threads (acquire) and the event loop (aacquire).
+    """
+
+    def __init__(self, max_in_flight: int, max_in_flight_per_tenant: int = 0):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_in_flight_per_tenant = max(0, max_in_flight_per_tenant)
+        self._lock = threading.Lock()
+        self._waiters: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._tenant_in_flight: dict[str, int] = defaultdict(int)
+        self._stats: dict[GeminiPriority, _PriorityStats] = {
+            priority: _PriorityStats() for priority in GeminiPriority
+        }
+
+    def _tenant_has_capacity(self, tenant_id: str) -> bool:
+        if not self.max_in_flight_per_tenant:
+            return True
+        return self._tenant_in_flight[tenant_id] < self.max_in_flight_per_tenant
+
+    def _grant_locked(self, waiter: _Waiter) -> None:
+        waiter.granted = True
+        self._in_flight += 1
+        self._tenant_in_flight[waiter.tenant_id] += 1
+
+        wait = time.monotonic() - waiter.enqueued_at
+        stats = self._stats[waiter.priority]
+        stats.completed += 1
+        stats.total_wait += wait
+        stats.max_wait = max(stats.max_wait, wait)
+
+        if waiter.event is not None:
+            waiter.event.set()
+        elif waiter.loop is not None and waiter.future is not None:
+            future = waiter.future
+            waiter.loop.call_soon_threadsafe(
+                lambda: future.done() or future.set_result(None)
+            )
+
+    def _dispatch_locked(self) -> None:
+        while self._in_flight < self.max_in_flight and self._waiters:
+            eligible = [
+                w for w in self._waiters if self._tenant_has_capacity(w.tenant_id)
+            ]
+            if not eligible:
+                return
+            waiter = min(
+                eligible,
+                key=lambda w: (
+                    w.priority,
+                    self._tenant_in_flight[w.tenant_id],
+                    w.seq,
+                ),
+            )
+            self._waiters.remove(waiter)
+            self._grant_locked(waiter)
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        with self._lock:
+            self._waiters.append(waiter)
+            self._dispatch_locked()
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Drop a waiter that gave up. Returns True if it had been granted."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            self._stats[waiter.priority].timeouts += 1
+            return False
+
+    def _new_waiter(self, priority: GeminiPriority, tenant_id: str | None) -> _Waiter:
+        return _Waiter(
+            priority=priority,
+            tenant_id=tenant_id or "",
+            seq=next(self._seq),
+            enqueued_at=time.monotonic(),
+        )
+
+    def _slot_for(self, waiter: _Waiter) -> GeminiSlot:
+        return GeminiSlot(
+            priority=waiter.priority,
+            tenant_id=waiter.tenant_id,
+            wait_seconds=time.monotonic() - waiter.enqueued_at,
+        )
+
+    def acquire(
+        self,
+        priority: GeminiPriority,
+        tenant_id: str | None = None,
+        timeout: float | None = None,
+    ) -> GeminiSlot:
+        """Block the calling thread until a slot is free."""
+        waiter = self._new_waiter(priority, tenant_id)
+        waiter.event = threading.Event()
+        self._enqueue(waiter)
+
+        if not waiter.event.wait(timeout):
+            if not self._abandon(waiter):
+                raise GeminiOverloadedError(
+                    f"No Gemini slot free after {timeout:.0f}s "
+                    f"(priority={priority.name})"
+                )
+        return self._slot_for(waiter)
+
+    async def aacquire(
+        self,
+        priority: GeminiPriority,
+        tenant_id: str | None = None,
+        timeout: float | None = None,
+    ) -> GeminiSlot:
+        """Wait (without blocking the event loop) until a slot is free."""
+        waiter = self._new_waiter(priority, tenant_id)
+        waiter.loop = asyncio.get_running_loop()
+        waiter.future = waiter.loop.create_future()
+        self._enqueue(waiter)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            if not self._abandon(waiter):
+                raise GeminiOverloadedError(
+                    f"No Gemini slot free after {timeout:.0f}s "
+                    f"(priority={priority.name})"
+                )
+        except asyncio.CancelledError:
+            if self._abandon(waiter):
+                self.release(self._slot_for(waiter))
+            raise
+        return self._slot_for(waiter)
+
+    def try_acquire(
+        self, priority: GeminiPriority, tenant_id: str | None = None
+    ) -> GeminiSlot | None:
+        """Grant a slot only if one is free right now and nobody is queued."""
+        waiter = self._new_waiter(priority, tenant_id)
+        with self._lock:
+            if (
+                self._waiters
+                or self._in_flight >= self.max_in_flight
+                or not self._tenant_has_capacity(waiter.tenant_id)
+            ):
+                return None
+            self._grant_locked(waiter)
+        return self._slot_for(waiter)
+
+    def release(self, slot: GeminiSlot) -> None:
+        with self._lock:
+            if slot.released:
+                return
+            slot.released = True
+            self._in_flight -= 1
+            self._tenant_in_flight[slot.tenant_id] -= 1
+            if self._tenant_in_flight[slot.tenant_id] <= 0:
+                del self._tenant_in_flight[slot.tenant_id]
+            self._dispatch_locked()
+
+    @contextmanager
+    def slot(
+        self, priority: GeminiPriority, tenant_id: str | None = None
+    ) -> Iterator[GeminiSlot]:
+        slot = self.acquire(
+            priority, tenant_id, timeout=settings.GEMINI_QUEUE_TIMEOUT_SECONDS
+        )
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    @asynccontextmanager
+    async def aslot(
+        self, priority: GeminiPriority, tenant_id: str | None = None
+    ) -> AsyncIterator[GeminiSlot]:
+        slot = await self.aacquire(
+            priority, tenant_id, timeout=settings.GEMINI_QUEUE_TIMEOUT_SECONDS
+        )
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth, in-flight counts and wait times per priority class."""
+        with self._lock:
+            now = time.monotonic()
+            queues: dict[str, Any] = {}
+            for priority in GeminiPriority:
+                waiting = [w for w in self._waiters if w.priority == priority]
+                stats = self._stats[priority]
+                queues[priority.name.lower()] = {
+                    "queued": len(waiting),
+                    "oldest_wait_seconds": round(
+                        max((now - w.enqueued_at for w in waiting), default=0.0), 3
+                    ),
+                    "served": stats.completed,
+                    "avg_wait_seconds": round(
+                        stats.total_wait / stats.completed, 3
+                    )
+                    if stats.completed
+                    else 0.0,
+                    "max_wait_seconds": round(stats.max_wait, 3),
+                    "timeouts": stats.timeouts,
+                }
+
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_in_flight_per_tenant": self.max_in_flight_per_tenant,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "tenants_in_flight": len(self._tenant_in_flight),
+                "priorities": queues,
+            }
+
+
+_scheduler: Optional[GeminiScheduler] = None
+
+
+def get_gemini_scheduler() -> GeminiScheduler:
+    """Get the Gemini scheduler singleton."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = GeminiScheduler(
+            max_in_flight=settings.GEMINI_MAX_IN_FLIGHT,
+            max_in_flight_per_tenant=settings.GEMINI_MAX_IN_FLIGHT_PER_TENANT,
+        )
+    return _scheduler
+
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def _is_transient(exc: BaseException) -> bool:
+    """Errors worth retrying: rate limits, provider 5xx, network trouble."""
+    if isinstance(exc, genai_errors.APIError):
+        return exc.code in TRANSIENT_STATUS_CODES
+    return isinstance(exc, (httpx.TimeoutException, httpx.TransportError))
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter (attempt starts at 0)."""
+    ceiling = min(
+        settings.GEMINI_RETRY_MAX_DELAY_SECONDS,
+        settings.GEMINI_RETRY_BASE_DELAY_SECONDS * (2**attempt),
+    )
+    return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker.
+
+    After GEMINI_CIRCUIT_FAILURE_THRESHOLD consecutive transient failures
+    the circuit opens and calls fail fast with GeminiUnavailableError.
+    After GEMINI_CIRCUIT_RESET_SECONDS a single trial call is let through
+    (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if (
+                self._state == self.OPEN
+                and time.monotonic() - self._opened_at >= self.reset_seconds
+            ):
+                return self.HALF_OPEN
+            return self._state
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    raise GeminiUnavailableError(
+                        f"Gemini circuit open for {self.name}, failing fast"
+                    )
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight:
+                raise GeminiUnavailableError(
+                    f"Gemini circuit half-open for {self.name}, trial in flight"
+                )
+            self._trial_in_flight = True
+
+    def cancel_trial(self) -> None:
+        """The call never reached the API (queue timeout, cancellation)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Gemini circuit closed for %s", self.name)
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if (
+                self._state == self.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                if self._state != self.OPEN:
+                    logger.warning(
+                        "Gemini circuit opened for %s after %s failures",
+                        self.name,
+                        self._failures,
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self._failures}
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(model: str = MODEL_NAME) -> CircuitBreaker:
+    """Get the circuit breaker for a model."""
+    with _breakers_lock:
+        breaker = _breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                model,
+                failure_threshold=settings.GEMINI_CIRCUIT_FAILURE_THRESHOLD,
+                reset_seconds=settings.GEMINI_CIRCUIT_RESET_SECONDS,
+            )
+            _breakers[model] = breaker
+        return breaker
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per thinking level."""
+
+    MIN_SAMPLES = 20
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._samples: dict[str, deque[float]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+
+    def record(self, thinking_level: ThinkingLevel, seconds: float) -> None:
+        with self._lock:
+            self._samples[thinking_level.value].append(seconds)
+
+    def percentile(self, thinking_level: ThinkingLevel, q: float) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples[thinking_level.value])
+        if len(samples) < self.MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(q * len(samples)))
+        return samples[index]
+
+
+_latency_tracker = LatencyTracker()
+
+
+def _hedge_delay(thinking_level: ThinkingLevel) -> float:
+    """Send the duplicate once the primary is slower than the p95."""
+    p95 = _latency_tracker.percentile(
+        thinking_level, settings.GEMINI_HEDGE_PERCENTILE
+    )
+    if p95 is None:
+        return settings.GEMINI_HEDGE_DEFAULT_DELAY_SECONDS
+    return max(p95, settings.GEMINI_HEDGE_MIN_DELAY_SECONDS)
+
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    if _hedge_executor is None:
+        _hedge_executor = ThreadPoolExecutor(
+            max_workers=max(2, settings.GEMINI_MAX_IN_FLIGHT),
+            thread_name_prefix="gemini-hedge",
+        )
+    return _hedge_executor
+
+
+def resilience_stats() -> dict[str, Any]:
+    """Circuit breaker states and hedge thresholds."""
+    with _breakers_lock:
+        breakers = {name: b.stats() for name, b in _breakers.items()}
+    return {
+        "circuit_breakers": breakers,
+        "hedging_enabled": settings.GEMINI_HEDGE_ENABLED,
+        "hedge_delay_seconds": round(_hedge_delay(ThinkingLevel.MINIMAL), 3),
+    }
+
+
 def _get_client() -> genai.Client:
-    """Get configured Gemini client."""
-    return genai.Client(api_key=settings.GOOGLE_GEMINI_API_KEY)
+    """Get the shared, connection-pooled Gemini client."""
+    return get_gemini_client_manager().client
+
+
+def _build_contents(
+    prompt: str, image_bytes: bytes | memoryview | None, mime_type: str
+) -> list[Any]:
+    """Build content parts: image first (if any), then the prompt."""
+    contents: list[Any] = []
+
+    if image_bytes:
+        if isinstance(image_bytes, memoryview):
+            # The SDK's Blob model only accepts bytes
+            image_bytes = image_bytes.tobytes()
+        contents.append(
+            types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
+        )
+
+    contents.append(prompt)
+    return contents
+
+
+# Schema/config registry: wrapper models, compiled schemas and generation
+# configs are built once per (schema, thinking level) and reused.
+_schema_lock = threading.Lock()
+_list_wrappers: dict[Type[BaseModel], Type[BaseModel]] = {}
+_compiled_configs: dict[
+    tuple[Type[BaseModel] | None, ThinkingLevel], types.GenerateContentConfig
+] = {}
+
+
+def _compile_schema(response_schema: Type[BaseModel]) -> Any:
+    """
+    Convert a pydantic model to an SDK Schema once.
+
+    Passing the model class makes the SDK regenerate its JSON schema on
+    every request; a compiled Schema only gets a cheap normalization pass.
+    Falls back to the class if the SDK helper is unavailable.
+    """
+    try:
+        return genai_transformers.t_schema(None, response_schema)
+    except Exception as exc:
+        logger.warning(
+            "Could not precompile schema %s: %s", response_schema.__name__, exc
+        )
+        return response_schema
+
+
+def _build_config(
+    thinking_level: ThinkingLevel, response_schema: Type[BaseModel] | None
+) -> types.GenerateContentConfig:
+    """
+    Configure generation with (optionally) structured output.
+
+    Cached per (schema, thinking level) - treat the result as read-only and
+    use model_copy(update=...) for per-request changes.
+    """
+    key = (response_schema, thinking_level)
+    config = _compiled_configs.get(key)
+    if config is not None:
+        return config
+
+    config = types.GenerateContentConfig(
+        thinking_config=types.ThinkingConfig(
+            thinking_level=thinking_level.value
+        ),
+        response_mime_type="application/json",
+        response_schema=(
+            _compile_schema(response_schema) if response_schema else None
+        ),
+    )
+    with _schema_lock:
+        return _compiled_configs.setdefault(key, config)
+
+
+def _list_wrapper(item_schema: Type[BaseModel]) -> Type[BaseModel]:
+    """For lists, we create a wrapper schema (once per item schema)."""
+    wrapper = _list_wrappers.get(item_schema)
+    if wrapper is not None:
+        return wrapper
+
+    class ListWrapper(BaseModel):
+        items: list[item_schema]  # type: ignore
+
+    with _schema_lock:
+        return _list_wrappers.setdefault(item_schema, ListWrapper)
+
+
+def _with_prefix(
+    config: types.GenerateContentConfig,
+    system_prompt: str | None,
+    allow_cache: bool = True,
+) -> tuple[types.GenerateContentConfig, str | None]:
+    """Attach the static prompt prefix: context cache reference or inline."""
+    return get_context_cache().apply(
+        MODEL_NAME,
+        system_prompt,
+        config,
+        explicit=allow_cache and get_gemini_backend().mode == "live",
+    )
+
+
+def _live_send(
+    contents: list[Any], config: types.GenerateContentConfig
+) -> types.GenerateContentResponse:
+    return _get_client().models.generate_content(
+        model=MODEL_NAME,
+        contents=contents,
+        config=config,
+    )
+
+
+async def _alive_send(
+    contents: list[Any], config: types.GenerateContentConfig
+) -> types.GenerateContentResponse:
+    return await _get_client().aio.models.generate_content(
+        model=MODEL_NAME,
+        contents=contents,
+        config=config,
+    )
+
+
+def _send(
+    contents: list[Any], config: types.GenerateContentConfig
+) -> types.GenerateContentResponse:
+    """Single blocking model call through the configured backend."""
+    return get_gemini_backend().generate(MODEL_NAME, contents, config, _live_send)
+
+
+async def _asend(
+    contents: list[Any], config: types.GenerateContentConfig
+) -> types.GenerateContentResponse:
+    """Single async model call (SDK's aio client) through the backend."""
+    return await get_gemini_backend().agenerate(
+        MODEL_NAME, contents, config, _alive_send
+    )
+
+
+def _send_hedged(
+    contents: list[Any],
+    config: types.GenerateContentConfig,
+    thinking_level: ThinkingLevel,
+    priority: GeminiPriority,
+    tenant_id: str | None,
+) -> types.GenerateContentResponse:
+    """
+    Send the request, and a duplicate if the first is slower than the p95.
+
+    The duplicate only goes out when the scheduler has a free slot, so
+    hedging never queues in front of other work. First success wins; a
+    blocking call can't be cancelled, the loser finishes in the background.
+    """
+    executor = _get_hedge_executor()
+    primary = executor.submit(_send, contents, config)
+    done, _ = wait_futures([primary], timeout=_hedge_delay(thinking_level))
+    if done:
+        return primary.result()
+
+    scheduler = get_gemini_scheduler()
+    hedge_slot = scheduler.try_acquire(priority, tenant_id)
+    if hedge_slot is None:
+        return primary.result()
+
+    logger.info("Gemini hedge request sent (thinking=%s)", thinking_level.value)
+    hedge = executor.submit(_send, contents, config)
+    hedge.add_done_callback(lambda _: scheduler.release(hedge_slot))
+
+    pending = {primary, hedge}
+    error: BaseException | None = None
+    while pending:
+        done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    assert error is not None
+    raise error
+
+
+async def _asend_hedged(
+    contents: list[Any],
+    config: types.GenerateContentConfig,
+    thinking_level: ThinkingLevel,
+    priority: GeminiPriority,
+    tenant_id: str | None,
+) -> types.GenerateContentResponse:
+    """Async hedging - same policy as _send_hedged(), the loser is cancelled."""
+    scheduler = get_gemini_scheduler()
+    primary = asyncio.ensure_future(_asend(contents, config))
+    hedge: asyncio.Future[types.GenerateContentResponse] | None = None
+    hedge_slot: GeminiSlot | None = None
+
+    try:
+        done, _ = await asyncio.wait(
+            {primary}, timeout=_hedge_delay(thinking_level)
+        )
+        if done:
+            return primary.result()
+
+        hedge_slot = scheduler.try_acquire(priority, tenant_id)
+        if hedge_slot is None:
+            return await primary
+
+        logger.info("Gemini hedge request sent (thinking=%s)", thinking_level.value)
+        hedge = asyncio.ensure_future(_asend(contents, config))
+        pending: set[asyncio.Future[types.GenerateContentResponse]] = {
+            primary,
+            hedge,
+        }
+        error: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        assert error is not None
+        raise error
+    finally:
+        for task in (primary, hedge):
+            if task is not None and not task.done():
+                task.cancel()
+        if hedge_slot is not None:
+            scheduler.release(hedge_slot)
+
+
+def _should_hedge(hedge: bool, thinking_level: ThinkingLevel) -> bool:
+    return (
+        hedge
+        and settings.GEMINI_HEDGE_ENABLED
+        and thinking_level == ThinkingLevel.MINIMAL
+    )
+
+
+def _call_with_retries(
+    contents: list[Any],
+    config: types.GenerateContentConfig,
+    thinking_level: ThinkingLevel,
+    priority: GeminiPriority,
+    tenant_id: str | None,
+    hedge: bool = False,
+) -> types.GenerateContentResponse:
+    """
+    Blocking model call with scheduling, retries and circuit breaking.
+
+    Each attempt holds a scheduler slot; the slot is released while
+    backing off so other calls can proceed.
+    """
+    breaker = get_circuit_breaker(MODEL_NAME)
+    scheduler = get_gemini_scheduler()
+    max_attempts = max(1, settings.GEMINI_RETRY_MAX_ATTEMPTS)
+
+    for attempt in range(max_attempts):
+        breaker.before_call()
+        try:
+            with scheduler.slot(priority, tenant_id):
+                started = time.perf_counter()
+                if _should_hedge(hedge, thinking_level):
+                    response = _send_hedged(
+                        contents, config, thinking_level, priority, tenant_id
+                    )
+                else:
+                    response = _send(contents, config)
+        except GeminiError:
+            breaker.cancel_trial()
+            raise
+        except Exception as e:
+            if not _is_transient(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt + 1 >= max_attempts:
+                raise
+            delay = _backoff_delay(attempt)
+            logger.warning(
+                f"Gemini transient error ({type(e).__name__}: {e}), "
+                f"retry {attempt + 1}/{max_attempts - 1} in {delay:.2f}s"
+            )
+            time.sleep(delay)
+            continue
+
+        breaker.record_success()
+        _latency_tracker.record(thinking_level, time.perf_counter() - started)
+        return response
+
+    raise GeminiAPIError("Gemini retries exhausted")
+
+
+async def _acall_with_retries(
+    contents: list[Any],
+    config: types.GenerateContentConfig,
+    thinking_level: ThinkingLevel,
+    priority: GeminiPriority,
+    tenant_id: str | None,
+    hedge: bool = False,
+) -> types.GenerateContentResponse:
+    """Async variant of _call_with_retries()."""
+    breaker = get_circuit_breaker(MODEL_NAME)
+    scheduler = get_gemini_scheduler()
+    max_attempts = max(1, settings.GEMINI_RETRY_MAX_ATTEMPTS)
+
+    for attempt in range(max_attempts):
+        breaker.before_call()
+        try:
+            async with scheduler.aslot(priority, tenant_id):
+                started = time.perf_counter()
+                if _should_hedge(hedge, thinking_level):
+                    response = await _asend_hedged(
+                        contents, config, thinking_level, priority, tenant_id
+                    )
+                else:
+                    response = await _asend(contents, config)
+        except (GeminiError, asyncio.CancelledError):
+            breaker.cancel_trial()
+            raise
+        except Exception as e:
+            if not _is_transient(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt + 1 >= max_attempts:
+                raise
+            delay = _backoff_delay(attempt)
+            logger.warning(
+                f"Gemini transient error ({type(e).__name__}: {e}), "
+                f"retry {attempt + 1}/{max_attempts - 1} in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
+            continue
+
+        breaker.record_success()
+        _latency_tracker.record(thinking_level, time.perf_counter() - started)
+        return response
+
+    raise GeminiAPIError("Gemini retries exhausted")
+
+
+def _record_usage(
+    schema_name: str,
+    thinking_level: ThinkingLevel,
+    priority: GeminiPriority,
+    tenant_id: str | None,
+    image_size: int,
+    started: float,
+    response: types.GenerateContentResponse | None = None,
+    error: BaseException | None = None,
+    context_cached: bool = False,
+) -> None:
+    try:
+        record = record_gemini_call(
+            schema=schema_name,
+            thinking_level=thinking_level.value,
+            priority=priority.name,
+            tenant_id=tenant_id,
+            image_bytes=image_size,
+            wall_seconds=time.perf_counter() - started,
+            usage_metadata=getattr(response, "usage_metadata", None),
+            error=error,
+        )
+        get_context_cache().observe(record, context_cached)
+    except Exception as exc:  # Accounting must never break a scan
+        logger.warning(f"Recording Gemini usage failed: {exc}")
+
+
+def _generate(
+    contents: list[Any],
+    config: types.GenerateContentConfig,
+    thinking_level: ThinkingLevel,
+    priority: GeminiPriority,
+    tenant_id: str | None,
+    hedge: bool = False,
+    schema_name: str = "text",
+    image_size: int = 0,
+    system_prompt: str | None = None,
+    allow_cache: bool = True,
+) -> str:
+    """Model call with retries, recorded in the usage registry; returns text."""
+    request_config, cache_name = _with_prefix(config, system_prompt, allow_cache)
+    started = time.perf_counter()
+    usage = (schema_name, thinking_level, priority, tenant_id, image_size, started)
+    try:
+        response = _call_with_retries(
+            contents, request_config, thinking_level, priority, tenant_id, hedge=hedge
+        )
+    except BaseException as e:
+        if cache_name and get_context_cache().is_stale_error(e):
+            logger.warning(f"Context cache {cache_name} rejected, resending inline")
+            get_context_cache().invalidate(cache_name)
+            return _generate(
+                contents,
+                config,
+                thinking_level,
+                priority,
+                tenant_id,
+                hedge=hedge,
+                schema_name=schema_name,
+                image_size=image_size,
+                system_prompt=system_prompt,
+                allow_cache=False,
+            )
+        _record_usage(*usage, error=e)
+        raise
+    _record_usage(*usage, response=response, context_cached=cache_name is not None)
+    return response.text or ""
+
+
+async def _agenerate(
+    contents: list[Any],
+    config: types.GenerateContentConfig,
+    thinking_level: ThinkingLevel,
+    priority: GeminiPriority,
+    tenant_id: str | None,
+    hedge: bool = False,
+    schema_name: str = "text",
+    image_size: int = 0,
+    system_prompt: str | None = None,
+    allow_cache: bool = True,
+) -> str:
+    """Async variant of _generate()."""
+    request_config, cache_name = _with_prefix(config, system_prompt, allow_cache)
+    started = time.perf_counter()
+    usage = (schema_name, thinking_level, priority, tenant_id, image_size, started)
+    try:
+        response = await _acall_with_retries(
+            contents, request_config, thinking_level, priority, tenant_id, hedge=hedge
+        )
+    except BaseException as e:
+        if cache_name and get_context_cache().is_stale_error(e):
+            logger.warning(f"Context cache {cache_name} rejected, resending inline")
+            get_context_cache().invalidate(cache_name)
+            return await _agenerate(
+                contents,
+                config,
+                thinking_level,
+                priority,
+                tenant_id,
+                hedge=hedge,
+                schema_name=schema_name,
+                image_size=image_size,
+                system_prompt=system_prompt,
+                allow_cache=False,
+            )
+        _record_usage(*usage, error=e)
+        raise
+    _record_usage(*usage, response=response, context_cached=cache_name is not None)
+    return response.text or ""
+
+
+class _StreamedItemParser:
+    """
+    Pull complete items out of a streamed {"items": [...]} document.
+
+    Tracks nesting (ignoring brackets inside strings) and hands out each
+    object of the top-level array once its closing brace arrives.
+    """
+
+    def __init__(self):
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._item: list[str] = []
+
+    def feed(self, text: str) -> list[dict[str, Any]]:
+        items: list[dict[str, Any]] = []
+        for char in text:
+            capturing = len(self._stack) >= 3
+            if self._in_string:
+                if capturing:
+                    self._item.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append(char)
+                capturing = capturing or self._stack == ["{", "[", "{"]
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+
+            if capturing:
+                self._item.append(char)
+                if len(self._stack) == 2:
+                    items.append(self._parse_item("".join(self._item)))
+                    self._item = []
+        return items
+
+    @staticmethod
+    def _parse_item(text: str) -> dict[str, Any]:
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON parse error in streamed item: {e}")
+            raise GeminiParseError(f"Invalid JSON in streamed item: {e}") from e
+
+
+async def _alive_stream(
+    contents: list[Any], config: types.GenerateContentConfig
+) -> AsyncIterator[types.GenerateContentResponse]:
+    return await _get_client().aio.models.generate_content_stream(
+        model=MODEL_NAME,
+        contents=contents,
+        config=config,
+    )
+
+
+async def _astream_with_retries(
+    contents: list[Any],
+    config: types.GenerateContentConfig,
+    priority: GeminiPriority,
+    tenant_id: str | None,
+) -> AsyncIterator[types.GenerateContentResponse]:
+    """
+    Streamed model call with scheduling and circuit breaking.
+
+    The scheduler slot is held until the stream ends. Transient errors are
+    retried only before the first chunk - after that the caller has
+    already seen output.
+    """
+    breaker = get_circuit_breaker(MODEL_NAME)
+    scheduler = get_gemini_scheduler()
+    max_attempts = max(1, settings.GEMINI_RETRY_MAX_ATTEMPTS)
+
+    for attempt in range(max_attempts):
+        breaker.before_call()
+        received = False
+        try:
+            async with scheduler.aslot(priority, tenant_id):
+                async for chunk in await _alive_stream(contents, config):
+                    received = True
+                    yield chunk
+        except (GeminiError, asyncio.CancelledError, GeneratorExit):
+            breaker.cancel_trial()
+            raise
+        except Exception as e:
+            if not _is_transient(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if received or attempt + 1 >= max_attempts:
+                raise
+            delay = _backoff_delay(attempt)
+            logger.warning(
+                f"Gemini transient error ({type(e).__name__}: {e}), "
+                f"retry {attempt + 1}/{max_attempts - 1} in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
+            continue
+
+        breaker.record_success()
+        return
+
+    raise GeminiAPIError("Gemini retries exhausted")
+
+
+def _parse_structured(text: str) -> dict[str, Any]:
+    if not text:
+        raise GeminiAPIError("Empty response from Gemini API")
+
+    try:
+        # Parse JSON - should be valid due to structured output
+        result = json.loads(text)
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON parse error despite structured output: {e}")
+        raise GeminiParseError(f"Invalid JSON in response: {e}") from e
+
+    logger.info(f"Gemini response parsed successfully")
+    return result
+
+
+def _parse_list(text: str) -> list[dict[str, Any]]:
+    if not text:
+        logger.warning("Empty response from Gemini, returning empty list")
+        return []
+
+    try:
+        result = json.loads(text)
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON parse error: {e}")
+        raise GeminiParseError(f"Invalid JSON in response: {e}") from e
+
+    # Extract items from wrapper
+    items = result.get("items", [])
+    logger.info(f"Gemini returned {len(items)} items")
+    return items
+
+
+def _api_error(e: Exception) -> GeminiAPIError:
+    error_msg = str(e)
+    get_gemini_client_manager().record_failure(e)
+    logger.error(f"Gemini API error: {type(e).__name__}: {error_msg}")
+    return GeminiAPIError(f"Gemini API call failed: {error_msg}")
 
 
 def generate_structured(
     prompt: str,
     response_schema: Type[BaseModel],
-    image_bytes: bytes | None = None,
+    image_bytes: bytes | memoryview | None = None,
     mime_type: str = "image/jpeg",
     thinking_level: ThinkingLevel = ThinkingLevel.MINIMAL,
+    priority: GeminiPriority = GeminiPriority.INTERACTIVE_SCAN,
+    tenant_id: str | None = None,
+    hedge: bool = False,
+    system_prompt: str | None = None,
 ) -> dict[str, Any]:
     """
     Generate structured JSON response from Gemini 3 Flash.
 
     Uses Pydantic schema for guaranteed valid output structure.
+    Blocking - use agenerate_structured() from async code.
 
     Args:
         prompt: The text prompt
@@ -72,16 +1318,22 @@ def generate_structured(
         image_bytes: Optional image data
         mime_type: MIME type of the image
         thinking_level: Controls reasoning depth
+        priority: Scheduling class when Gemini capacity is contended
+        tenant_id: Owner user id, used for per-tenant fair share
+        hedge: Allow a hedged duplicate request for MINIMAL thinking
+            (only when GEMINI_HEDGE_ENABLED)
+        system_prompt: Static instructions/examples, sent as system
+            instruction and served from a context cache when possible
 
     Returns:
         Parsed JSON dict matching the schema
 
     Raises:
-        GeminiAPIError: When API call fails
+        GeminiAPIError: When API call fails after retries
+            (GeminiOverloadedError when no scheduler slot frees up in time,
+            GeminiUnavailableError while the circuit breaker is open)
         GeminiParseError: When response is invalid
     """
-    client = _get_client()
-
     logger.info(
         f"Gemini request: model={MODEL_NAME}, "
         f"thinking={thinking_level.value}, "
@@ -89,63 +1341,93 @@ def generate_structured(
         f"has_image={image_bytes is not None}"
     )
 
-    # Build content parts
-    contents: list[Any] = []
+    contents = _build_contents(prompt, image_bytes, mime_type)
+    config = _build_config(thinking_level, response_schema)
 
-    if image_bytes:
-        # Add image first, then prompt
-        contents.append(
-            types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
+    try:
+        text = _generate(
+            contents,
+            config,
+            thinking_level,
+            priority,
+            tenant_id,
+            hedge=hedge,
+            schema_name=response_schema.__name__,
+            image_size=len(image_bytes) if image_bytes else 0,
+            system_prompt=system_prompt,
         )
+    except GeminiError:
+        raise
+    except Exception as e:
+        raise _api_error(e) from e
 
-    contents.append(prompt)
-
-    # Configure generation with structured output
-    config = types.GenerateContentConfig(
-        thinking_config=types.ThinkingConfig(
-            thinking_level=thinking_level.value
-        ),
-        response_mime_type="application/json",
-        response_schema=response_schema,
-    )
+    get_gemini_client_manager().record_success()
+    return _parse_structured(text)
 
-    try:
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=contents,
-            config=config,
-        )
 
-        if not response.text:
-            raise GeminiAPIError("Empty response from Gemini API")
+async def agenerate_structured(
+    prompt: str,
+    response_schema: Type[BaseModel],
+    image_bytes: bytes | memoryview | None = None,
+    mime_type: str = "image/jpeg",
+    thinking_level: ThinkingLevel = ThinkingLevel.MINIMAL,
+    priority: GeminiPriority = GeminiPriority.INTERACTIVE_SCAN,
+    tenant_id: str | None = None,
+    hedge: bool = False,
+    system_prompt: str | None = None,
+) -> dict[str, Any]:
+    """
+    Async variant of generate_structured().
 
-        # Parse JSON - should be valid due to structured output
-        import json
-        result = json.loads(response.text)
+    Awaits the SDK's async client so the event loop keeps serving other
+    requests while the model is thinking.
+    """
+    logger.info(
+        f"Gemini async request: model={MODEL_NAME}, "
+        f"thinking={thinking_level.value}, "
+        f"schema={response_schema.__name__}, "
+        f"has_image={image_bytes is not None}"
+    )
 
-        logger.info(f"Gemini response parsed successfully")
-        return result
+    contents = _build_contents(prompt, image_bytes, mime_type)
+    config = _build_config(thinking_level, response_schema)
 
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON parse error despite structured output: {e}")
-        raise GeminiParseError(f"Invalid JSON in response: {e}") from e
+    try:
+        text = await _agenerate(
+            contents,
+            config,
+            thinking_level,
+            priority,
+            tenant_id,
+            hedge=hedge,
+            schema_name=response_schema.__name__,
+            image_size=len(image_bytes) if image_bytes else 0,
+            system_prompt=system_prompt,
+        )
+    except GeminiError:
+        raise
     except Exception as e:
-        error_msg = str(e)
-        logger.error(f"Gemini API error: {type(e).__name__}: {error_msg}")
-        raise GeminiAPIError(f"Gemini API call failed: {error_msg}") from e
+        raise _api_error(e) from e
+
+    get_gemini_client_manager().record_success()
+    return _parse_structured(text)
 
 
 def generate_structured_list(
     prompt: str,
     item_schema: Type[BaseModel],
-    image_bytes: bytes | None = None,
+    image_bytes: bytes | memoryview | None = None,
     mime_type: str = "image/jpeg",
     thinking_level: ThinkingLevel = ThinkingLevel.MEDIUM,
+    priority: GeminiPriority = GeminiPriority.SHELF_SCAN,
+    tenant_id: str | None = None,
+    system_prompt: str | None = None,
 ) -> list[dict[str, Any]]:
     """
     Generate a list of structured items from Gemini 3 Flash.
 
     For multi-item recognition (shelf scan, invoice items).
+    Blocking - use agenerate_structured_list() from async code.
 
     Args:
         prompt: The text prompt
@@ -153,74 +1435,193 @@ def generate_structured_list(
         image_bytes: Optional image data
         mime_type: MIME type of the image
         thinking_level: Controls reasoning depth
+        priority: Scheduling class when Gemini capacity is contended
+        tenant_id: Owner user id, used for per-tenant fair share
+        system_prompt: Static instructions (see generate_structured())
 
     Returns:
         List of dicts, each matching the item schema
     """
-    client = _get_client()
-
     logger.info(
         f"Gemini list request: model={MODEL_NAME}, "
         f"thinking={thinking_level.value}, "
         f"item_schema={item_schema.__name__}"
     )
 
-    contents: list[Any] = []
+    contents = _build_contents(prompt, image_bytes, mime_type)
+    config = _build_config(thinking_level, _list_wrapper(item_schema))
 
-    if image_bytes:
-        contents.append(
-            types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
+    try:
+        text = _generate(
+            contents,
+            config,
+            thinking_level,
+            priority,
+            tenant_id,
+            schema_name=f"list[{item_schema.__name__}]",
+            image_size=len(image_bytes) if image_bytes else 0,
+            system_prompt=system_prompt,
         )
+    except GeminiError:
+        raise
+    except Exception as e:
+        raise _api_error(e) from e
 
-    contents.append(prompt)
+    get_gemini_client_manager().record_success()
+    return _parse_list(text)
 
-    # For lists, we create a wrapper schema
-    class ListWrapper(BaseModel):
-        items: list[item_schema]  # type: ignore
 
-    config = types.GenerateContentConfig(
-        thinking_config=types.ThinkingConfig(
-            thinking_level=thinking_level.value
-        ),
-        response_mime_type="application/json",
-        response_schema=ListWrapper,
+async def agenerate_structured_list(
+    prompt: str,
+    item_schema: Type[BaseModel],
+    image_bytes: bytes | memoryview | None = None,
+    mime_type: str = "image/jpeg",
+    thinking_level: ThinkingLevel = ThinkingLevel.MEDIUM,
+    priority: GeminiPriority = GeminiPriority.SHELF_SCAN,
+    tenant_id: str | None = None,
+    system_prompt: str | None = None,
+) -> list[dict[str, Any]]:
+    """Async variant of generate_structured_list()."""
+    logger.info(
+        f"Gemini async list request: model={MODEL_NAME}, "
+        f"thinking={thinking_level.value}, "
+        f"item_schema={item_schema.__name__}"
     )
 
+    contents = _build_contents(prompt, image_bytes, mime_type)
+    config = _build_config(thinking_level, _list_wrapper(item_schema))
+
     try:
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=contents,
-            config=config,
+        text = await _agenerate(
+            contents,
+            config,
+            thinking_level,
+            priority,
+            tenant_id,
+            schema_name=f"list[{item_schema.__name__}]",
+            image_size=len(image_bytes) if image_bytes else 0,
+            system_prompt=system_prompt,
         )
+    except GeminiError:
+        raise
+    except Exception as e:
+        raise _api_error(e) from e
 
-        if not response.text:
-            logger.warning("Empty response from Gemini, returning empty list")
-            return []
+    get_gemini_client_manager().record_success()
+    return _parse_list(text)
 
-        import json
-        result = json.loads(response.text)
 
-        # Extract items from wrapper
-        items = result.get("items", [])
-        logger.info(f"Gemini returned {len(items)} items")
-        return items
+async def astream_structured_list(
+    prompt: str,
+    item_schema: Type[BaseModel],
+    image_bytes: bytes | memoryview | None = None,
+    mime_type: str = "image/jpeg",
+    thinking_level: ThinkingLevel = ThinkingLevel.MEDIUM,
+    priority: GeminiPriority = GeminiPriority.SHELF_SCAN,
+    tenant_id: str | None = None,
+    system_prompt: str | None = None,
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    Streaming variant of agenerate_structured_list().
 
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON parse error: {e}")
-        raise GeminiParseError(f"Invalid JSON in response: {e}") from e
+    Uses the SDK's streamed output and yields each item as soon as its
+    JSON object is complete, so callers can show the first product while
+    the model is still writing the rest. Non-live backends don't stream;
+    they yield all items once the response is in.
+
+    Raises:
+        GeminiAPIError: When the API call fails (also mid-stream)
+        GeminiParseError: When a streamed item is invalid
+    """
+    if get_gemini_backend().mode != "live":
+        for item in await agenerate_structured_list(
+            prompt,
+            item_schema,
+            image_bytes=image_bytes,
+            mime_type=mime_type,
+            thinking_level=thinking_level,
+            priority=priority,
+            tenant_id=tenant_id,
+            system_prompt=system_prompt,
+        ):
+            yield item
+        return
+
+    logger.info(
+        f"Gemini streamed list request: model={MODEL_NAME}, "
+        f"thinking={thinking_level.value}, "
+        f"item_schema={item_schema.__name__}"
+    )
+
+    contents = _build_contents(prompt, image_bytes, mime_type)
+    config = _build_config(thinking_level, _list_wrapper(item_schema))
+    request_config, cache_name = _with_prefix(config, system_prompt)
+    parser = _StreamedItemParser()
+    started = time.perf_counter()
+    usage = (
+        f"list[{item_schema.__name__}]",
+        thinking_level,
+        priority,
+        tenant_id,
+        len(image_bytes) if image_bytes else 0,
+        started,
+    )
+    last_chunk: types.GenerateContentResponse | None = None
+    count = 0
+
+    async def chunks() -> AsyncIterator[types.GenerateContentResponse]:
+        nonlocal cache_name
+        received = False
+        try:
+            async for chunk in _astream_with_retries(
+                contents, request_config, priority, tenant_id
+            ):
+                received = True
+                yield chunk
+        except Exception as e:
+            context_cache = get_context_cache()
+            if received or not cache_name or not context_cache.is_stale_error(e):
+                raise
+            logger.warning(f"Context cache {cache_name} rejected, resending inline")
+            context_cache.invalidate(cache_name)
+            cache_name = None
+            inline_config, _ = _with_prefix(config, system_prompt, allow_cache=False)
+            async for chunk in _astream_with_retries(
+                contents, inline_config, priority, tenant_id
+            ):
+                yield chunk
+
+    try:
+        async for chunk in chunks():
+            # Token counts arrive with the final chunk
+            if chunk.usage_metadata is not None:
+                last_chunk = chunk
+            for item in parser.feed(chunk.text or ""):
+                count += 1
+                yield item
+    except GeminiError as e:
+        _record_usage(*usage, response=last_chunk, error=e)
+        raise
     except Exception as e:
-        error_msg = str(e)
-        logger.error(f"Gemini API error: {type(e).__name__}: {error_msg}")
-        raise GeminiAPIError(f"Gemini API call failed: {error_msg}") from e
+        _record_usage(*usage, response=last_chunk, error=e)
+        raise _api_error(e) from e
+
+    _record_usage(
+        *usage, response=last_chunk, context_cached=cache_name is not None
+    )
+    get_gemini_client_manager().record_success()
+    logger.info(f"Gemini streamed {count} items")
 
 
 # Legacy function for backwards compatibility during migration
 def generate_json(
     prompt: str,
-    image_bytes: bytes | None = None,
+    image_bytes: bytes | memoryview | None = None,
     mime_type: str = "image/jpeg",
     thinking_level: ThinkingLevel = ThinkingLevel.MINIMAL,
     response_schema: Type[BaseModel] | None = None,
+    priority: GeminiPriority = GeminiPriority.INTERACTIVE_SCAN,
+    tenant_id: str | None = None,
 ) -> Any:
     """
     Legacy wrapper - prefer generate_structured() for new code.
@@ -232,38 +1633,30 @@ def generate_json(
             image_bytes=image_bytes,
             mime_type=mime_type,
             thinking_level=thinking_level,
+            priority=priority,
+            tenant_id=tenant_id,
         )
 
     # Fallback to unstructured (not recommended)
-    client = _get_client()
-
-    contents: list[Any] = []
-    if image_bytes:
-        contents.append(
-            types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
-        )
-    contents.append(prompt)
-
-    config = types.GenerateContentConfig(
-        thinking_config=types.ThinkingConfig(
-            thinking_level=thinking_level.value
-        ),
-        response_mime_type="application/json",
-    )
+    contents = _build_contents(prompt, image_bytes, mime_type)
+    config = _build_config(thinking_level, None)
 
     try:
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=contents,
-            config=config,
+        text = _generate(
+            contents,
+            config,
+            thinking_level,
+            priority,
+            tenant_id,
+            image_size=len(image_bytes) if image_bytes else 0,
         )
-
-        if not response.text:
+        if not text:
             raise GeminiAPIError("Empty response")
-
-        import json
-        return json.loads(response.text)
-
+        result = json.loads(text)
     except Exception as e:
+        get_gemini_client_manager().record_failure(e)
         logger.error(f"Gemini error: {e}")
         raise GeminiAPIError(str(e)) from e
+
+    get_gemini_client_manager().record_success()
+    return result
@@ -0,0 +1,437 @@
+"""
+Pluggable model backends for the Gemini integration.
+
+The backend sits below scheduling, retries, hedging and usage accounting,
+so everything above it is exercised unchanged. Selected by GEMINI_BACKEND:
+- live: call the Gemini API (default)
+- record: call the API and save each request/response pair to disk
+- replay: serve recorded responses deterministically, no network
+- synthetic: schema-valid fake responses with a configurable latency
+  distribution, for load tests on a laptop
+
+Requests are keyed by model, prompt, image bytes, response schema and
+thinking level, so a replay run answers the same calls the recording saw.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+import anyio
+from google.genai import errors as genai_errors
+from google.genai import types
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SendFn = Callable[
+    [list[Any], types.GenerateContentConfig], types.GenerateContentResponse
+]
+AsyncSendFn = Callable[
+    [list[Any], types.GenerateContentConfig],
+    Awaitable[types.GenerateContentResponse],
+]
+
+BACKEND_MODES = ("live", "record", "replay", "synthetic")
+
+
+class GeminiReplayMissError(LookupError):
+    """Replay mode got a request that was never recorded."""
+
+
+def request_key(
+    model: str, contents: list[Any], config: types.GenerateContentConfig
+) -> str:
+    """Stable hash of everything that determines the model's answer."""
+    digest = hashlib.sha256(model.encode("utf-8"))
+    for part in contents:
+        if isinstance(part, str):
+            digest.update(b"text:" + part.encode("utf-8"))
+        elif getattr(part, "inline_data", None) is not None:
+            blob = part.inline_data
+            digest.update(f"blob:{blob.mime_type}:".encode("utf-8"))
+            digest.update(blob.data or b"")
+        elif getattr(part, "text", None):
+            digest.update(b"text:" + part.text.encode("utf-8"))
+        else:
+            digest.update(repr(part).encode("utf-8"))
+
+    schema = config.response_schema
+    if isinstance(schema, types.Schema):
+        digest.update(schema.model_dump_json(exclude_none=True).encode("utf-8"))
+    elif schema is not None:
+        digest.update(getattr(schema, "__name__", repr(schema)).encode("utf-8"))
+    if config.thinking_config is not None:
+        digest.update(f"thinking:{config.thinking_config.thinking_level}".encode())
+    if isinstance(config.system_instruction, str):
+        digest.update(b"system:" + config.system_instruction.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _prompt_text(contents: list[Any]) -> str:
+    return "\n".join(part for part in contents if isinstance(part, str))
+
+
+def build_response(
+    text: str, usage: dict[str, Any] | None = None
+) -> types.GenerateContentResponse:
+    """Wrap text (and optional usage counts) in an SDK response object."""
+    return types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(
+                content=types.Content(role="model", parts=[types.Part(text=text)]),
+                finish_reason=types.FinishReason.STOP,
+            )
+        ],
+        usage_metadata=(
+            types.GenerateContentResponseUsageMetadata(**usage) if usage else None
+        ),
+    )
+
+
+class GeminiBackend:
+    """Live pass-through; subclasses override generate()/agenerate()."""
+
+    mode = "live"
+
+    def generate(
+        self,
+        model: str,
+        contents: list[Any],
+        config: types.GenerateContentConfig,
+        send: SendFn,
+    ) -> types.GenerateContentResponse:
+        return send(contents, config)
+
+    async def agenerate(
+        self,
+        model: str,
+        contents: list[Any],
+        config: types.GenerateContentConfig,
+        asend: AsyncSendFn,
+    ) -> types.GenerateContentResponse:
+        return await asend(contents, config)
+
+    def stats(self) -> dict[str, Any]:
+        return {"mode": self.mode}
+
+
+class RecordingBackend(GeminiBackend):
+    """Calls the API and stores each request/response pair as JSON."""
+
+    mode = "record"
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def _save(
+        self,
+        model: str,
+        contents: list[Any],
+        config: types.GenerateContentConfig,
+        response: types.GenerateContentResponse,
+    ) -> None:
+        key = request_key(model, contents, config)
+        schema = config.response_schema
+        entry = {
+            "key": key,
+            "model": model,
+            "schema": getattr(schema, "title", None)
+            or getattr(schema, "__name__", None),
+            "thinking_level": (
+                str(config.thinking_config.thinking_level)
+                if config.thinking_config
+                else None
+            ),
+            "prompt": _prompt_text(contents)[:2000],
+            "text": response.text or "",
+            "usage": (
+                response.usage_metadata.model_dump(mode="json", exclude_none=True)
+                if response.usage_metadata
+                else None
+            ),
+        }
+        try:
+            path = self.directory / f"{key}.json"
+            path.write_text(json.dumps(entry, ensure_ascii=False, indent=2))
+        except OSError as exc:
+            logger.warning(f"Could not record Gemini response {key}: {exc}")
+            return
+        with self._lock:
+            self.recorded += 1
+
+    def generate(self, model, contents, config, send):
+        response = send(contents, config)
+        self._save(model, contents, config, response)
+        return response
+
+    async def agenerate(self, model, contents, config, asend):
+        response = await asend(contents, config)
+        await anyio.to_thread.run_sync(self._save, model, contents, config, response)
+        return response
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "directory": str(self.directory),
+            "recorded": self.recorded,
+        }
+
+
+class ReplayBackend(GeminiBackend):
+    """Serves recorded responses; unknown requests raise GeminiReplayMissError."""
+
+    mode = "replay"
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        if self.directory.is_dir():
+            for path in self.directory.glob("*.json"):
+                try:
+                    entry = json.loads(path.read_text())
+                except (OSError, ValueError) as exc:
+                    logger.warning(f"Skipping unreadable recording {path}: {exc}")
+                    continue
+                self._entries[entry["key"]] = entry
+        logger.info(
+            f"Gemini replay backend loaded {len(self._entries)} recordings "
+            f"from {self.directory}"
+        )
+
+    def _lookup(
+        self, model: str, contents: list[Any], config: types.GenerateContentConfig
+    ) -> types.GenerateContentResponse:
+        key = request_key(model, contents, config)
+        entry = self._entries.get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is None:
+            raise GeminiReplayMissError(f"No recording for request {key[:12]}")
+        return build_response(entry["text"], entry.get("usage"))
+
+    def generate(self, model, contents, config, send):
+        return self._lookup(model, contents, config)
+
+    async def agenerate(self, model, contents, config, asend):
+        return self._lookup(model, contents, config)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "recordings": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Field-name aware sample values so synthetic data looks like a bar inventory
+_SAMPLE_STRINGS: dict[str, list[str]] = {
+    "brand": ["Jägermeister", "Coca-Cola", "Beck's", "Bacardi", "Red Bull"],
+    "normalized_brand": ["Jägermeister", "Coca-Cola", "Beck's", "Bacardi"],
+    "product_name": ["Kräuterlikör", "Cola", "Pils", "Carta Blanca", "Energy"],
+    "normalized_name": ["Jägermeister 0,7l", "Coca-Cola 0,33l", "Beck's Pils"],
+    "variant": ["Zero", "Original", "Alkoholfrei", "Light"],
+    "size_display": ["0,7l", "0,33l", "0,5l", "1,0l"],
+    "normalized_size": ["0,7l", "0,33l", "0,5l", "1L"],
+    "category": ["Spirituosen", "Softdrinks", "Bier", "Wein"],
+    "normalized_category": ["Spirituosen", "Softdrinks", "Bier", "Wein"],
+    "packaging": ["Flasche", "Dose", "Fass", "Kasten"],
+    "barcode": ["4000000000000", "5449000000996", "4100130013018"],
+    "supplier_name": ["Getränke Müller GmbH", "Metro AG", "Bier Express"],
+    "invoice_number": ["RE-2026-00017", "4711", "INV-88231"],
+    "invoice_date": ["2026-01-15", "2026-02-03", "2026-03-21"],
+    "description": ["Jägerm. 0.7 Kräuterl.", "Coca Cola 24x0,33", "Becks Pils 0,5"],
+    "unit": ["Flasche", "Kiste", "Stück"],
+}
+
+
+class SyntheticBackend(GeminiBackend):
+    """
+    Schema-valid fake responses with log-normal latency per thinking level.
+
+    Output is seeded by the request key, so identical requests produce
+    identical answers. Optionally injects 503s to exercise retries and the
+    circuit breaker.
+    """
+
+    mode = "synthetic"
+
+    def __init__(
+        self,
+        latency_ms: dict[str, float],
+        sigma: float,
+        error_rate: float,
+        max_items: int,
+    ):
+        self.latency_ms = latency_ms
+        self.sigma = max(0.0, sigma)
+        self.error_rate = min(max(error_rate, 0.0), 1.0)
+        self.max_items = max(1, max_items)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.injected_errors = 0
+
+    def _latency(self, config: types.GenerateContentConfig) -> float:
+        level = (
+            str(config.thinking_config.thinking_level).lower()
+            if config.thinking_config
+            else "minimal"
+        )
+        level = level.rsplit(".", 1)[-1]
+        median_ms = self.latency_ms.get(level, self.latency_ms.get("minimal", 800))
+        return random.lognormvariate(0.0, self.sigma) * median_ms / 1000
+
+    def _fake_value(self, schema: types.Schema, name: str, rng: random.Random) -> Any:
+        if schema.nullable and rng.random() < 0.15:
+            return None
+        if schema.enum:
+            return rng.choice(schema.enum)
+
+        kind = schema.type
+        if kind == types.Type.OBJECT:
+            return {
+                prop: self._fake_value(sub, prop, rng)
+                for prop, sub in (schema.properties or {}).items()
+            }
+        if kind == types.Type.ARRAY:
+            count = rng.randint(1, self.max_items)
+            return [
+                self._fake_value(schema.items or types.Schema(), name, rng)
+                for _ in range(count)
+            ]
+        if kind == types.Type.INTEGER:
+            if name == "size_ml":
+                return rng.choice([330, 500, 700, 1000])
+            low = int(schema.minimum) if schema.minimum is not None else 1
+            high = int(schema.maximum) if schema.maximum is not None else 24
+            return rng.randint(low, high)
+        if kind == types.Type.NUMBER:
+            if name == "confidence":
+                return round(rng.uniform(0.6, 0.99), 2)
+            if name == "vat_rate":
+                return rng.choice([7.0, 19.0])
+            low = schema.minimum if schema.minimum is not None else 0.5
+            high = schema.maximum if schema.maximum is not None else 120.0
+            return round(rng.uniform(low, high), 2)
+        if kind == types.Type.BOOLEAN:
+            return rng.random() < 0.5
+        samples = _SAMPLE_STRINGS.get(name)
+        if samples:
+            return rng.choice(samples)
+        return f"{name or 'text'}-{rng.randint(1, 999)}"
+
+    def _respond(
+        self, model: str, contents: list[Any], config: types.GenerateContentConfig
+    ) -> types.GenerateContentResponse:
+        key = request_key(model, contents, config)
+        rng = random.Random(key)
+        with self._lock:
+            self.calls += 1
+            inject = self.error_rate and random.random() < self.error_rate
+            if inject:
+                self.injected_errors += 1
+        if inject:
+            raise genai_errors.ServerError(
+                503,
+                {
+                    "error": {
+                        "code": 503,
+                        "message": "Synthetic overload",
+                        "status": "UNAVAILABLE",
+                    }
+                },
+            )
+
+        schema = config.response_schema
+        if isinstance(schema, types.Schema):
+            text = json.dumps(self._fake_value(schema, "", rng), ensure_ascii=False)
+        else:
+            text = "{}"
+
+        images = sum(
+            1 for part in contents if getattr(part, "inline_data", None) is not None
+        )
+        input_tokens = len(_prompt_text(contents)) // 4 + images * 258
+        output_tokens = max(1, len(text) // 4)
+        thinking_tokens = rng.randint(0, 4 * output_tokens)
+        return build_response(
+            text,
+            {
+                "prompt_token_count": input_tokens,
+                "candidates_token_count": output_tokens,
+                "thoughts_token_count": thinking_tokens,
+                "total_token_count": input_tokens + output_tokens + thinking_tokens,
+            },
+        )
+
+    def generate(self, model, contents, config, send):
+        time.sleep(self._latency(config))
+        return self._respond(model, contents, config)
+
+    async def agenerate(self, model, contents, config, asend):
+        await asyncio.sleep(self._latency(config))
+        return self._respond(model, contents, config)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "latency_ms": self.latency_ms,
+            "calls": self.calls,
+            "injected_errors": self.injected_errors,
+        }
+
+
+def _parse_latencies(value: str) -> dict[str, float]:
+    """Parse "minimal:900,medium:4000" into {"minimal": 900.0, ...}."""
+    latencies: dict[str, float] = {}
+    for chunk in value.split(","):
+        level, _, millis = chunk.partition(":")
+        if level.strip() and millis.strip():
+            latencies[level.strip().lower()] = float(millis)
+    return latencies
+
+
+# Singleton instance
+_backend: Optional[GeminiBackend] = None
+
+
+def get_gemini_backend() -> GeminiBackend:
+    """Get the model backend selected by GEMINI_BACKEND."""
+    global _backend
+    if _backend is None:
+        mode = settings.GEMINI_BACKEND.lower()
+        if mode == "record":
+            _backend = RecordingBackend(settings.GEMINI_RECORDINGS_DIR)
+        elif mode == "replay":
+            _backend = ReplayBackend(settings.GEMINI_RECORDINGS_DIR)
+        elif mode == "synthetic":
+            _backend = SyntheticBackend(
+                latency_ms=_parse_latencies(settings.GEMINI_SYNTHETIC_LATENCY_MS),
+                sigma=settings.GEMINI_SYNTHETIC_LATENCY_SIGMA,
+                error_rate=settings.GEMINI_SYNTHETIC_ERROR_RATE,
+                max_items=settings.GEMINI_SYNTHETIC_MAX_ITEMS,
+            )
+        else:
+            if mode not in BACKEND_MODES:
+                logger.warning(f"Unknown GEMINI_BACKEND '{mode}', using live")
+            _backend = GeminiBackend()
+        if _backend.mode != "live":
+            logger.warning(f"Gemini backend mode: {_backend.mode}")
+    return _backend
@@ -0,0 +1,306 @@
+"""
+Gemini context caching for static prompt prefixes.
+
+The invoice and recognition prompts are several KB of static instructions
+and examples that were resent with every call. Callers now pass them as
+system_prompt; this module turns them into provider-side cached content:
+- First use of a prefix sends it as system_instruction (so the provider's
+  implicit prefix caching can apply) and creates the explicit cache in
+  the background - no request waits for cache creation
+- Later calls reference the cache (config.cached_content)
+- TTL is extended in the background while the prefix is in use; unused
+  caches expire on their own, all caches are deleted on shutdown
+- Prefixes the API refuses to cache (too small, unsupported model) are
+  not retried for GEMINI_CONTEXT_CACHE_RETRY_SECONDS
+- A cache that vanished server-side is dropped and the call repeated with
+  the inline system_instruction
+- Cached vs uncached input tokens and latency per operation, to measure
+  the savings (see snapshot())
+
+Only the live backend uses explicit caches; record/replay/synthetic runs
+get the prefix as system_instruction.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from google.genai import errors as genai_errors
+from google.genai import types
+
+from app.core.config import settings
+from app.core.gemini_usage import GeminiUsageRecord, UsageAggregate
+
+logger = logging.getLogger(__name__)
+
+# HTTP codes meaning "this cached content can't be used (any more)";
+# a 400 only counts when it is about the cache, not the request itself
+STALE_CACHE_STATUS_CODES = {403, 404}
+
+
+def prefix_key(model: str, system_prompt: str) -> str:
+    digest = hashlib.sha256(f"{model}\n{system_prompt}".encode("utf-8"))
+    return digest.hexdigest()[:24]
+
+
+@dataclass
+class ContextCacheEntry:
+    """One provider-side cached prefix."""
+
+    name: str
+    model: str
+    expires_at: float  # time.monotonic()
+    token_count: int = 0
+    uses: int = 0
+    refreshing: bool = False
+
+
+class GeminiContextCache:
+    """Explicit context caches per (model, system prompt)."""
+
+    def __init__(
+        self,
+        enabled: bool,
+        ttl_seconds: int,
+        min_chars: int,
+        retry_seconds: float,
+    ):
+        self.enabled = enabled
+        self._ttl_seconds = max(60, ttl_seconds)
+        self._min_chars = min_chars
+        self._retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._entries: dict[str, ContextCacheEntry] = {}
+        self._creating: set[str] = set()
+        self._refused_until: dict[str, float] = {}
+        self._executor: ThreadPoolExecutor | None = None
+        self._by_operation: dict[str, dict[str, UsageAggregate]] = defaultdict(
+            lambda: {"cached": UsageAggregate(), "uncached": UsageAggregate()}
+        )
+        self.hits = 0
+        self.misses = 0
+        self.creates = 0
+        self.create_failures = 0
+        self.refreshes = 0
+        self.stale = 0
+
+    def _client(self):
+        # Lazy import: app.core.gemini imports this module
+        from app.core.gemini import get_gemini_client_manager
+
+        return get_gemini_client_manager().client
+
+    def _submit(self, fn, *args) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="gemini-context-cache"
+            )
+        self._executor.submit(fn, *args)
+
+    def apply(
+        self,
+        model: str,
+        system_prompt: str | None,
+        config: types.GenerateContentConfig,
+        explicit: bool = True,
+    ) -> tuple[types.GenerateContentConfig, str | None]:
+        """
+        Per-request config carrying the static prefix.
+
+        Returns (config, cache name) - the name is None when the prefix is
+        sent inline as system_instruction.
+        """
+        if not system_prompt:
+            return config, None
+
+        inline = config.model_copy(update={"system_instruction": system_prompt})
+        if not (explicit and self.enabled) or len(system_prompt) < self._min_chars:
+            return inline, None
+
+        key = prefix_key(model, system_prompt)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at - now < 5:
+                del self._entries[key]  # About to expire server-side
+                entry = None
+
+            if entry is not None:
+                entry.uses += 1
+                self.hits += 1
+                refresh = (
+                    not entry.refreshing
+                    and entry.expires_at - now < self._ttl_seconds / 4
+                )
+                if refresh:
+                    entry.refreshing = True
+            else:
+                self.misses += 1
+                create = (
+                    key not in self._creating
+                    and self._refused_until.get(key, 0.0) <= now
+                )
+                if create:
+                    self._creating.add(key)
+
+        if entry is None:
+            if create:
+                self._submit(self._create, key, model, system_prompt)
+            return inline, None
+
+        if refresh:
+            self._submit(self._refresh, entry)
+        return config.model_copy(update={"cached_content": entry.name}), entry.name
+
+    def _create(self, key: str, model: str, system_prompt: str) -> None:
+        try:
+            cached = self._client().caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_prompt,
+                    display_name=f"prefix-{key[:12]}",
+                    ttl=f"{self._ttl_seconds}s",
+                ),
+            )
+        except Exception as exc:
+            logger.info(f"Context cache not created ({type(exc).__name__}: {exc})")
+            with self._lock:
+                self._creating.discard(key)
+                self._refused_until[key] = time.monotonic() + self._retry_seconds
+                self.create_failures += 1
+            return
+
+        usage = getattr(cached, "usage_metadata", None)
+        entry = ContextCacheEntry(
+            name=cached.name or "",
+            model=model,
+            expires_at=time.monotonic() + self._ttl_seconds,
+            token_count=int(getattr(usage, "total_token_count", None) or 0),
+        )
+        with self._lock:
+            self._creating.discard(key)
+            self._entries[key] = entry
+            self.creates += 1
+        logger.info(
+            f"Context cache created: {entry.name} ({entry.token_count} tokens)"
+        )
+
+    def _refresh(self, entry: ContextCacheEntry) -> None:
+        try:
+            self._client().caches.update(
+                name=entry.name,
+                config=types.UpdateCachedContentConfig(ttl=f"{self._ttl_seconds}s"),
+            )
+        except Exception as exc:
+            logger.info(f"Context cache refresh failed, dropping {entry.name}: {exc}")
+            self.invalidate(entry.name)
+            return
+        with self._lock:
+            entry.expires_at = time.monotonic() + self._ttl_seconds
+            entry.refreshing = False
+            self.refreshes += 1
+
+    def is_stale_error(self, exc: BaseException) -> bool:
+        if not isinstance(exc, genai_errors.ClientError):
+            return False
+        return exc.code in STALE_CACHE_STATUS_CODES or (
+            exc.code == 400 and "cache" in str(exc).lower()
+        )
+
+    def invalidate(self, name: str) -> None:
+        """Forget a cache the API no longer accepts; next call recreates it."""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.name == name:
+                    del self._entries[key]
+                    self.stale += 1
+
+    def observe(self, record: GeminiUsageRecord, cached: bool) -> None:
+        """Account a finished call as served with or without a cache."""
+        with self._lock:
+            self._by_operation[record.operation][
+                "cached" if cached else "uncached"
+            ].add(record)
+
+    def close(self) -> None:
+        """Delete all caches (storage is billed until they expire)."""
+        with self._lock:
+            entries, self._entries = list(self._entries.values()), {}
+        for entry in entries:
+            try:
+                self._client().caches.delete(name=entry.name)
+            except Exception as exc:
+                logger.warning(f"Deleting context cache {entry.name} failed: {exc}")
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            savings: dict[str, Any] = {}
+            for operation, groups in sorted(self._by_operation.items()):
+                cached, uncached = groups["cached"], groups["uncached"]
+                entry: dict[str, Any] = {
+                    "cached": cached.to_dict(),
+                    "uncached": uncached.to_dict(),
+                }
+                if cached.calls and uncached.calls:
+                    cached_billed = (
+                        cached.input_tokens - cached.cached_tokens
+                    ) / cached.calls
+                    uncached_billed = (
+                        uncached.input_tokens - uncached.cached_tokens
+                    ) / uncached.calls
+                    entry["billed_input_tokens_saved_per_call"] = round(
+                        uncached_billed - cached_billed, 1
+                    )
+                    entry["wall_seconds_saved_per_call"] = round(
+                        uncached.wall_seconds / uncached.calls
+                        - cached.wall_seconds / cached.calls,
+                        3,
+                    )
+                savings[operation] = entry
+
+            return {
+                "enabled": self.enabled,
+                "caches": [
+                    {
+                        "name": entry.name,
+                        "tokens": entry.token_count,
+                        "uses": entry.uses,
+                        "expires_in_seconds": round(
+                            entry.expires_at - time.monotonic()
+                        ),
+                    }
+                    for entry in self._entries.values()
+                ],
+                "hits": self.hits,
+                "misses": self.misses,
+                "creates": self.creates,
+                "create_failures": self.create_failures,
+                "refreshes": self.refreshes,
+                "stale": self.stale,
+                "by_operation": savings,
+            }
+
+
+# Singleton instance
+_context_cache: Optional[GeminiContextCache] = None
+
+
+def get_context_cache() -> GeminiContextCache:
+    """Get the Gemini context cache singleton."""
+    global _context_cache
+    if _context_cache is None:
+        _context_cache = GeminiContextCache(
+            enabled=settings.GEMINI_CONTEXT_CACHE_ENABLED,
+            ttl_seconds=settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS,
+            min_chars=settings.GEMINI_CONTEXT_CACHE_MIN_CHARS,
+            retry_seconds=settings.GEMINI_CONTEXT_CACHE_RETRY_SECONDS,
+        )
+    return _context_cache
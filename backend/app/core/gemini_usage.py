@@ -0,0 +1,260 @@
+"""
+Gemini usage accounting.
+
+Every model call is recorded with its token usage, wall time and context
+(schema, thinking level, priority, tenant, image size). Aggregates are kept
+in-process per tenant and per operation; records can optionally be
+persisted to the gemini_usage table for long-term cost analysis.
+
+Features:
+- Input / output / thinking / cached token counts from usage_metadata
+- Cost estimate from configurable per-million-token prices
+- Per-tenant and per-operation (schema + thinking level) aggregation
+- Ring buffer of recent calls for debugging
+- Optional batched persistence via Supabase (GEMINI_USAGE_PERSIST)
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+RECENT_CALLS = 200
+
+
+@dataclass
+class GeminiUsageRecord:
+    """One Gemini call (including its retries/hedges)."""
+
+    schema: str
+    thinking_level: str
+    priority: str
+    tenant_id: str | None
+    image_bytes: int
+    wall_seconds: float
+    success: bool
+    input_tokens: int = 0
+    output_tokens: int = 0
+    thinking_tokens: int = 0
+    cached_tokens: int = 0
+    total_tokens: int = 0
+    error: str | None = None
+    created_at: str = field(
+        default_factory=lambda: datetime.now(timezone.utc).isoformat()
+    )
+
+    @property
+    def operation(self) -> str:
+        return f"{self.schema}:{self.thinking_level}"
+
+    @property
+    def cost_usd(self) -> float:
+        """Estimated cost; thinking tokens are billed as output tokens."""
+        uncached = max(0, self.input_tokens - self.cached_tokens)
+        return (
+            uncached * settings.GEMINI_PRICE_INPUT_PER_MILLION
+            + self.cached_tokens * settings.GEMINI_PRICE_CACHED_INPUT_PER_MILLION
+            + (self.output_tokens + self.thinking_tokens)
+            * settings.GEMINI_PRICE_OUTPUT_PER_MILLION
+        ) / 1_000_000
+
+    def to_row(self) -> dict[str, Any]:
+        row = asdict(self)
+        row["operation"] = self.operation
+        row["cost_usd"] = round(self.cost_usd, 8)
+        return row
+
+
+@dataclass
+class UsageAggregate:
+    calls: int = 0
+    failures: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    thinking_tokens: int = 0
+    cached_tokens: int = 0
+    image_bytes: int = 0
+    wall_seconds: float = 0.0
+    cost_usd: float = 0.0
+
+    def add(self, record: GeminiUsageRecord) -> None:
+        self.calls += 1
+        if not record.success:
+            self.failures += 1
+        self.input_tokens += record.input_tokens
+        self.output_tokens += record.output_tokens
+        self.thinking_tokens += record.thinking_tokens
+        self.cached_tokens += record.cached_tokens
+        self.image_bytes += record.image_bytes
+        self.wall_seconds += record.wall_seconds
+        self.cost_usd += record.cost_usd
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "thinking_tokens": self.thinking_tokens,
+            "cached_tokens": self.cached_tokens,
+            "image_bytes": self.image_bytes,
+            "avg_wall_seconds": (
+                round(self.wall_seconds / self.calls, 3) if self.calls else 0.0
+            ),
+            "cost_usd": round(self.cost_usd, 6),
+            "avg_cost_usd": (
+                round(self.cost_usd / self.calls, 8) if self.calls else 0.0
+            ),
+        }
+
+
+class GeminiUsageRegistry:
+    """In-process usage metrics with optional batched persistence."""
+
+    def __init__(self, persist: bool = False, flush_size: int = 50):
+        self.persist = persist
+        self.flush_size = max(1, flush_size)
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._total = UsageAggregate()
+        self._by_tenant: dict[str, UsageAggregate] = defaultdict(UsageAggregate)
+        self._by_operation: dict[str, UsageAggregate] = defaultdict(UsageAggregate)
+        self._recent: deque[GeminiUsageRecord] = deque(maxlen=RECENT_CALLS)
+        self._pending: list[GeminiUsageRecord] = []
+        self._executor: ThreadPoolExecutor | None = None
+
+    def record(self, record: GeminiUsageRecord) -> None:
+        batch: list[GeminiUsageRecord] = []
+        with self._lock:
+            self._total.add(record)
+            self._by_tenant[record.tenant_id or "-"].add(record)
+            self._by_operation[record.operation].add(record)
+            self._recent.append(record)
+            if self.persist:
+                self._pending.append(record)
+                if len(self._pending) >= self.flush_size:
+                    batch, self._pending = self._pending, []
+
+        if batch:
+            # Never block the caller (possibly the event loop) on the insert
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="gemini-usage"
+                )
+            self._executor.submit(self._write, batch)
+
+    def flush(self) -> None:
+        """Persist pending records now (blocking). Used on shutdown."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch: list[GeminiUsageRecord]) -> None:
+        try:
+            from app.core.supabase import get_supabase
+
+            get_supabase().table("gemini_usage").insert(
+                [record.to_row() for record in batch]
+            ).execute()
+        except Exception as exc:
+            logger.warning(f"Persisting {len(batch)} Gemini usage rows failed: {exc}")
+
+    def snapshot(self, top_tenants: int = 20) -> dict[str, Any]:
+        with self._lock:
+            tenants = sorted(
+                self._by_tenant.items(), key=lambda item: -item[1].cost_usd
+            )[:top_tenants]
+            return {
+                "since": datetime.fromtimestamp(
+                    self.started_at, timezone.utc
+                ).isoformat(),
+                "total": self._total.to_dict(),
+                "by_operation": {
+                    name: aggregate.to_dict()
+                    for name, aggregate in sorted(self._by_operation.items())
+                },
+                "by_tenant": {
+                    tenant: aggregate.to_dict() for tenant, aggregate in tenants
+                },
+                "pending_persist": len(self._pending),
+            }
+
+    def tenant_snapshot(self, tenant_id: str) -> dict[str, Any]:
+        with self._lock:
+            aggregate = self._by_tenant.get(tenant_id) or UsageAggregate()
+            recent = [
+                record.to_row()
+                for record in self._recent
+                if record.tenant_id == tenant_id
+            ]
+            return {"tenant_id": tenant_id, **aggregate.to_dict(), "recent": recent}
+
+    def recent(self, limit: int = 50) -> list[dict[str, Any]]:
+        with self._lock:
+            return [record.to_row() for record in list(self._recent)[-limit:]]
+
+
+# Singleton instance
+_usage_registry: Optional[GeminiUsageRegistry] = None
+
+
+def get_usage_registry() -> GeminiUsageRegistry:
+    """Get the Gemini usage registry singleton."""
+    global _usage_registry
+    if _usage_registry is None:
+        _usage_registry = GeminiUsageRegistry(
+            persist=settings.GEMINI_USAGE_PERSIST,
+            flush_size=settings.GEMINI_USAGE_FLUSH_SIZE,
+        )
+    return _usage_registry
+
+
+def record_gemini_call(
+    *,
+    schema: str,
+    thinking_level: str,
+    priority: str,
+    tenant_id: str | None,
+    image_bytes: int,
+    wall_seconds: float,
+    usage_metadata: Any = None,
+    error: BaseException | None = None,
+) -> GeminiUsageRecord:
+    """Build a usage record from the SDK's usage_metadata and register it."""
+
+    def _count(name: str) -> int:
+        return int(getattr(usage_metadata, name, None) or 0)
+
+    record = GeminiUsageRecord(
+        schema=schema,
+        thinking_level=thinking_level,
+        priority=priority,
+        tenant_id=tenant_id,
+        image_bytes=image_bytes,
+        wall_seconds=round(wall_seconds, 4),
+        success=error is None,
+        input_tokens=_count("prompt_token_count"),
+        output_tokens=_count("candidates_token_count"),
+        thinking_tokens=_count("thoughts_token_count"),
+        cached_tokens=_count("cached_content_token_count"),
+        total_tokens=_count("total_token_count"),
+        error=type(error).__name__ if error is not None else None,
+    )
+    get_usage_registry().record(record)
+
+    logger.info(
+        f"Gemini usage: schema={record.schema}, thinking={record.thinking_level}, "
+        f"tenant={record.tenant_id}, in={record.input_tokens}, "
+        f"out={record.output_tokens}, thinking_tokens={record.thinking_tokens}, "
+        f"wall={record.wall_seconds:.2f}s, cost=${record.cost_usd:.6f}"
+    )
+    return record
@@ -0,0 +1,833 @@
+"""
+Durable background jobs (invoice processing).
+
+Jobs are rows in a queue table instead of in-process BackgroundTasks, so
+they survive restarts and redeploys and run in a separate worker process
+(python -m app.worker). Selected by JOB_QUEUE_BACKEND:
+- supabase: the public.jobs table, claimed via the claim_jobs() function
+  (FOR UPDATE SKIP LOCKED, safe with several workers)
+- sqlite: a local file with the same semantics, for tests and development
+
+Semantics:
+- Claiming a job leases it to one worker for JOB_LEASE_SECONDS (the
+  visibility timeout); the worker extends the lease while the job runs
+- A job whose lease expired (worker killed, redeploy) is claimed again
+- Failed attempts are retried with exponential backoff up to
+  max_attempts; PermanentJobError fails a job at once
+- dedupe_key: at most one queued/running job per key and kind
+- Periodic sweeps (register_sweep) requeue work that was orphaned
+  outside the queue, e.g. invoices stuck in "processing"
+- Nothing runs without a worker: /health/jobs reports the queue as
+  stalled when due jobs wait JOB_STALL_SECONDS and no worker is active
+"""
+
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+# Longest stored error text
+MAX_ERROR_CHARS = 2000
+
+
+class PermanentJobError(Exception):
+    """The job can never succeed; fail it without further attempts."""
+
+
+@dataclass
+class Job:
+    """A claimed job."""
+
+    id: str
+    kind: str
+    payload: dict[str, Any]
+    user_id: str | None = None
+    attempts: int = 1  # Including the current one
+    max_attempts: int = 1
+
+    @property
+    def final_attempt(self) -> bool:
+        return self.attempts >= self.max_attempts
+
+
+@dataclass
+class NewJob:
+    """A job to enqueue in bulk."""
+
+    payload: dict[str, Any]
+    user_id: str | None = None
+    dedupe_key: str | None = None
+
+
+def retry_delay(attempts: int) -> float:
+    """Backoff after a failed attempt (attempts starts at 1), with jitter."""
+    ceiling = min(
+        settings.JOB_RETRY_MAX_DELAY_SECONDS,
+        settings.JOB_RETRY_BASE_DELAY_SECONDS * (2 ** max(0, attempts - 1)),
+    )
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def _error_text(error: str | None) -> str | None:
+    return error[:MAX_ERROR_CHARS] if error else error
+
+
+class JobStore(ABC):
+    """Queue storage; subclasses implement the table access."""
+
+    backend = "none"
+
+    @abstractmethod
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict[str, Any],
+        user_id: str | None = None,
+        dedupe_key: str | None = None,
+        max_attempts: int | None = None,
+        delay_seconds: float = 0.0,
+    ) -> str:
+        """Add a job; with dedupe_key an active job of that key is reused."""
+
+    def enqueue_many(self, kind: str, jobs: list[NewJob]) -> list[str]:
+        """Add several jobs at once; ids in the order of `jobs`."""
+        return [
+            self.enqueue(kind, job.payload, job.user_id, job.dedupe_key)
+            for job in jobs
+        ]
+
+    @abstractmethod
+    def claim(
+        self, worker_id: str, kinds: list[str], limit: int, lease_seconds: int
+    ) -> list[Job]:
+        """Lease up to `limit` due jobs (or jobs with an expired lease)."""
+
+    @abstractmethod
+    def extend(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        """Extend a lease; False when the job is no longer ours."""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str) -> None:
+        """Mark a job of ours done."""
+
+    @abstractmethod
+    def retry(
+        self, job_id: str, worker_id: str, delay_seconds: float, error: str
+    ) -> None:
+        """Requeue a failed attempt to run again after delay_seconds."""
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        """Fail a job of ours without further attempts."""
+
+    @abstractmethod
+    def latest_status(self, kind: str, dedupe_key: str) -> str | None:
+        """Status of the newest job with this key, None if there is none."""
+
+    @abstractmethod
+    def counts(self) -> dict[str, int]:
+        """Jobs per status."""
+
+    @abstractmethod
+    def waiting_seconds(self) -> float:
+        """How long the oldest due queued job has waited (0 when none)."""
+
+    @abstractmethod
+    def worker_active_within(self, seconds: float) -> bool:
+        """A worker holds a live lease or finished a job in the last `seconds`."""
+
+
+class SupabaseJobStore(JobStore):
+    """public.jobs via PostgREST; enqueue/claim are SQL functions."""
+
+    backend = "supabase"
+
+    def __init__(self, supabase=None):
+        self._supabase = supabase
+
+    @property
+    def _db(self):
+        if self._supabase is None:
+            from app.core.supabase import get_supabase
+
+            self._supabase = get_supabase()
+        return self._supabase
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict[str, Any],
+        user_id: str | None = None,
+        dedupe_key: str | None = None,
+        max_attempts: int | None = None,
+        delay_seconds: float = 0.0,
+    ) -> str:
+        response = self._db.rpc(
+            "enqueue_job",
+            {
+                "p_kind": kind,
+                "p_payload": payload,
+                "p_user_id": user_id,
+                "p_dedupe_key": dedupe_key,
+                "p_max_attempts": max_attempts or settings.JOB_MAX_ATTEMPTS,
+                "p_delay_seconds": delay_seconds,
+            },
+        ).execute()
+        return str(response.data)
+
+    def enqueue_many(self, kind: str, jobs: list[NewJob]) -> list[str]:
+        if not jobs:
+            return []
+        rows = [
+            {
+                "kind": kind,
+                "payload": job.payload,
+                "user_id": job.user_id,
+                "dedupe_key": job.dedupe_key,
+                "max_attempts": settings.JOB_MAX_ATTEMPTS,
+            }
+            for job in jobs
+        ]
+        try:
+            # One statement; new work has no active duplicates
+            response = self._db.table("jobs").insert(rows).execute()
+            return [row["id"] for row in response.data or []]
+        except Exception as exc:
+            logger.warning(f"Bulk enqueue failed, enqueueing one by one: {exc}")
+            return super().enqueue_many(kind, jobs)
+
+    def claim(
+        self, worker_id: str, kinds: list[str], limit: int, lease_seconds: int
+    ) -> list[Job]:
+        response = self._db.rpc(
+            "claim_jobs",
+            {
+                "p_worker_id": worker_id,
+                "p_kinds": kinds,
+                "p_limit": limit,
+                "p_lease_seconds": lease_seconds,
+            },
+        ).execute()
+        return [
+            Job(
+                id=row["id"],
+                kind=row["kind"],
+                payload=row.get("payload") or {},
+                user_id=row.get("user_id"),
+                attempts=row["attempts"],
+                max_attempts=row["max_attempts"],
+            )
+            for row in response.data or []
+            if isinstance(row, dict)
+        ]
+
+    def _update_own(self, job_id: str, worker_id: str, values: dict[str, Any]):
+        return (
+            self._db.table("jobs")
+            .update({**values, "updated_at": datetime.now(timezone.utc).isoformat()})
+            .eq("id", job_id)
+            .eq("locked_by", worker_id)
+            .eq("status", "running")
+            .execute()
+        )
+
+    def extend(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        until = datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)
+        response = self._update_own(
+            job_id, worker_id, {"locked_until": until.isoformat()}
+        )
+        return bool(response.data)
+
+    def complete(self, job_id: str, worker_id: str) -> None:
+        self._update_own(
+            job_id,
+            worker_id,
+            {
+                "status": "done",
+                "locked_by": None,
+                "locked_until": None,
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+            },
+        )
+
+    def retry(
+        self, job_id: str, worker_id: str, delay_seconds: float, error: str
+    ) -> None:
+        run_at = datetime.now(timezone.utc) + timedelta(seconds=delay_seconds)
+        self._update_own(
+            job_id,
+            worker_id,
+            {
+                "status": "queued",
+                "run_at": run_at.isoformat(),
+                "locked_by": None,
+                "locked_until": None,
+                "last_error": _error_text(error),
+            },
+        )
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        self._update_own(
+            job_id,
+            worker_id,
+            {
+                "status": "failed",
+                "locked_by": None,
+                "locked_until": None,
+                "last_error": _error_text(error),
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+            },
+        )
+
+    def latest_status(self, kind: str, dedupe_key: str) -> str | None:
+        response = (
+            self._db.table("jobs")
+            .select("status")
+            .eq("kind", kind)
+            .eq("dedupe_key", dedupe_key)
+            .order("created_at", desc=True)
+            .limit(1)
+            .execute()
+        )
+        return response.data[0]["status"] if response.data else None
+
+    def counts(self) -> dict[str, int]:
+        counts: dict[str, int] = {}
+        for status in JOB_STATUSES:
+            response = (
+                self._db.table("jobs")
+                .select("id", count="exact")
+                .eq("status", status)
+                .limit(1)
+                .execute()
+            )
+            counts[status] = response.count or 0
+        return counts
+
+    def waiting_seconds(self) -> float:
+        now = datetime.now(timezone.utc)
+        response = (
+            self._db.table("jobs")
+            .select("run_at")
+            .eq("status", "queued")
+            .lte("run_at", now.isoformat())
+            .order("run_at")
+            .limit(1)
+            .execute()
+        )
+        if not response.data:
+            return 0.0
+        run_at = datetime.fromisoformat(response.data[0]["run_at"])
+        return max(0.0, (now - run_at).total_seconds())
+
+    def worker_active_within(self, seconds: float) -> bool:
+        now = datetime.now(timezone.utc)
+        leased = (
+            self._db.table("jobs")
+            .select("id")
+            .eq("status", "running")
+            .gt("locked_until", now.isoformat())
+            .limit(1)
+            .execute()
+        )
+        if leased.data:
+            return True
+        since = now - timedelta(seconds=seconds)
+        finished = (
+            self._db.table("jobs")
+            .select("id")
+            .gt("finished_at", since.isoformat())
+            .limit(1)
+            .execute()
+        )
+        return bool(finished.data)
+
+
+class SqliteJobStore(JobStore):
+    """Single-file stand-in with the same claim/lease semantics."""
+
+    backend = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            user_id TEXT,
+            payload TEXT NOT NULL,
+            dedupe_key TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            run_at REAL NOT NULL,
+            locked_by TEXT,
+            locked_until REAL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            finished_at REAL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs(kind, dedupe_key)
+            WHERE status IN ('queued', 'running') AND dedupe_key IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs(status, run_at);
+    """
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # autocommit; transactions are explicit (BEGIN IMMEDIATE)
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.executescript(self.SCHEMA)
+
+    def _transaction(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict[str, Any],
+        user_id: str | None = None,
+        dedupe_key: str | None = None,
+        max_attempts: int | None = None,
+        delay_seconds: float = 0.0,
+    ) -> str:
+        def insert(conn: sqlite3.Connection) -> str:
+            if dedupe_key is not None:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE kind = ? AND dedupe_key = ? "
+                    "AND status IN ('queued', 'running')",
+                    (kind, dedupe_key),
+                ).fetchone()
+                if row is not None:
+                    return row["id"]
+            job_id = str(uuid.uuid4())
+            now = time.time()
+            conn.execute(
+                "INSERT INTO jobs (id, kind, user_id, payload, dedupe_key, "
+                "max_attempts, run_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    kind,
+                    user_id,
+                    json.dumps(payload),
+                    dedupe_key,
+                    max_attempts or settings.JOB_MAX_ATTEMPTS,
+                    now + delay_seconds,
+                    now,
+                ),
+            )
+            return job_id
+
+        return self._transaction(insert)
+
+    def claim(
+        self, worker_id: str, kinds: list[str], limit: int, lease_seconds: int
+    ) -> list[Job]:
+        marks = ", ".join("?" for _ in kinds)
+
+        def claim_due(conn: sqlite3.Connection) -> list[Job]:
+            now = time.time()
+            # Lease expired on the last allowed attempt: give up
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', locked_by = NULL, "
+                "locked_until = NULL, finished_at = ?, "
+                "last_error = COALESCE(last_error, 'Lease expired') "
+                f"WHERE kind IN ({marks}) AND status = 'running' "
+                "AND locked_until < ? AND attempts >= max_attempts",
+                (now, *kinds, now),
+            )
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE kind IN ({marks}) AND ("
+                "(status = 'queued' AND run_at <= ?) OR "
+                "(status = 'running' AND locked_until < ?)) "
+                "ORDER BY run_at LIMIT ?",
+                (*kinds, now, now, limit),
+            ).fetchall()
+            jobs: list[Job] = []
+            for row in rows:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                    "locked_by = ?, locked_until = ? WHERE id = ?",
+                    (worker_id, now + lease_seconds, row["id"]),
+                )
+                jobs.append(
+                    Job(
+                        id=row["id"],
+                        kind=row["kind"],
+                        payload=json.loads(row["payload"]),
+                        user_id=row["user_id"],
+                        attempts=row["attempts"] + 1,
+                        max_attempts=row["max_attempts"],
+                    )
+                )
+            return jobs
+
+        return self._transaction(claim_due)
+
+    def _update_own(
+        self, job_id: str, worker_id: str, assignments: str, values: tuple
+    ) -> bool:
+        def update(conn: sqlite3.Connection) -> bool:
+            cursor = conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND locked_by = ? "
+                "AND status = 'running'",
+                (*values, job_id, worker_id),
+            )
+            return cursor.rowcount > 0
+
+        return self._transaction(update)
+
+    def extend(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        return self._update_own(
+            job_id, worker_id, "locked_until = ?", (time.time() + lease_seconds,)
+        )
+
+    def complete(self, job_id: str, worker_id: str) -> None:
+        self._update_own(
+            job_id,
+            worker_id,
+            "status = 'done', locked_by = NULL, locked_until = NULL, "
+            "finished_at = ?",
+            (time.time(),),
+        )
+
+    def retry(
+        self, job_id: str, worker_id: str, delay_seconds: float, error: str
+    ) -> None:
+        self._update_own(
+            job_id,
+            worker_id,
+            "status = 'queued', run_at = ?, locked_by = NULL, "
+            "locked_until = NULL, last_error = ?",
+            (time.time() + delay_seconds, _error_text(error)),
+        )
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        self._update_own(
+            job_id,
+            worker_id,
+            "status = 'failed', locked_by = NULL, locked_until = NULL, "
+            "last_error = ?, finished_at = ?",
+            (_error_text(error), time.time()),
+        )
+
+    def latest_status(self, kind: str, dedupe_key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status FROM jobs WHERE kind = ? AND dedupe_key = ? "
+                "ORDER BY created_at DESC LIMIT 1",
+                (kind, dedupe_key),
+            ).fetchone()
+        return row["status"] if row else None
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+            ).fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def waiting_seconds(self) -> float:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(run_at) AS run_at FROM jobs "
+                "WHERE status = 'queued' AND run_at <= ?",
+                (now,),
+            ).fetchone()
+        return max(0.0, now - row["run_at"]) if row["run_at"] is not None else 0.0
+
+    def worker_active_within(self, seconds: float) -> bool:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE (status = 'running' AND locked_until > ?) "
+                "OR finished_at > ? LIMIT 1",
+                (now, now - seconds),
+            ).fetchone()
+        return row is not None
+
+
+# --- Handlers -------------------------------------------------------------
+
+JobHandler = Callable[[Job], None]
+
+_handlers: dict[str, JobHandler] = {}
+_sweeps: list[Callable[[JobStore], None]] = []
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """Register the function that runs jobs of this kind."""
+
+    def register(fn: JobHandler) -> JobHandler:
+        _handlers[kind] = fn
+        return fn
+
+    return register
+
+
+def register_sweep(fn: Callable[[JobStore], None]) -> Callable[[JobStore], None]:
+    """Register a periodic check that requeues orphaned work."""
+    _sweeps.append(fn)
+    return fn
+
+
+def registered_kinds() -> list[str]:
+    return sorted(_handlers)
+
+
+# --- Worker ---------------------------------------------------------------
+
+
+@dataclass
+class _Running:
+    job: Job
+    lease_lost: bool = False
+
+
+@dataclass
+class _WorkerStats:
+    claimed: int = 0
+    succeeded: int = 0
+    retried: int = 0
+    failed: int = 0
+    leases_lost: int = 0
+    by_kind: dict[str, int] = field(default_factory=dict)
+
+
+class JobWorker:
+    """Claims jobs and runs them on a thread pool until stopped."""
+
+    def __init__(
+        self,
+        store: JobStore,
+        concurrency: int | None = None,
+        worker_id: str | None = None,
+    ):
+        self.store = store
+        self.concurrency = max(1, concurrency or settings.JOB_WORKER_CONCURRENCY)
+        self.worker_id = worker_id or (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        )
+        self._lease_seconds = max(10, settings.JOB_LEASE_SECONDS)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._running: dict[str, _Running] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="job"
+        )
+        self._stats = _WorkerStats()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _execute(self, job: Job) -> None:
+        handler = _handlers.get(job.kind)
+        error: Exception | None = None
+        try:
+            if handler is None:
+                raise PermanentJobError(f"No handler for job kind '{job.kind}'")
+            handler(job)
+        except Exception as exc:
+            error = exc
+        with self._lock:
+            running = self._running.pop(job.id, None)
+        if running is not None and running.lease_lost:
+            return  # Another worker owns the job now
+
+        try:
+            if error is not None:
+                self._finish_failed(job, error)
+                return
+            self.store.complete(job.id, self.worker_id)
+        except Exception as exc:
+            # The lease runs out and the job is claimed again
+            logger.warning(f"Recording the result of job {job.id} failed: {exc}")
+            return
+        with self._lock:
+            self._stats.succeeded += 1
+        logger.info(f"Job {job.kind} {job.id} done (attempt {job.attempts})")
+
+    def _finish_failed(self, job: Job, exc: Exception) -> None:
+        error = f"{type(exc).__name__}: {exc}"
+        if isinstance(exc, PermanentJobError) or job.final_attempt:
+            logger.error(
+                f"Job {job.kind} {job.id} failed (attempt "
+                f"{job.attempts}/{job.max_attempts}): {error}"
+            )
+            self.store.fail(job.id, self.worker_id, error)
+            with self._lock:
+                self._stats.failed += 1
+            return
+
+        delay = retry_delay(job.attempts)
+        logger.warning(
+            f"Job {job.kind} {job.id} attempt {job.attempts}/{job.max_attempts} "
+            f"failed, retrying in {delay:.0f}s: {error}"
+        )
+        self.store.retry(job.id, self.worker_id, delay, error)
+        with self._lock:
+            self._stats.retried += 1
+
+    def _heartbeat(self) -> None:
+        with self._lock:
+            running = list(self._running.values())
+        for entry in running:
+            try:
+                if not self.store.extend(
+                    entry.job.id, self.worker_id, self._lease_seconds
+                ):
+                    entry.lease_lost = True
+                    with self._lock:
+                        self._stats.leases_lost += 1
+                    logger.warning(
+                        f"Lease of job {entry.job.kind} {entry.job.id} was lost"
+                    )
+            except Exception as exc:
+                logger.warning(f"Extending lease of job {entry.job.id} failed: {exc}")
+
+    def _sweep(self) -> None:
+        for sweep in _sweeps:
+            try:
+                sweep(self.store)
+            except Exception as exc:
+                logger.warning(f"Job sweep {sweep.__name__} failed: {exc}")
+
+    def _claim(self) -> int:
+        with self._lock:
+            free = self.concurrency - len(self._running)
+        kinds = registered_kinds()
+        if free <= 0 or not kinds:
+            return 0
+        jobs = self.store.claim(self.worker_id, kinds, free, self._lease_seconds)
+        for job in jobs:
+            with self._lock:
+                self._stats.claimed += 1
+                self._stats.by_kind[job.kind] = self._stats.by_kind.get(job.kind, 0) + 1
+                # Registered before submit: _execute pops the entry when done
+                self._running[job.id] = _Running(job)
+            self._executor.submit(self._execute, job)
+        return len(jobs)
+
+    def run(self) -> None:
+        """Work until stop(); running jobs get JOB_SHUTDOWN_GRACE_SECONDS."""
+        logger.info(
+            f"Job worker {self.worker_id} started "
+            f"(backend={self.store.backend}, concurrency={self.concurrency}, "
+            f"kinds={registered_kinds()})"
+        )
+        heartbeat_every = self._lease_seconds / 3
+        next_heartbeat = time.monotonic() + heartbeat_every
+        next_sweep = time.monotonic()
+
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now >= next_sweep:
+                self._sweep()
+                next_sweep = now + settings.JOB_SWEEP_SECONDS
+            if now >= next_heartbeat:
+                self._heartbeat()
+                next_heartbeat = now + heartbeat_every
+
+            try:
+                claimed = self._claim()
+            except Exception as exc:
+                logger.warning(f"Claiming jobs failed: {exc}")
+                claimed = 0
+            if not claimed:
+                self._stop.wait(settings.JOB_POLL_SECONDS)
+
+        self._drain()
+
+    def _drain(self) -> None:
+        deadline = time.monotonic() + settings.JOB_SHUTDOWN_GRACE_SECONDS
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._running:
+                    break
+            self._heartbeat()
+            time.sleep(min(1.0, max(0.0, deadline - time.monotonic())))
+        with self._lock:
+            unfinished = [entry.job.id for entry in self._running.values()]
+        if unfinished:
+            # Leases expire and other workers pick the jobs up again
+            logger.warning(f"Stopping with {len(unfinished)} unfinished job(s)")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info(f"Job worker {self.worker_id} stopped")
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "worker_id": self.worker_id,
+                "running": len(self._running),
+                "claimed": self._stats.claimed,
+                "succeeded": self._stats.succeeded,
+                "retried": self._stats.retried,
+                "failed": self._stats.failed,
+                "leases_lost": self._stats.leases_lost,
+                "by_kind": dict(self._stats.by_kind),
+            }
+
+
+# Singleton instance
+_store: Optional[JobStore] = None
+
+
+def get_job_store() -> JobStore:
+    """Get the job store selected by JOB_QUEUE_BACKEND."""
+    global _store
+    if _store is None:
+        backend = settings.JOB_QUEUE_BACKEND.lower()
+        if backend == "sqlite":
+            _store = SqliteJobStore(settings.JOB_QUEUE_SQLITE_PATH)
+        else:
+            if backend != "supabase":
+                logger.warning(f"Unknown JOB_QUEUE_BACKEND '{backend}', using supabase")
+            _store = SupabaseJobStore()
+    return _store
+
+
+def enqueue_jobs(kind: str, jobs: list[NewJob]) -> list[str]:
+    """Queue several jobs of one kind in a single write."""
+    return get_job_store().enqueue_many(kind, jobs)
+
+
+def enqueue_job(
+    kind: str,
+    payload: dict[str, Any],
+    user_id: str | None = None,
+    dedupe_key: str | None = None,
+) -> str:
+    """Queue a job for the worker process."""
+    return get_job_store().enqueue(
+        kind, payload, user_id=user_id, dedupe_key=dedupe_key
+    )
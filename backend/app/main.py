@@ -1,12 +1,65 @@
-from fastapi import FastAPI
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Response, status as http_status
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.api import api_router
+from app.api.deps import require_admin
 from app.core.config import settings
+from app.core.gemini import (
+    get_gemini_client_manager,
+    get_gemini_scheduler,
+    resilience_stats,
+)
+from app.core.gemini_backends import get_gemini_backend
+from app.core.gemini_context_cache import get_context_cache
+from app.core.gemini_usage import get_usage_registry
+from app.core.jobs import JobWorker, get_job_store
+from app.services.barcode_decoder import barcode_stats
+from app.services.image_preprocessing import preprocessing_stats
+from app.services.invoice_extraction import invoice_extraction_stats
+from app.services.invoice_templates import invoice_template_stats
+from app.services.pdf_pages import get_page_renderer
+from app.services.product_recognition import escalation_stats
+from app.services.category_cache import get_category_cache
+from app.services.product_catalog import get_catalog_registry
+from app.services.recognition_cache import get_recognition_cache
+from app.services.recognition_memory import recognition_memory_stats
+from app.services.shelf_tiling import tiling_stats
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the shared Gemini client on startup and close it on shutdown."""
+    gemini = get_gemini_client_manager()
+    if settings.GEMINI_WARMUP_ON_STARTUP and settings.GEMINI_BACKEND in (
+        "live",
+        "record",
+    ):
+        # Best effort, don't block startup on the network round trip
+        asyncio.get_running_loop().run_in_executor(None, gemini.warm_up)
+    worker = None
+    if settings.JOB_WORKER_EMBEDDED:
+        # Development: run queued jobs without a separate worker process
+        worker = JobWorker(get_job_store(), settings.JOB_WORKER_CONCURRENCY)
+        app.state.job_worker = worker
+        threading.Thread(target=worker.run, name="job-worker", daemon=True).start()
+    yield
+    if worker is not None:
+        worker.stop()
+    get_usage_registry().flush()
+    # Cached prefixes are billed per hour of storage until they expire
+    await asyncio.get_running_loop().run_in_executor(None, get_context_cache().close)
+    get_page_renderer().close()
+    await gemini.aclose()
+
 
 app = FastAPI(
     title="CrewInventurKI API",
     description="KI-gestützte Inventur-App für die Gastronomie",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # CORS
@@ -28,6 +81,67 @@ async def health_check():
     return {"status": "ok", "service": "CrewInventurKI"}
 
 
+@app.get("/health/jobs")
+def jobs_health_check(response: Response):
+    """
+    Background job queue: jobs per status (and the embedded worker).
+
+    503 when due jobs have waited JOB_STALL_SECONDS and no worker held a
+    lease or finished a job in that time - uploads are accepted but
+    nothing processes them (worker service not running).
+    """
+    store = get_job_store()
+    waiting = store.waiting_seconds()
+    stalled = waiting >= settings.JOB_STALL_SECONDS and not (
+        store.worker_active_within(settings.JOB_STALL_SECONDS)
+    )
+    if stalled:
+        response.status_code = http_status.HTTP_503_SERVICE_UNAVAILABLE
+    status = {
+        "status": "stalled" if stalled else "ok",
+        "backend": store.backend,
+        "jobs": store.counts(),
+        "oldest_waiting_seconds": round(waiting, 1),
+    }
+    worker = getattr(app.state, "job_worker", None)
+    if worker is not None:
+        status["embedded_worker"] = worker.snapshot()
+    return status
+
+
+@app.get("/health/gemini")
+def gemini_health_check():
+    """Gemini client liveness (public; details need an admin)."""
+    return {
+        "status": "ok",
+        "initialized": get_gemini_client_manager().health_check()["initialized"],
+    }
+
+
+@app.get("/health/gemini/details")
+def gemini_health_details(probe: bool = False, _admin=Depends(require_admin)):
+    """Gemini client state (probe=true makes a lightweight, billed API call)."""
+    recognition_cache = get_recognition_cache()
+    return {
+        **get_gemini_client_manager().health_check(probe=probe),
+        "scheduler": get_gemini_scheduler().stats(),
+        "resilience": resilience_stats(),
+        "backend": get_gemini_backend().stats(),
+        "context_cache": get_context_cache().snapshot(),
+        "recognition_cache": recognition_cache.stats() if recognition_cache else None,
+        "image_preprocessing": preprocessing_stats(),
+        "thinking_escalation": escalation_stats(),
+        "barcode_fast_path": barcode_stats(),
+        "shelf_tiling": tiling_stats(),
+        "invoice_extraction": invoice_extraction_stats(),
+        "invoice_templates": invoice_template_stats(),
+        "pdf_rendering": get_page_renderer().snapshot(),
+        "product_catalog": get_catalog_registry().stats(),
+        "category_cache": get_category_cache().stats(),
+        "recognition_memory": recognition_memory_stats(),
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -42,3 +42,11 @@ class InvoiceExtractionResponse(BaseModel):
     items: list[InvoiceItem]
     totals: InvoiceTotals
     confidence: float = Field(ge=0.0, le=1.0)
+
+
+class InvoiceItemNormalization(BaseModel):
+    description: str  # Invoice line text exactly as given
+    normalized_name: str | None = None
+    normalized_brand: str | None = None
+    normalized_size: str | None = None
+    normalized_category: str | None = None
@@ -56,6 +56,7 @@ class InventoryItemCreate(BaseModel):
     scan_method: Literal["photo", "shelf", "barcode", "manual"] | None = None
     ai_confidence: float | None = None
     ai_suggested_quantity: int | None = None
+    scan_id: str | None = None  # From ScanResult - confirms the scanned product
     # Duplicate handling
     merge_mode: Literal["add", "replace", "new_entry"] | None = Field(
         default=None,
@@ -103,9 +104,28 @@ class ScanResult(BaseModel):
     duplicate_in_session: dict | None = None  # If product already in this session
     suggested_quantity: int | None = None  # Not used anymore - user enters manually
     needs_category: bool = False  # True when AI is unsure about category
+    scan_id: str | None = None  # Pass to add_session_item to remember the match
 
 
 class ShelfScanResult(BaseModel):
     """Result of scanning a shelf (multiple products)."""
     products: list[ScanResult]
     total_recognized: int
+    tiles: list[dict] = []  # Per-tile latency when the photo was tiled
+
+
+class ShelfScanStreamItem(BaseModel):
+    """One NDJSON line of a streamed shelf scan."""
+    product: ScanResult | None = None
+    done: bool = False  # Last line: totals, tile timings, error
+    total_recognized: int | None = None
+    tiles: list[dict] = []
+    error: str | None = None
+
+
+class BatchScanItem(BaseModel):
+    """One NDJSON line of a batch scan, sent as soon as its image is done."""
+    index: int  # Position of the image in the upload
+    filename: str | None = None
+    result: ScanResult | None = None
+    error: str | None = None
@@ -38,3 +38,15 @@ class InvoiceItemOut(BaseModel):
     ai_brand: str | None = None
     ai_size: str | None = None
     ai_category: str | None = None
+
+
+class InvoiceZipStreamItem(BaseModel):
+    """One NDJSON line of a streamed ZIP upload."""
+    file: str | None = None
+    invoice_id: str | None = None  # Pollable once its "queued" line was sent
+    job_id: str | None = None
+    status: str | None = None  # stored, queued, error
+    error: str | None = None
+    done: bool = False  # Last line: counts
+    created: int | None = None
+    failed: int | None = None
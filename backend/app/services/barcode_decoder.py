@@ -0,0 +1,133 @@
+"""
+Local barcode decoding for product scans.
+
+Reads retail barcodes (EAN-13, EAN-8, UPC-A, UPC-E) from the normalized
+scan photo with zxing-cpp. A decoded code that matches a product of the
+tenant answers the scan without a model call.
+
+Features:
+- Optional dependency: without zxing-cpp every scan goes to Gemini
+- Only checksum-valid, numeric codes are returned
+- Lookup candidates for UPC-A / EAN-13 spellings of the same code
+- Decode/hit counters
+"""
+
+import logging
+import threading
+import time
+from io import BytesIO
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zxingcpp
+
+    RETAIL_FORMATS = zxingcpp.barcode_formats_from_str("EAN13,EAN8,UPCA,UPCE")
+except Exception as exc:  # pragma: no cover - depends on installed wheels
+    zxingcpp = None
+    RETAIL_FORMATS = None
+    logger.warning("zxing-cpp not available, barcode fast path disabled: %s", exc)
+
+
+def barcode_candidates(code: str) -> list[str]:
+    """Spellings of one code as it may be stored in products.barcode."""
+    candidates = [code]
+    if len(code) == 12:
+        candidates.append(f"0{code}")  # UPC-A as EAN-13
+    elif len(code) == 13 and code.startswith("0"):
+        candidates.append(code[1:])  # EAN-13 with leading zero as UPC-A
+    return candidates
+
+
+class _BarcodeStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.decoded = 0
+        self.fast_path_hits = 0
+        self.decode_seconds = 0.0
+
+    def record_decode(self, found: bool, seconds: float) -> None:
+        with self._lock:
+            self.attempts += 1
+            self.decode_seconds += seconds
+            if found:
+                self.decoded += 1
+
+    def record_hit(self) -> None:
+        with self._lock:
+            self.fast_path_hits += 1
+
+    def snapshot(self) -> dict[str, float | int | bool]:
+        with self._lock:
+            return {
+                "available": zxingcpp is not None,
+                "attempts": self.attempts,
+                "decoded": self.decoded,
+                "fast_path_hits": self.fast_path_hits,
+                "hit_rate": (
+                    round(self.fast_path_hits / self.attempts, 3)
+                    if self.attempts
+                    else 0.0
+                ),
+                "avg_decode_ms": (
+                    round(self.decode_seconds / self.attempts * 1000, 1)
+                    if self.attempts
+                    else 0.0
+                ),
+            }
+
+
+_stats = _BarcodeStats()
+
+
+def barcode_stats() -> dict[str, float | int | bool]:
+    """Decode and fast-path counters since process start."""
+    return _stats.snapshot()
+
+
+def record_fast_path_hit() -> None:
+    _stats.record_hit()
+
+
+def decode_barcodes(image_bytes: bytes | memoryview) -> list[str]:
+    """
+    Decode retail barcodes from an image.
+
+    Args:
+        image_bytes: Encoded image (ideally the normalized scan photo)
+
+    Returns:
+        Valid retail codes, most prominent first; empty when none found or
+        the decoder is unavailable
+    """
+    if zxingcpp is None or not settings.BARCODE_FAST_PATH_ENABLED:
+        return []
+
+    try:
+        from PIL import Image
+    except Exception as exc:
+        logger.warning("Pillow not available for barcode decoding: %s", exc)
+        return []
+
+    started = time.perf_counter()
+    codes: list[str] = []
+    try:
+        with Image.open(BytesIO(image_bytes)) as image:
+            results = zxingcpp.read_barcodes(
+                image.convert("L"), formats=RETAIL_FORMATS
+            )
+        for result in results:
+            code = result.text.strip()
+            # zxing verifies the check digit (incl. UPC-E expansion)
+            if result.valid and code.isdigit() and code not in codes:
+                codes.append(code)
+    except Exception as exc:
+        logger.debug(f"Barcode decoding failed: {exc}")
+
+    _stats.record_decode(bool(codes), time.perf_counter() - started)
+    if codes:
+        logger.info(f"Decoded barcodes locally: {codes}")
+    return codes
@@ -0,0 +1,138 @@
+"""
+System category cache.
+
+Every scan passes the system category names to the recognition prompt.
+The list almost never changes, so it is loaded once per process instead
+of one categories query per request.
+
+Features:
+- TTL (CATEGORY_CACHE_TTL_SECONDS) so changes made elsewhere show up
+- Explicit invalidation when categories are created/updated
+- Id -> name map for known products (no extra query per barcode hit)
+- Precomputed prompt fragment for the recognition prompts
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Iterable
+
+from app.core.config import settings
+from app.core.supabase import get_supabase
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_CATEGORY = "Unbekannt"
+
+
+@lru_cache(maxsize=32)
+def _render_category_text(names: tuple[str, ...]) -> str:
+    return ", ".join(names) if names else UNKNOWN_CATEGORY
+
+
+def category_prompt_text(categories: Iterable[str]) -> str:
+    """The category list as used in the prompt constraints (rendered once)."""
+    return _render_category_text(tuple(categories))
+
+
+@dataclass(frozen=True)
+class SystemCategories:
+    """Snapshot of the system categories."""
+
+    names: tuple[str, ...] = ()
+    names_by_id: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def prompt_text(self) -> str:
+        return _render_category_text(self.names)
+
+
+def _load_system_categories(supabase) -> SystemCategories:
+    response = (
+        supabase.table("categories")
+        .select("id, name")
+        .eq("is_system", True)
+        .execute()
+    )
+    rows = [
+        row
+        for row in response.data or []
+        if isinstance(row, dict) and isinstance(row.get("name"), str)
+    ]
+    return SystemCategories(
+        names=tuple(row["name"] for row in rows),
+        names_by_id={str(row["id"]): row["name"] for row in rows if row.get("id")},
+    )
+
+
+class CategoryCache:
+    """Process-wide system category snapshot with a TTL."""
+
+    def __init__(self, ttl_seconds: float):
+        self._ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._snapshot: SystemCategories | None = None
+        self._loaded_at = 0.0
+        self.hits = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    def get(self, supabase=None) -> SystemCategories:
+        with self._lock:
+            if (
+                self._snapshot is not None
+                and time.monotonic() - self._loaded_at <= self._ttl_seconds
+            ):
+                self.hits += 1
+                return self._snapshot
+
+            snapshot = _load_system_categories(supabase or get_supabase())
+            self._snapshot = snapshot
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+            logger.info(f"System categories loaded: {len(snapshot.names)}")
+            return snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            if self._snapshot is not None:
+                self.invalidations += 1
+            self._snapshot = None
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "categories": len(self._snapshot.names) if self._snapshot else 0,
+                "hits": self.hits,
+                "loads": self.loads,
+                "invalidations": self.invalidations,
+            }
+
+
+_cache: CategoryCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_category_cache() -> CategoryCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CategoryCache(settings.CATEGORY_CACHE_TTL_SECONDS)
+    return _cache
+
+
+def get_system_categories(supabase=None) -> list[str]:
+    """Names of the system categories the model may choose from."""
+    return list(get_category_cache().get(supabase).names)
+
+
+def get_system_category_name(category_id: str, supabase=None) -> str | None:
+    """Name of a system category by id, None for user categories."""
+    return get_category_cache().get(supabase).names_by_id.get(str(category_id))
+
+
+def invalidate_category_cache() -> None:
+    get_category_cache().invalidate()
@@ -0,0 +1,181 @@
+"""
+Image Preprocessing for Gemini uploads.
+
+Phones send 4-12 MB HEIC/JPEG photos at full sensor resolution. Before an
+image goes to the model it is:
+- Rotated according to its EXIF orientation
+- Downsized to a configurable maximum edge
+- Re-encoded as quality-tuned JPEG or WebP
+- Stripped of metadata (EXIF, GPS, ICC)
+
+Smaller payloads mean less upload time, lower model latency and fewer
+input tokens per scan.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from io import BytesIO
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    # HEIC/HEIF (iPhone default) support is optional
+    import pillow_heif
+
+    pillow_heif.register_heif_opener()
+except Exception as exc:  # pragma: no cover - depends on installed wheels
+    logger.warning("pillow-heif not available, HEIC passed through: %s", exc)
+
+OUTPUT_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+@dataclass
+class NormalizedImage:
+    """Image ready for upload to Gemini."""
+
+    data: bytes | memoryview
+    mime_type: str
+    original_size: int
+    width: int | None = None
+    height: int | None = None
+    changed: bool = False
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_size - len(self.data)
+
+
+class _PreprocessingStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def record(self, result: NormalizedImage) -> None:
+        with self._lock:
+            self.images += 1
+            self.bytes_in += result.original_size
+            self.bytes_out += len(result.data)
+
+    def snapshot(self) -> dict[str, int | float]:
+        with self._lock:
+            return {
+                "images": self.images,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 3)
+                if self.bytes_in
+                else 1.0,
+            }
+
+
+_stats = _PreprocessingStats()
+
+
+def preprocessing_stats() -> dict[str, int | float]:
+    """Totals since process start."""
+    return _stats.snapshot()
+
+
+def normalize_image(
+    image_bytes: bytes | memoryview,
+    mime_type: str = "image/jpeg",
+    max_edge: int | None = None,
+) -> NormalizedImage:
+    """
+    Normalize an uploaded photo for the model.
+
+    Falls back to the original bytes when preprocessing is disabled, the
+    image can't be decoded, or re-encoding would not make it smaller.
+
+    Args:
+        image_bytes: Raw image data as uploaded
+        mime_type: MIME type reported by the client
+        max_edge: Longest edge in pixels (default IMAGE_MAX_EDGE)
+
+    Returns:
+        NormalizedImage with the bytes and MIME type to send
+    """
+    original = NormalizedImage(
+        data=image_bytes, mime_type=mime_type, original_size=len(image_bytes)
+    )
+    if not settings.IMAGE_PREPROCESSING_ENABLED or not image_bytes:
+        return original
+
+    try:
+        from PIL import Image, ImageOps
+    except Exception as exc:
+        logger.warning("Pillow not available for image preprocessing: %s", exc)
+        return original
+
+    max_edge = max_edge or settings.IMAGE_MAX_EDGE
+    output_format = settings.IMAGE_OUTPUT_FORMAT.upper()
+    if output_format not in OUTPUT_MIME_TYPES:
+        output_format = "JPEG"
+
+    try:
+        with Image.open(BytesIO(image_bytes)) as image:
+            source_size = image.size
+            rotated = image.getexif().get(0x0112, 1) != 1  # EXIF Orientation
+            # JPEG: decode at reduced scale when the target is much smaller
+            image.draft("RGB", (max_edge, max_edge))
+            image = ImageOps.exif_transpose(image)
+
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+
+            image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+            buffer = BytesIO()
+            # No exif/icc_profile passed -> metadata is dropped
+            image.save(
+                buffer,
+                format=output_format,
+                quality=settings.IMAGE_QUALITY,
+                optimize=True,
+            )
+            width, height = image.size
+    except Exception as exc:
+        logger.warning("Image preprocessing failed, sending original: %s", exc)
+        return original
+
+    data = buffer.getvalue()
+    if (
+        len(data) >= len(image_bytes)
+        and not rotated
+        and (width, height) == source_size
+    ):
+        # Already small and upright enough
+        _stats.record(original)
+        return original
+
+    result = NormalizedImage(
+        data=data,
+        mime_type=OUTPUT_MIME_TYPES[output_format],
+        original_size=len(image_bytes),
+        width=width,
+        height=height,
+        changed=True,
+    )
+    _stats.record(result)
+    logger.info(
+        "Image normalized: %sx%s -> %sx%s, %d -> %d bytes (saved %d)",
+        source_size[0],
+        source_size[1],
+        width,
+        height,
+        result.original_size,
+        len(data),
+        result.bytes_saved,
+    )
+    return result
@@ -7,6 +7,21 @@ Uses HIGH thinking level for accurate extraction of:
 - Totals and calculations
 - AI-normalized product names for matching
 
+Digital PDFs (most wholesalers) are read locally (see pdf_text): with a
+clean text layer the invoice is sent as text only, without the document,
+at INVOICE_TEXT_ONLY_THINKING - and redone with the PDF at HIGH thinking
+only when that answer is empty or uncertain.
+
+Scanned PDFs are rendered page by page (see pdf_pages); multi-page scans
+are extracted per page, INVOICE_PAGE_CONCURRENCY pages at a time, and
+merged: header fields carry over from earlier pages, and the totals are
+reconciled once against the printed gross total.
+
+Suppliers whose layout was learned (see invoice_templates) are parsed
+deterministically from the text layer, without a HIGH thinking call. With
+an invoice_id the layout of a reconciled extraction is kept on the
+invoice as a template candidate, learned once the user confirms it.
+
 Prompts follow Gemini 3 best practices:
 - Structured with XML tags
 - Clear persona and context
@@ -14,65 +29,129 @@ Prompts follow Gemini 3 best practices:
 - Constraints at the end
 """
 
-import base64
+import asyncio
 import logging
-from io import BytesIO
-
-from app.core.gemini import generate_structured, ThinkingLevel
-from app.schemas.gemini_responses import InvoiceExtractionResponse
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+import anyio
+
+from app.core.config import settings
+from app.core.gemini import (
+    agenerate_structured,
+    generate_structured,
+    GeminiPriority,
+    ThinkingLevel,
+)
+from app.core.supabase import get_supabase
+from app.schemas.gemini_responses import InvoiceExtractionResponse, InvoiceItem
+from app.services.invoice_templates import (
+    anormalize_items,
+    normalize_items,
+    parse_with_template,
+    store_template_candidate,
+    TemplateParse,
+    reconciles,
+    totals_from_items,
+)
+from app.services.pdf_pages import render_pdf_pages
+from app.services.pdf_text import PdfText, extract_pdf_text
 
 logger = logging.getLogger(__name__)
 
-MAX_INVOICE_TEXT_CHARS = 12000
-
-
-def _extract_pdf_text(file_bytes: bytes) -> str:
-    try:
-        from pypdf import PdfReader
-    except Exception as exc:
-        logger.warning("pypdf not available for text extraction: %s", exc)
-        return ""
-
-
-def _render_pdf_first_page(file_bytes: bytes) -> bytes:
+# Per-request text; the static instructions are the (context cached)
+# system_prompt from _build_prompt()
+INVOICE_REQUEST = "Extrahiere alle Daten aus der beigefuegten Rechnung."
+
+TEXT_ONLY_NOTE = (
+    "Die Rechnung liegt nur als Text vor (Textebene des PDFs, Spalten in "
+    "Druckreihenfolge). Ein Bild wird nicht mitgeschickt."
+)
+# Subtotal/carry-over rows that scanned multi-page invoices repeat per page
+CARRY_OVER_PATTERN = re.compile(
+    r"^\s*(ue|ü)bertrag|^\s*zwischensumme|^\s*summe\s+seite", re.IGNORECASE
+)
+# Merged pages whose items don't add up to the printed total
+UNRECONCILED_CONFIDENCE = 0.5
+TEXT_AND_DOCUMENT_NOTE = (
+    "Nutze invoice_text als primaere Quelle, falls lesbar. "
+    "Wenn etwas unklar ist, verifiziere mit dem Layout."
+)
+
+
+@dataclass
+class InvoicePayload:
+    """What goes to the model for one invoice."""
+
+    prompt: str
+    data: bytes | memoryview | None
+    mime_type: str
+    thinking_level: ThinkingLevel
+    route: str  # text_only, text_and_pdf, pdf, rendered_page(s), image
+    text_layer: PdfText | None = None
+    pages: list[bytes] = field(default_factory=list)  # rendered_pages
+    page_count: int = 0
+
+
+class _ExtractionStats:
+    """How invoices were sent to the model."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes: dict[str, int] = {}
+        self.text_only_escalations = 0
+        self.unclean_reasons: dict[str, int] = {}
+        self.pages_extracted = 0
+        self.unreconciled_merges = 0
+
+    def record_route(self, route: str) -> None:
+        with self._lock:
+            self.routes[route] = self.routes.get(route, 0) + 1
+
+    def record_unclean(self, reason: str) -> None:
+        with self._lock:
+            self.unclean_reasons[reason] = self.unclean_reasons.get(reason, 0) + 1
+
+    def record_escalation(self) -> None:
+        with self._lock:
+            self.text_only_escalations += 1
+
+    def record_merge(self, pages: int, reconciled: bool) -> None:
+        with self._lock:
+            self.pages_extracted += pages
+            if not reconciled:
+                self.unreconciled_merges += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "routes": dict(self.routes),
+                "text_only_escalations": self.text_only_escalations,
+                "unclean_text_layers": dict(self.unclean_reasons),
+                "pages_extracted": self.pages_extracted,
+                "unreconciled_merges": self.unreconciled_merges,
+            }
+
+
+_extraction_stats = _ExtractionStats()
+
+
+def invoice_extraction_stats() -> dict:
+    return _extraction_stats.snapshot()
+
+
+def _text_only_thinking() -> ThinkingLevel:
     try:
-        import pypdfium2 as pdfium
-    except Exception as exc:
-        logger.warning("pypdfium2 not available for PDF rendering: %s", exc)
-        return b""
-
-    try:
-        pdf = pdfium.PdfDocument(file_bytes)
-        if len(pdf) == 0:
-            return b""
-        page = pdf.get_page(0)
-        bitmap = page.render(scale=2.0)
-        pil_image = bitmap.to_pil()
-        buffer = BytesIO()
-        pil_image.save(buffer, format="PNG")
-        page.close()
-        pdf.close()
-        return buffer.getvalue()
-    except Exception as exc:
-        logger.warning("Failed to render PDF for OCR fallback: %s", exc)
-        return b""
-
-    try:
-        reader = PdfReader(BytesIO(file_bytes))
-        chunks: list[str] = []
-        for page in reader.pages[:8]:
-            text = page.extract_text() or ""
-            if text:
-                chunks.append(text)
-            if sum(len(chunk) for chunk in chunks) >= MAX_INVOICE_TEXT_CHARS:
-                break
-        combined = "\n".join(chunks).strip()
-        if len(combined) > MAX_INVOICE_TEXT_CHARS:
-            combined = combined[:MAX_INVOICE_TEXT_CHARS]
-        return combined
-    except Exception as exc:
-        logger.warning("Failed to extract PDF text layer: %s", exc)
-        return ""
+        return ThinkingLevel(settings.INVOICE_TEXT_ONLY_THINKING.strip().lower())
+    except ValueError:
+        logger.warning(
+            f"Unknown INVOICE_TEXT_ONLY_THINKING "
+            f"'{settings.INVOICE_TEXT_ONLY_THINKING}', using medium"
+        )
+        return ThinkingLevel.MEDIUM
 
 
 def _build_prompt() -> str:
@@ -171,19 +250,339 @@ confidence: Deine Sicherheit bei der Extraktion (0.0-1.0)
 </constraints>"""
 
 
+def _text_prompt(text_layer: PdfText, note: str) -> str:
+    return (
+        f"{INVOICE_REQUEST}\n\n"
+        "<invoice_text>\n"
+        f"{text_layer.text}\n"
+        "</invoice_text>\n\n"
+        "<note>\n"
+        f"{note}\n"
+        "</note>"
+    )
+
+
+def _prepare_payload(
+    file_bytes: bytes | memoryview,
+    mime_type: str,
+    text_only: bool = True,
+    text_layer: PdfText | None = None,
+) -> InvoicePayload:
+    """
+    Build the request text and model payload. The static _build_prompt()
+    goes separately as system_prompt.
+
+    PDFs with a clean text layer are sent as text only at
+    INVOICE_TEXT_ONLY_THINKING; other text layers go along with the PDF,
+    PDFs without one are rendered to an image. Pass text_layer when the
+    PDF was already read.
+    """
+    if mime_type != "application/pdf":
+        return InvoicePayload(
+            INVOICE_REQUEST, file_bytes, mime_type, ThinkingLevel.HIGH, "image"
+        )
+
+    if text_layer is None:
+        text_layer = extract_pdf_text(file_bytes)
+    problem = text_layer.problem()
+    if problem is None and text_only and settings.INVOICE_TEXT_ONLY_ENABLED:
+        return InvoicePayload(
+            _text_prompt(text_layer, TEXT_ONLY_NOTE),
+            None,
+            mime_type,
+            _text_only_thinking(),
+            "text_only",
+            text_layer,
+        )
+
+    if text_layer.pages:
+        if problem is not None:
+            _extraction_stats.record_unclean(problem)
+        return InvoicePayload(
+            _text_prompt(text_layer, TEXT_AND_DOCUMENT_NOTE),
+            file_bytes,
+            mime_type,
+            ThinkingLevel.HIGH,
+            "text_and_pdf",
+            text_layer,
+        )
+
+    rendered = render_pdf_pages(file_bytes)
+    if len(rendered.pages) > 1:
+        return InvoicePayload(
+            INVOICE_REQUEST,
+            None,
+            "image/png",
+            ThinkingLevel.HIGH,
+            "rendered_pages",
+            pages=rendered.pages,
+            page_count=rendered.page_count,
+        )
+    if rendered.pages:
+        return InvoicePayload(
+            INVOICE_REQUEST,
+            rendered.pages[0],
+            "image/png",
+            ThinkingLevel.HIGH,
+            "rendered_page",
+            page_count=rendered.page_count,
+        )
+    return InvoicePayload(
+        INVOICE_REQUEST, file_bytes, mime_type, ThinkingLevel.HIGH, "pdf"
+    )
+
+
+def _read_text_layer(
+    file_bytes: bytes | memoryview, mime_type: str
+) -> PdfText | None:
+    if mime_type != "application/pdf":
+        return None
+    return extract_pdf_text(file_bytes)
+
+
+def _parse_template(
+    text_layer: PdfText | None, tenant_id: str | None
+) -> TemplateParse | None:
+    """Template parse for known suppliers (see invoice_templates), or None."""
+    if not tenant_id or text_layer is None or not text_layer.is_clean:
+        return None
+    return parse_with_template(tenant_id, text_layer)
+
+
+def _record_template_candidate(
+    text_layer: PdfText | None,
+    result: InvoiceExtractionResponse,
+    tenant_id: str | None,
+    invoice_id: str | None,
+) -> None:
+    """Keep the layout on the invoice until the user confirms its items."""
+    if not tenant_id or not invoice_id:
+        return
+    try:
+        store_template_candidate(
+            get_supabase(), tenant_id, invoice_id, text_layer, result
+        )
+    except Exception as exc:
+        logger.warning(f"Storing invoice template candidate failed: {exc}")
+
+
+def _text_only_insufficient(result: InvoiceExtractionResponse) -> bool:
+    """A text-only answer that should be redone with the document."""
+    return (
+        not result.items
+        or result.confidence < settings.INVOICE_TEXT_ONLY_MIN_CONFIDENCE
+    )
+
+
+def _finalize_extraction(data: dict) -> InvoiceExtractionResponse:
+    result = InvoiceExtractionResponse.model_validate(data)
+
+    # Log extraction results
+    logger.info(
+        f"Invoice extracted: supplier={result.supplier_name}, "
+        f"items={len(result.items)}, confidence={result.confidence}"
+    )
+
+    # Warn if low confidence
+    if result.confidence < 0.7:
+        logger.warning(
+            f"Low confidence extraction ({result.confidence:.2f}) for invoice "
+            f"{result.invoice_number}"
+        )
+
+    return result
+
+
+def _page_prompt(number: int, page_count: int) -> str:
+    return (
+        f"Dies ist Seite {number} von {page_count} einer mehrseitigen Rechnung. "
+        "Extrahiere nur die Positionen, die auf DIESER Seite gedruckt sind.\n"
+        "- Kopfdaten (Lieferant, Rechnungsnummer, Datum) nur angeben, wenn sie "
+        "auf dieser Seite stehen, sonst leer lassen\n"
+        "- Summenblock nur angeben, wenn er auf dieser Seite steht, sonst alle "
+        "Summen 0\n"
+        "- Uebertraege und Zwischensummen sind KEINE Positionen"
+    )
+
+
+def _is_carry_over(item: InvoiceItem) -> bool:
+    return bool(CARRY_OVER_PATTERN.search(item.description))
+
+
+def _first_value(pages: list[InvoiceExtractionResponse], name: str) -> str | None:
+    return next((getattr(page, name) for page in pages if getattr(page, name)), None)
+
+
+def _merge_pages(
+    pages: list[InvoiceExtractionResponse], page_count: int
+) -> InvoiceExtractionResponse:
+    """
+    Combine per-page answers in page order.
+
+    Header fields come from the first page that has them (later pages
+    usually repeat only the invoice number, if anything). The printed
+    totals are taken from the last page with a summary block and checked
+    once against the sum of all line items.
+    """
+    items = [item for page in pages for item in page.items if not _is_carry_over(item)]
+    printed = next((page.totals for page in reversed(pages) if page.totals.gross), None)
+    totals = printed or totals_from_items(items)
+    confidence = min(page.confidence for page in pages)
+
+    reconciled = printed is not None and reconciles(items, printed.gross)
+    if len(pages) < page_count:
+        reconciled = False  # Pages beyond INVOICE_PDF_MAX_PAGES are missing
+    if not reconciled:
+        logger.warning(
+            f"Merged invoice pages don't reconcile: {len(pages)}/{page_count} pages, "
+            f"items {sum(item.total_gross for item in items):.2f}, "
+            f"printed total {printed.gross if printed else None}"
+        )
+        confidence = min(confidence, UNRECONCILED_CONFIDENCE)
+    _extraction_stats.record_merge(len(pages), reconciled)
+
+    return _finalize_extraction(
+        InvoiceExtractionResponse(
+            supplier_name=_first_value(pages, "supplier_name"),
+            invoice_number=_first_value(pages, "invoice_number"),
+            invoice_date=_first_value(pages, "invoice_date"),
+            items=items,
+            totals=totals,
+            confidence=confidence,
+        ).model_dump()
+    )
+
+
+def _extract_page(
+    page: bytes, number: int, page_count: int, tenant_id: str | None
+) -> InvoiceExtractionResponse:
+    data = generate_structured(
+        prompt=_page_prompt(number, page_count),
+        system_prompt=_build_prompt(),
+        response_schema=InvoiceExtractionResponse,
+        image_bytes=page,
+        mime_type="image/png",
+        thinking_level=ThinkingLevel.HIGH,
+        priority=GeminiPriority.INVOICE_EXTRACTION,
+        tenant_id=tenant_id,
+    )
+    return InvoiceExtractionResponse.model_validate(data)
+
+
+async def _aextract_page(
+    page: bytes, number: int, page_count: int, tenant_id: str | None
+) -> InvoiceExtractionResponse:
+    data = await agenerate_structured(
+        prompt=_page_prompt(number, page_count),
+        system_prompt=_build_prompt(),
+        response_schema=InvoiceExtractionResponse,
+        image_bytes=page,
+        mime_type="image/png",
+        thinking_level=ThinkingLevel.HIGH,
+        priority=GeminiPriority.INVOICE_EXTRACTION,
+        tenant_id=tenant_id,
+    )
+    return InvoiceExtractionResponse.model_validate(data)
+
+
+_page_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_page_executor() -> ThreadPoolExecutor:
+    global _page_executor
+    if _page_executor is None:
+        _page_executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.INVOICE_PAGE_CONCURRENCY),
+            thread_name_prefix="invoice-page",
+        )
+    return _page_executor
+
+
+def _extract(
+    payload: InvoicePayload, tenant_id: str | None
+) -> InvoiceExtractionResponse:
+    _extraction_stats.record_route(payload.route)
+    if payload.pages:
+        total = len(payload.pages)
+        results = list(
+            _get_page_executor().map(
+                lambda numbered: _extract_page(
+                    numbered[1], numbered[0], total, tenant_id
+                ),
+                enumerate(payload.pages, start=1),
+            )
+        )
+        return _merge_pages(results, payload.page_count)
+
+    data = generate_structured(
+        prompt=payload.prompt,
+        system_prompt=_build_prompt(),
+        response_schema=InvoiceExtractionResponse,
+        image_bytes=payload.data,
+        mime_type=payload.mime_type,
+        thinking_level=payload.thinking_level,
+        priority=GeminiPriority.INVOICE_EXTRACTION,
+        tenant_id=tenant_id,
+    )
+    return _finalize_extraction(data)
+
+
+async def _aextract(
+    payload: InvoicePayload, tenant_id: str | None
+) -> InvoiceExtractionResponse:
+    _extraction_stats.record_route(payload.route)
+    if payload.pages:
+        total = len(payload.pages)
+        semaphore = asyncio.Semaphore(max(1, settings.INVOICE_PAGE_CONCURRENCY))
+
+        async def extract_page(number: int, page: bytes) -> InvoiceExtractionResponse:
+            async with semaphore:
+                return await _aextract_page(page, number, total, tenant_id)
+
+        results = await asyncio.gather(
+            *(
+                extract_page(number, page)
+                for number, page in enumerate(payload.pages, start=1)
+            )
+        )
+        return _merge_pages(list(results), payload.page_count)
+
+    data = await agenerate_structured(
+        prompt=payload.prompt,
+        system_prompt=_build_prompt(),
+        response_schema=InvoiceExtractionResponse,
+        image_bytes=payload.data,
+        mime_type=payload.mime_type,
+        thinking_level=payload.thinking_level,
+        priority=GeminiPriority.INVOICE_EXTRACTION,
+        tenant_id=tenant_id,
+    )
+    return _finalize_extraction(data)
+
+
 def extract_invoice(
-    file_base64: str,
+    file_bytes: bytes | memoryview,
     mime_type: str = "application/pdf",
+    tenant_id: str | None = None,
+    invoice_id: str | None = None,
 ) -> InvoiceExtractionResponse:
     """
     Extract invoice data from a PDF or image.
 
-    Uses HIGH thinking level for maximum accuracy with
-    complex tabular data and calculations.
+    Digital PDFs with a clean text layer are extracted from the text alone
+    at a lower thinking level; if that answer is empty or uncertain, the
+    invoice is extracted again with the document at HIGH thinking.
+    Scanned multi-page PDFs are extracted page by page and merged.
+    Text layers of suppliers with a learned template (tenant_id needed)
+    are parsed without the model when the line totals reconcile.
+    Everything else uses HIGH thinking for maximum accuracy with complex
+    tabular data and calculations.
 
     Args:
-        file_base64: Base64 encoded file (PDF or image)
+        file_bytes: Raw file data (PDF or image, bytes or memoryview)
         mime_type: File MIME type
+        tenant_id: Owner user id (Gemini fair-share scheduling)
+        invoice_id: Stored invoice; receives the template candidate
 
     Returns:
         InvoiceExtractionResponse with extracted data
@@ -193,53 +592,69 @@ def extract_invoice(
     """
     logger.info(f"Extracting invoice data, mime_type={mime_type}")
 
-    file_bytes = base64.b64decode(file_base64)
-    prompt = _build_prompt()
-
-    image_payload: bytes | None = file_bytes
-    image_mime_type = mime_type
-
-    if mime_type == "application/pdf":
-        text_layer = _extract_pdf_text(file_bytes)
-        if text_layer:
-            prompt = (
-                f"{prompt}\n\n"
-                "<invoice_text>\n"
-                f"{text_layer}\n"
-                "</invoice_text>\n\n"
-                "<note>\n"
-                "Nutze invoice_text als primaere Quelle, falls lesbar. "
-                "Wenn etwas unklar ist, verifiziere mit dem Layout.\n"
-                "</note>"
-            )
-        else:
-            rendered = _render_pdf_first_page(file_bytes)
-            if rendered:
-                image_payload = rendered
-                image_mime_type = "image/png"
+    text_layer = _read_text_layer(file_bytes, mime_type)
+    parsed = _parse_template(text_layer, tenant_id)
+    if parsed is not None:
+        _extraction_stats.record_route("template")
+        normalize_items(parsed.unnormalized, tenant_id)
+        _record_template_candidate(text_layer, parsed.result, tenant_id, invoice_id)
+        return parsed.result
+
+    payload = _prepare_payload(file_bytes, mime_type, text_layer=text_layer)
+    result = _extract(payload, tenant_id)
+
+    if payload.route == "text_only" and _text_only_insufficient(result):
+        logger.info("Text-only invoice extraction uncertain, retrying with the PDF")
+        _extraction_stats.record_escalation()
+        payload = _prepare_payload(
+            file_bytes, mime_type, text_only=False, text_layer=text_layer
+        )
+        result = _extract(payload, tenant_id)
 
-    # Use HIGH thinking for complex invoice analysis
-    data = generate_structured(
-        prompt=prompt,
-        response_schema=InvoiceExtractionResponse,
-        image_bytes=image_payload,
-        mime_type=image_mime_type,
-        thinking_level=ThinkingLevel.HIGH,
-    )
+    _record_template_candidate(text_layer, result, tenant_id, invoice_id)
+    return result
 
-    result = InvoiceExtractionResponse.model_validate(data)
 
-    # Log extraction results
-    logger.info(
-        f"Invoice extracted: supplier={result.supplier_name}, "
-        f"items={len(result.items)}, confidence={result.confidence}"
+async def aextract_invoice(
+    file_bytes: bytes | memoryview,
+    mime_type: str = "application/pdf",
+    tenant_id: str | None = None,
+    invoice_id: str | None = None,
+) -> InvoiceExtractionResponse:
+    """Async variant of extract_invoice()."""
+    logger.info(f"Extracting invoice data, mime_type={mime_type}")
+
+    # PDF parsing/rendering is CPU-bound, keep it off the event loop
+    text_layer = await anyio.to_thread.run_sync(
+        _read_text_layer, file_bytes, mime_type
     )
+    parsed = await anyio.to_thread.run_sync(_parse_template, text_layer, tenant_id)
+    if parsed is not None:
+        _extraction_stats.record_route("template")
+        await anormalize_items(parsed.unnormalized, tenant_id)
+        await anyio.to_thread.run_sync(
+            _record_template_candidate,
+            text_layer,
+            parsed.result,
+            tenant_id,
+            invoice_id,
+        )
+        return parsed.result
 
-    # Warn if low confidence
-    if result.confidence < 0.7:
-        logger.warning(
-            f"Low confidence extraction ({result.confidence:.2f}) for invoice "
-            f"{result.invoice_number}"
+    payload = await anyio.to_thread.run_sync(
+        _prepare_payload, file_bytes, mime_type, True, text_layer
+    )
+    result = await _aextract(payload, tenant_id)
+
+    if payload.route == "text_only" and _text_only_insufficient(result):
+        logger.info("Text-only invoice extraction uncertain, retrying with the PDF")
+        _extraction_stats.record_escalation()
+        payload = await anyio.to_thread.run_sync(
+            _prepare_payload, file_bytes, mime_type, False, text_layer
         )
+        result = await _aextract(payload, tenant_id)
 
+    await anyio.to_thread.run_sync(
+        _record_template_candidate, text_layer, result, tenant_id, invoice_id
+    )
     return result
@@ -0,0 +1,823 @@
+"""
+Deterministic invoice parsing with learned per-supplier templates.
+
+Our invoices come from a handful of wholesalers with fixed layouts. When
+the extraction of a text-layer invoice reconciles with the printed total,
+its layout is kept on the invoice as a candidate (template_candidate):
+- Line layout: which column holds description, quantity, unit, unit price
+  (net or gross), VAT rate and line total
+- Labels in front of invoice number, invoice date and gross total
+- Supplier name as printed (to recognize the next invoice)
+
+The candidate only counts towards the supplier's template once the user
+confirmed the invoice: a match action left every item matched to a
+product. A model answer that merely reconciles is never learned on its own.
+
+Once the same layout was confirmed on INVOICE_TEMPLATE_MIN_SAMPLES invoices,
+new text-layer PDFs of that supplier are parsed with these rules instead
+of a HIGH thinking model call. The result is only used when the parsed
+line totals reconcile with the printed gross total; otherwise the invoice
+goes to Gemini as before. Product name normalization is taken from
+earlier invoice items with the same line text, and only new lines are
+normalized by the model (LOW thinking, text only).
+
+Templates are stored in the invoice_templates table and cached per tenant
+(INVOICE_TEMPLATE_CACHE_TTL_SECONDS, dropped when this process saves one).
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any
+
+from app.core.config import settings
+from app.core.gemini import (
+    GeminiPriority,
+    ThinkingLevel,
+    agenerate_structured_list,
+    generate_structured_list,
+)
+from app.core.supabase import get_supabase
+from app.schemas.gemini_responses import (
+    InvoiceExtractionResponse,
+    InvoiceItem,
+    InvoiceItemNormalization,
+    InvoiceTotals,
+)
+from app.services.pdf_text import PdfText
+from app.services.product_catalog import normalize_text
+
+logger = logging.getLogger(__name__)
+
+COLUMN_SPLIT = re.compile(r"\s{2,}")
+AMOUNT = re.compile(r"^-?\d{1,3}(?:[.\s]\d{3})*(?:,\d+)?$|^-?\d+(?:[.,]\d+)?$")
+DATE = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{2,4})")
+VAT_RATES = (7.0, 19.0)
+REQUIRED_ROLES = ("description", "quantity", "unit_price", "total")
+SAVE_ATTEMPTS = 3
+MAX_CACHED_TENANTS = 500
+
+
+def split_columns(line: str) -> list[str]:
+    """Columns of a layout-mode text line (separated by 2+ spaces)."""
+    return [column for column in COLUMN_SPLIT.split(line.strip()) if column]
+
+
+def parse_amount(value: str) -> float | None:
+    """Parse 1.234,56 / 1234.56 / 12,5 / 19% into a float."""
+    token = value.strip().rstrip("%").replace("EUR", "").replace("€", "").strip()
+    if not token or not AMOUNT.match(token):
+        return None
+    if "," in token:
+        token = token.replace(".", "").replace(" ", "").replace(",", ".")
+    elif token.count(".") > 1:  # 1.234.567
+        token = token.replace(".", "")
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+def _close(a: float | None, b: float | None, tolerance: float = 0.011) -> bool:
+    return a is not None and b is not None and abs(a - b) <= tolerance
+
+
+def _label(text: str) -> str:
+    """Normalized label text (letters only) used to find header fields."""
+    return normalize_text(re.sub(r"[\d.,:/#-]+", " ", text))
+
+
+@dataclass
+class LineLayout:
+    """Column roles of an item line."""
+
+    columns: int
+    roles: dict[str, int]
+    unit_price_basis: str  # "net" or "gross"
+    total_basis: str  # "net" or "gross"
+    default_vat: float
+
+    def signature(self) -> tuple:
+        return (
+            self.columns,
+            tuple(sorted(self.roles.items())),
+            self.unit_price_basis,
+            self.total_basis,
+        )
+
+
+@dataclass
+class InvoiceTemplate:
+    """Learned parsing rules for one supplier."""
+
+    supplier_name: str
+    supplier_anchor: str
+    layout: LineLayout
+    number_label: str = ""
+    date_label: str = ""
+    total_label: str = ""
+    samples: int = 1
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "InvoiceTemplate":
+        layout = LineLayout(**data["layout"])
+        return cls(**{**data, "layout": layout})
+
+
+class _TemplateStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.parsed = 0
+        self.not_reconciled = 0
+        self.learned = 0
+        self.normalized_from_history = 0
+        self.normalized_by_model = 0
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "parsed": self.parsed,
+                "not_reconciled": self.not_reconciled,
+                "learned": self.learned,
+                "normalized_from_history": self.normalized_from_history,
+                "normalized_by_model": self.normalized_by_model,
+            }
+
+
+_stats = _TemplateStats()
+
+
+def invoice_template_stats() -> dict[str, int]:
+    return _stats.snapshot()
+
+
+# --- Learning -------------------------------------------------------------
+
+
+def _line_roles(columns: list[str], item: InvoiceItem) -> tuple[dict[str, int], str, str]:
+    """Map the columns of one item line to roles, with price bases."""
+    roles: dict[str, int] = {}
+    unit_price_basis = total_basis = ""
+    description = normalize_text(item.description)
+    total_net = item.unit_price_net * item.quantity
+
+    for index, column in enumerate(columns):
+        if description and description in normalize_text(column):
+            roles["description"] = index
+            break
+    if "description" not in roles:
+        return roles, unit_price_basis, total_basis
+
+    # Numbers right of the description first: a position number in front
+    # must not be taken for the quantity
+    order = sorted(
+        (index for index in range(len(columns)) if index != roles["description"]),
+        key=lambda index: (index < roles["description"], index),
+    )
+    for index in order:
+        column = columns[index]
+        if "unit" not in roles and item.unit and column.strip().lower() == item.unit.lower():
+            roles["unit"] = index
+            continue
+
+        value = parse_amount(column)
+        if value is None:
+            continue
+        if "vat" not in roles and "%" in column and _close(value, item.vat_rate):
+            roles["vat"] = index
+        elif "quantity" not in roles and _close(value, item.quantity):
+            roles["quantity"] = index
+        elif "unit_price" not in roles and _close(value, item.unit_price_gross):
+            roles["unit_price"], unit_price_basis = index, "gross"
+        elif "unit_price" not in roles and _close(value, item.unit_price_net):
+            roles["unit_price"], unit_price_basis = index, "net"
+        elif "total" not in roles and _close(value, item.total_gross):
+            roles["total"], total_basis = index, "gross"
+        elif "total" not in roles and _close(value, total_net, 0.02):
+            roles["total"], total_basis = index, "net"
+    return roles, unit_price_basis, total_basis
+
+
+def learn_layout(lines: list[str], items: list[InvoiceItem]) -> LineLayout | None:
+    """The column layout most item lines agree on, None without consensus."""
+    signatures: Counter = Counter()
+    layouts: dict[tuple, LineLayout] = {}
+    for item in items:
+        description = normalize_text(item.description)
+        if not description:
+            continue
+        line = next(
+            (line for line in lines if description in normalize_text(line)), None
+        )
+        if line is None:
+            continue
+        columns = split_columns(line)
+        roles, unit_price_basis, total_basis = _line_roles(columns, item)
+        if any(role not in roles for role in REQUIRED_ROLES):
+            continue
+        layout = LineLayout(
+            columns=len(columns),
+            roles=roles,
+            unit_price_basis=unit_price_basis,
+            total_basis=total_basis,
+            default_vat=item.vat_rate,
+        )
+        signatures[layout.signature()] += 1
+        layouts.setdefault(layout.signature(), layout)
+
+    if not signatures or not items:
+        return None
+    signature, count = signatures.most_common(1)[0]
+    if count / len(items) < settings.INVOICE_TEMPLATE_LINE_AGREEMENT:
+        return None
+
+    layout = layouts[signature]
+    vat_rates = Counter(item.vat_rate for item in items)
+    layout.default_vat = vat_rates.most_common(1)[0][0]
+    return layout
+
+
+def _learn_label(lines: list[str], value: str | None) -> str:
+    """Text in front of `value` on the first line that contains it."""
+    if not value:
+        return ""
+    for line in lines:
+        position = line.find(value)
+        if position > 0:
+            label = _label(line[:position])
+            if label:
+                return label
+    return ""
+
+
+def _format_date(iso_date: str | None) -> str | None:
+    try:
+        return datetime.strptime(iso_date or "", "%Y-%m-%d").strftime("%d.%m.%Y")
+    except ValueError:
+        return None
+
+
+def _learn_total_label(lines: list[str], gross: float) -> str:
+    for line in reversed(lines):
+        columns = split_columns(line)
+        if len(columns) < 2 or not _close(parse_amount(columns[-1]), gross):
+            continue
+        label = _label(" ".join(columns[:-1]))
+        if label:
+            return label
+    return ""
+
+
+def reconciles(items: list[InvoiceItem], gross: float | None) -> bool:
+    """Line totals add up to the printed gross total."""
+    if not items or gross is None:
+        return False
+    total = sum(item.total_gross for item in items)
+    return abs(total - gross) <= max(0.05, abs(gross) * 0.001)
+
+
+def totals_from_items(
+    items: list[InvoiceItem], gross: float | None = None
+) -> InvoiceTotals:
+    """Net and VAT sums of the items; gross as printed when given."""
+    vat_by_rate = {rate: 0.0 for rate in VAT_RATES}
+    net = 0.0
+    for item in items:
+        item_net = item.total_gross / (1 + item.vat_rate / 100)
+        net += item_net
+        if item.vat_rate in vat_by_rate:
+            vat_by_rate[item.vat_rate] += item.total_gross - item_net
+    if gross is None:
+        gross = sum(item.total_gross for item in items)
+    return InvoiceTotals(
+        net=round(net, 2),
+        vat_7=round(vat_by_rate[7.0], 2),
+        vat_19=round(vat_by_rate[19.0], 2),
+        gross=round(gross, 2),
+    )
+
+
+def learn_template(
+    text_layer: PdfText, extraction: InvoiceExtractionResponse
+) -> InvoiceTemplate | None:
+    """Derive parsing rules from a reconciled extraction of this text."""
+    if not extraction.supplier_name or not reconciles(
+        extraction.items, extraction.totals.gross
+    ):
+        return None
+
+    anchor = normalize_text(extraction.supplier_name)
+    first_page = normalize_text(text_layer.pages[0]) if text_layer.pages else ""
+    if not anchor or anchor not in first_page:
+        return None
+
+    lines = text_layer.text.splitlines()
+    layout = learn_layout(lines, extraction.items)
+    if layout is None:
+        return None
+
+    return InvoiceTemplate(
+        supplier_name=extraction.supplier_name,
+        supplier_anchor=anchor,
+        layout=layout,
+        number_label=_learn_label(lines, extraction.invoice_number),
+        date_label=_learn_label(lines, _format_date(extraction.invoice_date)),
+        total_label=_learn_total_label(lines, extraction.totals.gross),
+    )
+
+
+# --- Parsing --------------------------------------------------------------
+
+
+def _parse_item(columns: list[str], layout: LineLayout) -> InvoiceItem | None:
+    roles = layout.roles
+    if len(columns) != layout.columns:
+        return None
+
+    description = columns[roles["description"]].strip()
+    quantity = parse_amount(columns[roles["quantity"]])
+    unit_price = parse_amount(columns[roles["unit_price"]])
+    total = parse_amount(columns[roles["total"]])
+    if not description or quantity is None or unit_price is None or total is None:
+        return None
+    if quantity <= 0 or quantity != int(quantity):
+        return None
+
+    vat_rate = layout.default_vat
+    if "vat" in roles:
+        vat_rate = parse_amount(columns[roles["vat"]]) or vat_rate
+    factor = 1 + vat_rate / 100
+
+    if layout.unit_price_basis == "gross":
+        unit_price_gross, unit_price_net = unit_price, unit_price / factor
+    else:
+        unit_price_net, unit_price_gross = unit_price, unit_price * factor
+    total_gross = total if layout.total_basis == "gross" else total * factor
+
+    # Header/summary lines with the same column count don't multiply out
+    line_price = unit_price_gross if layout.total_basis == "gross" else unit_price_net
+    if not _close(line_price * quantity, total, max(0.05, abs(total) * 0.01)):
+        return None
+
+    return InvoiceItem(
+        description=description,
+        quantity=int(quantity),
+        unit=columns[roles["unit"]].strip() if "unit" in roles else "Stk",
+        unit_price_net=round(unit_price_net, 2),
+        unit_price_gross=round(unit_price_gross, 2),
+        vat_rate=vat_rate,
+        total_gross=round(total_gross, 2),
+    )
+
+
+def _find_after_label(lines: list[str], label: str) -> str | None:
+    """Text following the label on its line (raw, unnormalized)."""
+    if not label:
+        return None
+    for line in lines:
+        if not _label(line).startswith(label):
+            continue
+        columns = split_columns(line)
+        # "Rechnungsnr.: 4711" or "Rechnungsnr.   4711"
+        tail = columns[-1] if len(columns) > 1 else line.split(":")[-1]
+        tail = tail.strip()
+        if tail:
+            return tail
+    return None
+
+
+def _find_total(lines: list[str], label: str) -> float | None:
+    if not label:
+        return None
+    for line in reversed(lines):
+        columns = split_columns(line)
+        if len(columns) >= 2 and _label(" ".join(columns[:-1])) == label:
+            return parse_amount(columns[-1])
+    return None
+
+
+def _parse_date(value: str | None) -> str | None:
+    match = DATE.search(value or "")
+    if not match:
+        return None
+    day, month, year = (int(part) for part in match.groups())
+    if year < 100:
+        year += 2000
+    try:
+        return datetime(year, month, day).strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def parse_invoice(
+    template: InvoiceTemplate, text_layer: PdfText
+) -> InvoiceExtractionResponse | None:
+    """Parse with the template; None unless the items reconcile."""
+    lines = text_layer.text.splitlines()
+    items = [
+        item
+        for item in (_parse_item(split_columns(line), template.layout) for line in lines)
+        if item is not None
+    ]
+    gross = _find_total(lines, template.total_label)
+    if not reconciles(items, gross):
+        _stats.add(not_reconciled=1)
+        logger.info(
+            f"Template for {template.supplier_name} did not reconcile "
+            f"({len(items)} items, total {gross}), using the model"
+        )
+        return None
+
+    _stats.add(parsed=1)
+    return InvoiceExtractionResponse(
+        supplier_name=template.supplier_name,
+        invoice_number=_find_after_label(lines, template.number_label),
+        invoice_date=_parse_date(_find_after_label(lines, template.date_label)),
+        items=items,
+        totals=totals_from_items(items, gross),
+        confidence=0.99,
+    )
+
+
+# --- Storage --------------------------------------------------------------
+
+
+def _load_templates(supabase, user_id: str) -> list[InvoiceTemplate]:
+    response = (
+        supabase.table("invoice_templates")
+        .select("supplier_key, template")
+        .eq("user_id", user_id)
+        .execute()
+    )
+    templates: list[InvoiceTemplate] = []
+    for row in response.data or []:
+        try:
+            templates.append(InvoiceTemplate.from_dict(row["template"]))
+        except Exception as exc:
+            logger.warning(f"Ignoring invalid invoice template: {exc}")
+    return templates
+
+
+class _TemplateCache:
+    """Templates per tenant, reloaded after INVOICE_TEMPLATE_CACHE_TTL_SECONDS."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, list[InvoiceTemplate]]] = (
+            OrderedDict()
+        )
+
+    def get(self, supabase, user_id: str) -> list[InvoiceTemplate]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            ttl = settings.INVOICE_TEMPLATE_CACHE_TTL_SECONDS
+            if entry is not None and time.monotonic() - entry[0] <= ttl:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        templates = _load_templates(supabase, user_id)
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), templates)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > MAX_CACHED_TENANTS:
+                self._entries.popitem(last=False)
+        return templates
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+_template_cache = _TemplateCache()
+
+
+def find_template(
+    user_id: str, text_layer: PdfText, supabase=None
+) -> InvoiceTemplate | None:
+    """The active template whose supplier appears on the first page."""
+    if not settings.INVOICE_TEMPLATES_ENABLED or not text_layer.pages:
+        return None
+    first_page = normalize_text(text_layer.pages[0])
+    try:
+        templates = _template_cache.get(supabase or get_supabase(), user_id)
+    except Exception as exc:
+        logger.warning(f"Invoice template lookup failed: {exc}")
+        return None
+
+    candidates = [
+        template
+        for template in templates
+        if template.samples >= settings.INVOICE_TEMPLATE_MIN_SAMPLES
+        and template.supplier_anchor in first_page
+    ]
+    # The longest supplier name is the most specific match
+    return max(candidates, key=lambda t: len(t.supplier_anchor), default=None)
+
+
+def store_template_candidate(
+    supabase,
+    user_id: str,
+    invoice_id: str,
+    text_layer: PdfText | None,
+    extraction: InvoiceExtractionResponse,
+) -> None:
+    """Keep the layout of a reconciled extraction on the invoice (or clear it)."""
+    candidate = None
+    if (
+        settings.INVOICE_TEMPLATES_ENABLED
+        and text_layer is not None
+        and text_layer.is_clean
+    ):
+        template = learn_template(text_layer, extraction)
+        candidate = template.to_dict() if template else None
+    (
+        supabase.table("invoices")
+        .update({"template_candidate": candidate})
+        .eq("id", invoice_id)
+        .eq("user_id", user_id)
+        .execute()
+    )
+
+
+def _merge_template(
+    template: InvoiceTemplate, existing: InvoiceTemplate | None
+) -> InvoiceTemplate:
+    """The template to store after confirming `template` on top of `existing`."""
+    if existing is None or (
+        existing.layout.signature() != template.layout.signature()
+    ):
+        return replace(template, samples=1)
+    # Same layout again: one more confirmation, keep known labels
+    return replace(
+        template,
+        samples=existing.samples + 1,
+        number_label=template.number_label or existing.number_label,
+        date_label=template.date_label or existing.date_label,
+        total_label=template.total_label or existing.total_label,
+    )
+
+
+def _save_template(supabase, user_id: str, template: InvoiceTemplate) -> None:
+    """
+    Count one confirmation of the template (optimistic concurrency).
+
+    The row is only overwritten if its updated_at is still the one read,
+    so two concurrent confirmations can't both store samples + 1; the
+    loser re-reads and retries.
+    """
+    for _ in range(SAVE_ATTEMPTS):
+        rows = (
+            supabase.table("invoice_templates")
+            .select("template, updated_at")
+            .eq("user_id", user_id)
+            .eq("supplier_key", template.supplier_anchor)
+            .execute()
+        ).data or []
+        row = rows[0] if rows else None
+        existing = InvoiceTemplate.from_dict(row["template"]) if row else None
+        merged = _merge_template(template, existing)
+        values = {
+            "template": merged.to_dict(),
+            "samples": merged.samples,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+        if row is None:
+            try:
+                supabase.table("invoice_templates").insert(
+                    {
+                        "user_id": user_id,
+                        "supplier_key": template.supplier_anchor,
+                        **values,
+                    }
+                ).execute()
+            except Exception as exc:
+                # Unique (user_id, supplier_key): inserted concurrently
+                logger.debug(f"Invoice template insert lost a race: {exc}")
+                continue
+            break
+
+        updated = (
+            supabase.table("invoice_templates")
+            .update(values)
+            .eq("user_id", user_id)
+            .eq("supplier_key", template.supplier_anchor)
+            .eq("updated_at", row["updated_at"])
+            .execute()
+        )
+        if updated.data:
+            break
+    else:
+        logger.warning(
+            f"Invoice template for {template.supplier_name} not saved: "
+            f"concurrent updates"
+        )
+        return
+
+    _template_cache.invalidate(user_id)
+    _stats.add(learned=1)
+    logger.info(
+        f"Invoice template for {template.supplier_name}: "
+        f"{merged.samples} confirmed invoice(s)"
+    )
+
+
+def confirm_template_candidate(supabase, user_id: str, invoice_id: str) -> None:
+    """
+    Learn the invoice's candidate layout once the user confirmed its items.
+
+    Called after a user match action; does nothing while any item is still
+    unmatched. The candidate is cleared first, so an invoice counts once.
+    """
+    if not settings.INVOICE_TEMPLATES_ENABLED:
+        return
+    try:
+        items = (
+            supabase.table("invoice_items")
+            .select("matched_product_id")
+            .eq("invoice_id", invoice_id)
+            .eq("user_id", user_id)
+            .execute()
+        ).data or []
+        if not items or any(not row.get("matched_product_id") for row in items):
+            return
+
+        invoice = (
+            supabase.table("invoices")
+            .select("template_candidate")
+            .eq("id", invoice_id)
+            .eq("user_id", user_id)
+            .execute()
+        ).data or []
+        candidate = invoice[0].get("template_candidate") if invoice else None
+        if not candidate:
+            return
+
+        cleared = (
+            supabase.table("invoices")
+            .update({"template_candidate": None})
+            .eq("id", invoice_id)
+            .eq("user_id", user_id)
+            .not_.is_("template_candidate", "null")
+            .execute()
+        )
+        if not cleared.data:
+            return  # Confirmed concurrently
+        _save_template(supabase, user_id, InvoiceTemplate.from_dict(candidate))
+    except Exception as exc:
+        logger.warning(f"Confirming invoice template failed: {exc}")
+
+
+# --- Normalization --------------------------------------------------------
+
+
+def _build_normalization_prompt(descriptions: list[str]) -> str:
+    lines = "\n".join(f"- {description}" for description in descriptions)
+    return f"""Du normalisierst Positionen von Getraenke-Grosshandelsrechnungen.
+
+Fuer JEDE Position:
+- description: exakt wie unten angegeben
+- normalized_name: Vollstaendiger, sauberer Produktname mit Groesse
+- normalized_brand: Markenname ausgeschrieben
+- normalized_size: Groesse einheitlich formatiert (z.B. "0,7l", "1L", "0,33l")
+- normalized_category: eine von Spirituosen, Bier, Wein, Sekt, Softdrinks,
+  Saefte, Wasser, Lebensmittel, Snacks, Tabak, Reinigung, Sonstiges
+
+Abkuerzungen entschluesseln (z.B. "Jaegerm." = Jaegermeister, "MW" = Mehrweg).
+
+<positions>
+{lines}
+</positions>"""
+
+
+def _apply_normalization(item: InvoiceItem, data: dict[str, Any]) -> None:
+    item.normalized_name = data.get("normalized_name") or item.normalized_name
+    item.normalized_brand = data.get("normalized_brand") or item.normalized_brand
+    item.normalized_size = data.get("normalized_size") or item.normalized_size
+    item.normalized_category = (
+        data.get("normalized_category") or item.normalized_category
+    )
+
+
+def normalize_from_history(
+    supabase, user_id: str, result: InvoiceExtractionResponse
+) -> list[InvoiceItem]:
+    """Copy normalization of earlier items with the same text; returns the rest."""
+    descriptions = sorted({item.description for item in result.items})
+    known: dict[str, dict[str, Any]] = {}
+    try:
+        response = (
+            supabase.table("invoice_items")
+            .select("raw_text, ai_normalized_name, ai_brand, ai_size, ai_category")
+            .eq("user_id", user_id)
+            .in_("raw_text", descriptions)
+            .not_.is_("ai_normalized_name", "null")
+            .execute()
+        )
+        for row in response.data or []:
+            if isinstance(row, dict):
+                known.setdefault(row["raw_text"], row)
+    except Exception as exc:
+        logger.warning(f"Normalization history lookup failed: {exc}")
+
+    missing: list[InvoiceItem] = []
+    for item in result.items:
+        row = known.get(item.description)
+        if row is None:
+            missing.append(item)
+            continue
+        _apply_normalization(
+            item,
+            {
+                "normalized_name": row.get("ai_normalized_name"),
+                "normalized_brand": row.get("ai_brand"),
+                "normalized_size": row.get("ai_size"),
+                "normalized_category": row.get("ai_category"),
+            },
+        )
+    _stats.add(normalized_from_history=len(result.items) - len(missing))
+    return missing
+
+
+def _merge_normalizations(items: list[InvoiceItem], rows: list[dict[str, Any]]) -> None:
+    by_description = {
+        row.get("description"): row for row in rows if isinstance(row, dict)
+    }
+    for item in items:
+        row = by_description.get(item.description)
+        if row is not None:
+            _apply_normalization(item, row)
+    _stats.add(normalized_by_model=len(items))
+
+
+def normalize_items(items: list[InvoiceItem], tenant_id: str | None) -> None:
+    """Normalize new lines with a cheap text-only model call (in place)."""
+    if not items:
+        return
+    descriptions = sorted({item.description for item in items})
+    try:
+        rows = generate_structured_list(
+            prompt=_build_normalization_prompt(descriptions),
+            item_schema=InvoiceItemNormalization,
+            thinking_level=ThinkingLevel.LOW,
+            priority=GeminiPriority.INVOICE_EXTRACTION,
+            tenant_id=tenant_id,
+        )
+    except Exception as exc:
+        # Parsed items stay usable without normalization
+        logger.warning(f"Invoice item normalization failed: {exc}")
+        return
+    _merge_normalizations(items, rows)
+
+
+async def anormalize_items(items: list[InvoiceItem], tenant_id: str | None) -> None:
+    """Async variant of normalize_items()."""
+    if not items:
+        return
+    descriptions = sorted({item.description for item in items})
+    try:
+        rows = await agenerate_structured_list(
+            prompt=_build_normalization_prompt(descriptions),
+            item_schema=InvoiceItemNormalization,
+            thinking_level=ThinkingLevel.LOW,
+            priority=GeminiPriority.INVOICE_EXTRACTION,
+            tenant_id=tenant_id,
+        )
+    except Exception as exc:
+        logger.warning(f"Invoice item normalization failed: {exc}")
+        return
+    _merge_normalizations(items, rows)
+
+
+@dataclass
+class TemplateParse:
+    """A template-parsed invoice and the items still to normalize."""
+
+    result: InvoiceExtractionResponse
+    unnormalized: list[InvoiceItem] = field(default_factory=list)
+
+
+def parse_with_template(
+    user_id: str, text_layer: PdfText, supabase=None
+) -> TemplateParse | None:
+    """Template parse + history normalization; None to use the model."""
+    supabase = supabase or get_supabase()
+    template = find_template(user_id, text_layer, supabase)
+    if template is None:
+        return None
+    result = parse_invoice(template, text_layer)
+    if result is None:
+        return None
+    return TemplateParse(result, normalize_from_history(supabase, user_id, result))
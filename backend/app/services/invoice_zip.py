@@ -0,0 +1,192 @@
+"""
+Streaming ingestion of invoice ZIP archives.
+
+Month-end archives run to hundreds of MB. Instead of reading the archive
+and every entry into memory:
+- The upload is copied in 1 MB chunks into our own temporary file and
+  the archive is read from there (SpooledZipFile deletes it on close),
+  never as one bytes object
+- Entries are streamed from the archive straight to storage, at most
+  INVOICE_ZIP_UPLOAD_CONCURRENCY at a time; memory per upload is one
+  multipart chunk (STORAGE_UPLOAD_CHUNK_BYTES)
+- Results are yielded as each entry is stored, in completion order
+
+Invoice rows and processing jobs are created by the caller, in bulk.
+"""
+
+import asyncio
+import logging
+import mimetypes
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, AsyncIterator
+from zipfile import ZipFile, ZipInfo
+
+import anyio
+
+from app.core.config import settings
+from app.services.storage_service import StorageService
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_INVOICE_EXTENSIONS = {
+    ".pdf",
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".tif",
+    ".tiff",
+}
+
+
+def guess_mime_type(file_name: str) -> str:
+    mime_type, _ = mimetypes.guess_type(file_name)
+    if mime_type:
+        return mime_type
+    if file_name.lower().endswith(".pdf"):
+        return "application/pdf"
+    return "application/octet-stream"
+
+
+def is_allowed_invoice_file(file_name: str) -> bool:
+    return file_name.lower().endswith(tuple(ALLOWED_INVOICE_EXTENSIONS))
+
+
+class SpooledZipFile(ZipFile):
+    """ZipFile over a temporary file; closing it also deletes the file."""
+
+    def __init__(self, spool: IO[bytes]):
+        self._spool = spool
+        try:
+            super().__init__(spool)
+        except BaseException:
+            spool.close()
+            raise
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._spool.close()
+
+
+@dataclass
+class ZipEntry:
+    """An archive member that will become an invoice."""
+
+    info: ZipInfo
+    file_name: str
+    invoice_id: str  # Assigned up front so results can name it
+
+
+@dataclass
+class StoredEntry:
+    """Outcome of storing one entry."""
+
+    entry: ZipEntry
+    storage_key: str | None = None
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def select_entries(zip_file: ZipFile) -> tuple[list[ZipEntry], list[dict[str, str]]]:
+    """Entries to ingest and per-file errors for the ones that are skipped."""
+    entries: list[ZipEntry] = []
+    errors: list[dict[str, str]] = []
+    for info in zip_file.infolist():
+        if info.is_dir():
+            continue
+        entry_name = Path(info.filename).name
+        if not entry_name:
+            continue
+
+        if not is_allowed_invoice_file(entry_name):
+            errors.append({"file": entry_name, "error": "Unsupported file type"})
+        elif info.file_size == 0:
+            errors.append({"file": entry_name, "error": "File is empty"})
+        elif info.file_size > settings.INVOICE_ZIP_MAX_ENTRY_BYTES:
+            errors.append({"file": entry_name, "error": "File too large"})
+        elif len(entries) >= settings.INVOICE_ZIP_MAX_ENTRIES:
+            errors.append(
+                {
+                    "file": entry_name,
+                    "error": f"More than {settings.INVOICE_ZIP_MAX_ENTRIES} files",
+                }
+            )
+        else:
+            entries.append(ZipEntry(info, entry_name, str(uuid.uuid4())))
+    return entries, errors
+
+
+def _store_entry(
+    zip_file: ZipFile, entry: ZipEntry, storage: StorageService, storage_key: str
+) -> None:
+    with zip_file.open(entry.info) as source:
+        storage.upload_stream(source, storage_key, guess_mime_type(entry.file_name))
+
+
+async def store_entries(
+    zip_file: ZipFile,
+    entries: list[ZipEntry],
+    storage: StorageService,
+    user_id: str,
+) -> AsyncIterator[StoredEntry]:
+    """
+    Upload entries concurrently and yield each one as soon as it is stored.
+
+    Closing the iterator early (use contextlib.aclosing) cancels the
+    entries not started yet and waits for the uploads already running in
+    threads, which can't be interrupted; files nobody received are
+    deleted again. The archive must stay open until the iterator is
+    closed.
+    """
+    semaphore = asyncio.Semaphore(max(1, settings.INVOICE_ZIP_UPLOAD_CONCURRENCY))
+    # Keys not handed to the caller as stored, by invoice id. Recorded
+    # before the upload starts, so a cancelled upload is still cleaned up
+    unclaimed: dict[str, str] = {}
+
+    async def store(entry: ZipEntry) -> StoredEntry:
+        async with semaphore:
+            key = storage.generate_key(
+                user_id=user_id,
+                category="invoices",
+                filename=entry.file_name,
+                include_date=True,
+            )
+            unclaimed[entry.invoice_id] = key
+            try:
+                # ZipFile reads are serialized on the shared file handle;
+                # the upload itself runs in parallel
+                await anyio.to_thread.run_sync(
+                    _store_entry, zip_file, entry, storage, key
+                )
+                return StoredEntry(entry, storage_key=key)
+            except Exception as exc:
+                logger.exception(
+                    "Invoice ZIP entry %s failed (user_id=%s): %s",
+                    entry.file_name,
+                    user_id,
+                    exc,
+                )
+                return StoredEntry(entry, error=str(exc))
+
+    tasks = [asyncio.create_task(store(entry)) for entry in entries]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            if item.ok:
+                # Handed to the caller, who deletes it if it can't be used
+                unclaimed.pop(item.entry.invoice_id, None)
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Shielded: this also runs when the request itself is cancelled
+        with anyio.CancelScope(shield=True):
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for key in unclaimed.values():
+                await storage.delete(key)
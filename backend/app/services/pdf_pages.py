@@ -0,0 +1,220 @@
+"""
+PDF page rendering for invoices without a text layer.
+
+Scanned invoices are sent to Gemini as page images. Wholesale invoices
+run 4-10 pages, and pdfium is neither thread-safe nor fast, so:
+- All pages are rendered in a process pool (INVOICE_RENDER_WORKERS)
+- Pages are split across the workers; each opens the document once
+- The page count is capped at INVOICE_PDF_MAX_PAGES
+- Without a usable pool (e.g. sandboxed hosts) pages are rendered in
+  this process, one document at a time
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from io import BytesIO
+from multiprocessing import get_context
+from typing import Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RenderedPdf:
+    """PNG images of the first pages of a PDF."""
+
+    pages: list[bytes] = field(default_factory=list)
+    page_count: int = 0
+
+    @property
+    def truncated(self) -> bool:
+        return len(self.pages) < self.page_count
+
+
+def _render_chunk(
+    file_bytes: bytes, indexes: list[int], scale: float
+) -> tuple[int, dict[int, bytes]]:
+    """
+    Render the given pages to PNG (runs in a worker process).
+
+    Returns (page count, {page index: png}); an empty dict when pdfium is
+    missing or the document can't be read.
+    """
+    try:
+        import pypdfium2 as pdfium
+    except Exception as exc:
+        logger.warning("pypdfium2 not available for PDF rendering: %s", exc)
+        return 0, {}
+
+    rendered: dict[int, bytes] = {}
+    try:
+        pdf = pdfium.PdfDocument(file_bytes)
+    except Exception as exc:
+        logger.warning("Failed to open PDF for rendering: %s", exc)
+        return 0, {}
+
+    try:
+        page_count = len(pdf)
+        for index in indexes:
+            if index >= page_count:
+                continue
+            page = pdf.get_page(index)
+            try:
+                buffer = BytesIO()
+                page.render(scale=scale).to_pil().save(buffer, format="PNG")
+                rendered[index] = buffer.getvalue()
+            except Exception as exc:
+                logger.warning("Failed to render PDF page %s: %s", index + 1, exc)
+            finally:
+                page.close()
+        return page_count, rendered
+    finally:
+        pdf.close()
+
+
+def _page_count(file_bytes: bytes) -> int:
+    """Number of pages (runs in a worker process)."""
+    return _render_chunk(file_bytes, [], 1.0)[0]
+
+
+class PageRenderer:
+    """Process pool for page rendering, created on first use."""
+
+    def __init__(self, workers: int):
+        self._workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._pool: ProcessPoolExecutor | None = None
+        # pdfium must not be used by two threads of this process at once
+        self._local_lock = threading.Lock()
+        self.documents = 0
+        self.pages = 0
+        self.local_fallbacks = 0
+        self.render_seconds = 0.0
+
+    def _get_pool(self) -> ProcessPoolExecutor | None:
+        with self._lock:
+            if self._pool is None and self._workers > 1:
+                try:
+                    # spawn: forking a process with running threads is unsafe
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self._workers, mp_context=get_context("spawn")
+                    )
+                except (OSError, NotImplementedError) as exc:
+                    logger.warning(f"No render process pool, rendering inline: {exc}")
+                    self._workers = 1
+            return self._pool
+
+    def _drop_pool(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _render_in_pool(
+        self, pool: ProcessPoolExecutor, file_bytes: bytes, scale: float
+    ) -> tuple[int, dict[int, bytes]]:
+        page_count = pool.submit(_page_count, file_bytes).result()
+        count = min(page_count, max(1, settings.INVOICE_PDF_MAX_PAGES))
+        if count == 0:
+            return page_count, {}
+
+        # Round-robin so every worker gets early and late pages
+        workers = min(self._workers, count)
+        chunks = [list(range(start, count, workers)) for start in range(workers)]
+        futures = [
+            pool.submit(_render_chunk, file_bytes, chunk, scale) for chunk in chunks
+        ]
+        rendered: dict[int, bytes] = {}
+        for future in futures:
+            rendered.update(future.result()[1])
+        return page_count, rendered
+
+    def _render_inline(
+        self, file_bytes: bytes, scale: float
+    ) -> tuple[int, dict[int, bytes]]:
+        with self._local_lock:
+            page_count = _page_count(file_bytes)
+            count = min(page_count, max(1, settings.INVOICE_PDF_MAX_PAGES))
+            return page_count, _render_chunk(file_bytes, list(range(count)), scale)[1]
+
+    def render(self, file_bytes: bytes | memoryview) -> RenderedPdf:
+        # Workers get a pickled copy; pdfium needs bytes, not a memoryview
+        data = bytes(file_bytes)
+        scale = settings.INVOICE_RENDER_SCALE
+        started = time.perf_counter()
+
+        pool = self._get_pool()
+        result = None
+        if pool is not None:
+            try:
+                result = self._render_in_pool(pool, data, scale)
+            except Exception as exc:
+                logger.warning(f"Render process pool failed, rendering inline: {exc}")
+                if isinstance(exc, (BrokenProcessPool, OSError)):
+                    self._drop_pool()
+        if result is None:
+            if pool is not None:
+                with self._lock:
+                    self.local_fallbacks += 1
+            result = self._render_inline(data, scale)
+
+        page_count, rendered = result
+        # A page that failed to render ends the sequence - later pages
+        # without the one before would be merged out of order
+        pages: list[bytes] = []
+        for index in range(len(rendered)):
+            if index not in rendered:
+                break
+            pages.append(rendered[index])
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.documents += 1
+            self.pages += len(pages)
+            self.render_seconds += elapsed
+        if page_count > len(pages):
+            logger.warning(
+                f"Rendered {len(pages)} of {page_count} PDF pages "
+                f"(INVOICE_PDF_MAX_PAGES={settings.INVOICE_PDF_MAX_PAGES})"
+            )
+        return RenderedPdf(pages=pages, page_count=page_count)
+
+    def close(self) -> None:
+        self._drop_pool()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self._workers,
+                "documents": self.documents,
+                "pages": self.pages,
+                "local_fallbacks": self.local_fallbacks,
+                "avg_seconds_per_document": (
+                    round(self.render_seconds / self.documents, 3)
+                    if self.documents
+                    else 0.0
+                ),
+            }
+
+
+# Singleton instance
+_renderer: Optional[PageRenderer] = None
+
+
+def get_page_renderer() -> PageRenderer:
+    """Get the PDF page renderer singleton."""
+    global _renderer
+    if _renderer is None:
+        _renderer = PageRenderer(settings.INVOICE_RENDER_WORKERS)
+    return _renderer
+
+
+def render_pdf_pages(file_bytes: bytes | memoryview) -> RenderedPdf:
+    """Render all pages (up to INVOICE_PDF_MAX_PAGES) to PNG images."""
+    return get_page_renderer().render(file_bytes)
@@ -0,0 +1,137 @@
+"""
+PDF text layer extraction for invoices.
+
+Most supplier invoices are digital PDFs with a text layer. Reading it
+locally is far cheaper than letting Gemini look at the PDF.
+
+Features:
+- All pages (up to INVOICE_PDF_MAX_PAGES), in page order
+- Layout mode: table columns stay on their printed line, left to right
+- Quality check: only clean text layers are used without the document
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from io import BytesIO
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# A page with less text than this is most likely a scan
+MIN_PAGE_CHARS = 80
+# Amounts like 12,50 / 1.234,56 / 12.50 - a price table needs a few
+AMOUNT_PATTERN = re.compile(r"\d[\d.]*[.,]\d{2}\b")
+MIN_AMOUNTS = 3
+MAX_GARBAGE_SHARE = 0.02
+
+
+@dataclass
+class PdfText:
+    """Text layer of a PDF, one string per page."""
+
+    pages: list[str] = field(default_factory=list)
+    page_count: int = 0
+    truncated: bool = False
+
+    @property
+    def text(self) -> str:
+        if len(self.pages) == 1:
+            return self.pages[0]
+        return "\n\n".join(
+            f"--- Seite {number} ---\n{page}"
+            for number, page in enumerate(self.pages, start=1)
+        )
+
+    def problem(self) -> str | None:
+        """Why the text layer can't stand in for the document, None if clean."""
+        if not self.pages:
+            return "no text layer"
+        if self.truncated:
+            return "text truncated"
+        if any(len(page.strip()) < MIN_PAGE_CHARS for page in self.pages):
+            return "page without text (scanned)"
+
+        text = self.text
+        if "(cid:" in text:
+            return "unmapped glyphs"
+        visible = [ch for ch in text if not ch.isspace()]
+        garbage = sum(
+            1 for ch in visible if ch == "\ufffd" or not ch.isprintable()
+        )
+        if visible and garbage / len(visible) > MAX_GARBAGE_SHARE:
+            return "garbled characters"
+        if len(AMOUNT_PATTERN.findall(text)) < MIN_AMOUNTS:
+            return "no amounts found"
+        return None
+
+    @property
+    def is_clean(self) -> bool:
+        return self.problem() is None
+
+
+def _tidy(text: str) -> str:
+    """Strip trailing blanks, collapse blank runs and common indentation."""
+    lines = [line.rstrip() for line in text.splitlines()]
+    kept: list[str] = []
+    for line in lines:
+        if line or (kept and kept[-1]):
+            kept.append(line)
+    while kept and not kept[-1]:
+        kept.pop()
+
+    indents = [len(line) - len(line.lstrip()) for line in kept if line]
+    indent = min(indents) if indents else 0
+    return "\n".join(line[indent:] for line in kept)
+
+
+def _page_text(page) -> str:
+    try:
+        # Layout mode keeps each table row on one line, columns in order
+        text = page.extract_text(
+            extraction_mode="layout", layout_mode_space_vertically=False
+        )
+    except TypeError:
+        text = page.extract_text()
+    except Exception as exc:
+        logger.debug("Layout extraction failed, using plain mode: %s", exc)
+        text = page.extract_text()
+    return _tidy(text or "")
+
+
+def extract_pdf_text(file_bytes: bytes | memoryview) -> PdfText:
+    """
+    Read the text layer of all pages.
+
+    Returns an empty PdfText when pypdf is missing or the PDF can't be read.
+    """
+    try:
+        from pypdf import PdfReader
+    except Exception as exc:
+        logger.warning("pypdf not available for text extraction: %s", exc)
+        return PdfText()
+
+    try:
+        reader = PdfReader(BytesIO(file_bytes))
+        result = PdfText(page_count=len(reader.pages))
+        max_pages = max(1, settings.INVOICE_PDF_MAX_PAGES)
+        max_chars = settings.INVOICE_TEXT_MAX_CHARS
+        result.truncated = result.page_count > max_pages
+
+        total = 0
+        for page in reader.pages[:max_pages]:
+            text = _page_text(page)
+            if total + len(text) > max_chars:
+                result.pages.append(text[: max(0, max_chars - total)])
+                result.truncated = True
+                break
+            result.pages.append(text)
+            total += len(text)
+
+        if not any(page.strip() for page in result.pages):
+            result.pages = []
+        return result
+    except Exception as exc:
+        logger.warning("Failed to extract PDF text layer: %s", exc)
+        return PdfText()
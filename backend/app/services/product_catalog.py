@@ -0,0 +1,360 @@
+"""
+In-process product catalog index per tenant.
+
+Product lookups by barcode and name are the most frequent database query:
+every scan, AI recognition and invoice line looks for an existing product.
+Instead of one ilike query per lookup, each tenant's products are loaded
+once and indexed in memory:
+- Barcode hash map
+- Normalized name/brand tokens (word search in any order)
+- Trigram index for fuzzy lookup (typos, umlaut spellings)
+
+Catalogs build lazily on first use, expire after PRODUCT_CATALOG_TTL_SECONDS
+(other workers may have changed products) and are updated or invalidated
+by every product create/update/delete in this process.
+"""
+
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+from typing import Any, Iterable
+
+from app.core.config import settings
+from app.core.supabase import get_supabase
+
+logger = logging.getLogger(__name__)
+
+# PostgREST caps responses at 1000 rows by default
+PAGE_SIZE = 1000
+
+# Fixed set of build locks; tenants share a stripe by hash, so the lock
+# table never grows with the number of tenants seen
+BUILD_LOCK_STRIPES = 64
+
+Product = dict[str, Any]
+
+
+def normalize_text(value: str | None) -> str:
+    """Lowercase, fold umlauts/accents, keep letters and digits."""
+    if not value:
+        return ""
+    value = value.lower().replace("ß", "ss")
+    for umlaut, folded in (("ä", "ae"), ("ö", "oe"), ("ü", "ue")):
+        value = value.replace(umlaut, folded)
+    value = unicodedata.normalize("NFKD", value)
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", value).split())
+
+
+def trigrams(value: str) -> set[str]:
+    """pg_trgm style trigrams of a normalized string, words padded."""
+    grams: set[str] = set()
+    for word in value.split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _barcode_key(value: Any) -> str:
+    return str(value).strip().upper() if value else ""
+
+
+class ProductCatalog:
+    """Index over one tenant's products. Thread-safe."""
+
+    def __init__(self, products: Iterable[Product]):
+        self._lock = threading.RLock()
+        self._products: dict[str, Product] = {}
+        self._barcodes: dict[str, list[str]] = defaultdict(list)
+        self._tokens: dict[str, set[str]] = defaultdict(set)
+        self._trigrams: dict[str, set[str]] = defaultdict(set)
+        self._product_tokens: dict[str, set[str]] = {}
+        self._product_trigrams: dict[str, set[str]] = {}
+        for product in products:
+            self._add_locked(product)
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def _add_locked(self, product: Product) -> None:
+        product_id = product.get("id")
+        if not product_id:
+            return
+        if product_id in self._products:
+            self._remove_locked(product_id)
+        self._products[product_id] = product
+
+        barcode = _barcode_key(product.get("barcode"))
+        if barcode:
+            self._barcodes[barcode].append(product_id)
+
+        name = normalize_text(product.get("name"))
+        brand = normalize_text(product.get("brand"))
+        tokens = set(f"{name} {brand}".split())
+        self._product_tokens[product_id] = tokens
+        for token in tokens:
+            self._tokens[token].add(product_id)
+
+        grams = trigrams(name)
+        self._product_trigrams[product_id] = grams
+        for gram in grams:
+            self._trigrams[gram].add(product_id)
+
+    def _remove_locked(self, product_id: str) -> None:
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return
+        barcode = _barcode_key(product.get("barcode"))
+        if barcode in self._barcodes:
+            self._barcodes[barcode] = [
+                pid for pid in self._barcodes[barcode] if pid != product_id
+            ]
+        for token in self._product_tokens.pop(product_id, set()):
+            self._tokens[token].discard(product_id)
+        for gram in self._product_trigrams.pop(product_id, set()):
+            self._trigrams[gram].discard(product_id)
+
+    def upsert(self, products: Iterable[Product]) -> None:
+        with self._lock:
+            for product in products:
+                self._add_locked(product)
+
+    def remove(self, product_id: str) -> None:
+        with self._lock:
+            self._remove_locked(product_id)
+
+    def get(self, product_id: str) -> Product | None:
+        with self._lock:
+            return self._products.get(product_id)
+
+    def find_by_barcodes(self, codes: Iterable[str]) -> Product | None:
+        """First product with any of the given barcodes (exact, case-insensitive)."""
+        with self._lock:
+            for code in codes:
+                for product_id in self._barcodes.get(_barcode_key(code), []):
+                    return self._products[product_id]
+        return None
+
+    def find_by_name(self, name: str, brand: str | None = None) -> Product | None:
+        """
+        First product whose name contains `name` and, if given, whose brand
+        contains `brand` - the ilike("%name%") semantics the queries had.
+        """
+        name = (name or "").lower()
+        brand = (brand or "").lower()
+        with self._lock:
+            for product in self._products.values():
+                if name not in (product.get("name") or "").lower():
+                    continue
+                if brand and brand not in (product.get("brand") or "").lower():
+                    continue
+                return product
+        return None
+
+    def find_all_by_name(self, name: str, limit: int) -> list[Product]:
+        """Products whose name contains `name` (case-insensitive)."""
+        name = (name or "").lower()
+        with self._lock:
+            return [
+                product
+                for product in self._products.values()
+                if name in (product.get("name") or "").lower()
+            ][:limit]
+
+    def find_by_tokens(self, text: str, limit: int) -> list[Product]:
+        """Products whose name/brand contain every word of `text`, any order."""
+        tokens = normalize_text(text).split()
+        if not tokens:
+            return []
+        with self._lock:
+            ids = set.intersection(
+                *(self._tokens.get(token, set()) for token in tokens)
+            )
+            return [
+                product
+                for product_id, product in self._products.items()
+                if product_id in ids
+            ][:limit]
+
+    def find_similar(
+        self, text: str, limit: int, min_similarity: float | None = None
+    ) -> list[tuple[Product, float]]:
+        """Products ranked by trigram similarity of the name (pg_trgm style)."""
+        if min_similarity is None:
+            min_similarity = settings.PRODUCT_CATALOG_MIN_SIMILARITY
+        query = trigrams(normalize_text(text))
+        if not query:
+            return []
+
+        with self._lock:
+            shared: dict[str, int] = defaultdict(int)
+            for gram in query:
+                for product_id in self._trigrams.get(gram, ()):
+                    shared[product_id] += 1
+
+            scored: list[tuple[Product, float]] = []
+            for product_id, count in shared.items():
+                union = len(query) + len(self._product_trigrams[product_id]) - count
+                similarity = count / union if union else 0.0
+                if similarity >= min_similarity:
+                    scored.append((self._products[product_id], similarity))
+
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored[:limit]
+
+    def search(self, q: str, limit: int = 20) -> list[Product]:
+        """
+        Search box lookup: name substring matches first, then products
+        matching all words, then fuzzy matches.
+        """
+        results: list[Product] = []
+        seen: set[str] = set()
+
+        def extend(products: Iterable[Product]) -> None:
+            for product in products:
+                if len(results) >= limit:
+                    return
+                if product["id"] not in seen:
+                    seen.add(product["id"])
+                    results.append(product)
+
+        extend(self.find_all_by_name(q, limit))
+        extend(self.find_by_tokens(q, limit))
+        extend(product for product, _ in self.find_similar(q, limit))
+        return results
+
+
+def _load_products(supabase, user_id: str) -> list[Product]:
+    products: list[Product] = []
+    start = 0
+    while True:
+        page = (
+            supabase.table("products")
+            .select("*")
+            .eq("user_id", user_id)
+            .order("id")
+            .range(start, start + PAGE_SIZE - 1)
+            .execute()
+        )
+        rows = [row for row in page.data or [] if isinstance(row, dict)]
+        products.extend(rows)
+        if len(rows) < PAGE_SIZE:
+            return products
+        start += PAGE_SIZE
+
+
+class ProductCatalogRegistry:
+    """Lazily built catalogs per tenant, LRU-bounded with a TTL."""
+
+    def __init__(self, ttl_seconds: float, max_tenants: int):
+        self._ttl_seconds = ttl_seconds
+        self._max_tenants = max_tenants
+        self._lock = threading.Lock()
+        self._catalogs: OrderedDict[str, tuple[float, ProductCatalog]] = OrderedDict()
+        self._build_locks = [threading.Lock() for _ in range(BUILD_LOCK_STRIPES)]
+        self.hits = 0
+        self.builds = 0
+        self.invalidations = 0
+
+    def _cached(self, user_id: str) -> ProductCatalog | None:
+        with self._lock:
+            entry = self._catalogs.get(user_id)
+            if entry is None:
+                return None
+            built_at, catalog = entry
+            if time.monotonic() - built_at > self._ttl_seconds:
+                del self._catalogs[user_id]
+                return None
+            self._catalogs.move_to_end(user_id)
+            self.hits += 1
+            return catalog
+
+    def get(self, user_id: str, supabase=None) -> ProductCatalog:
+        catalog = self._cached(user_id)
+        if catalog is not None:
+            return catalog
+
+        build_lock = self._build_locks[hash(user_id) % BUILD_LOCK_STRIPES]
+        # One build per tenant at a time; concurrent scans wait for it
+        with build_lock:
+            catalog = self._cached(user_id)
+            if catalog is not None:
+                return catalog
+
+            started = time.perf_counter()
+            catalog = ProductCatalog(_load_products(supabase or get_supabase(), user_id))
+            logger.info(
+                f"Product catalog built for {user_id}: {len(catalog)} products "
+                f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+            with self._lock:
+                self.builds += 1
+                self._catalogs[user_id] = (time.monotonic(), catalog)
+                while len(self._catalogs) > self._max_tenants:
+                    self._catalogs.popitem(last=False)
+            return catalog
+
+    def upsert(self, user_id: str, products: Iterable[Product]) -> None:
+        """Add created/updated rows to a loaded catalog (no-op otherwise)."""
+        with self._lock:
+            entry = self._catalogs.get(user_id)
+        if entry is not None:
+            entry[1].upsert(products)
+
+    def remove(self, user_id: str, product_id: str) -> None:
+        with self._lock:
+            entry = self._catalogs.get(user_id)
+        if entry is not None:
+            entry[1].remove(product_id)
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop a tenant's catalog; the next lookup rebuilds it."""
+        with self._lock:
+            if self._catalogs.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "tenants": len(self._catalogs),
+                "products": sum(len(c) for _, c in self._catalogs.values()),
+                "hits": self.hits,
+                "builds": self.builds,
+                "invalidations": self.invalidations,
+            }
+
+
+_registry: ProductCatalogRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_catalog_registry() -> ProductCatalogRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ProductCatalogRegistry(
+                    ttl_seconds=settings.PRODUCT_CATALOG_TTL_SECONDS,
+                    max_tenants=settings.PRODUCT_CATALOG_MAX_TENANTS,
+                )
+    return _registry
+
+
+def get_product_catalog(user_id: str, supabase=None) -> ProductCatalog:
+    """The tenant's catalog, built on first use."""
+    return get_catalog_registry().get(user_id, supabase)
+
+
+def catalog_upsert(user_id: str, products: Iterable[Product]) -> None:
+    get_catalog_registry().upsert(user_id, products)
+
+
+def catalog_remove(user_id: str, product_id: str) -> None:
+    get_catalog_registry().remove(user_id, product_id)
+
+
+def invalidate_product_catalog(user_id: str) -> None:
+    get_catalog_registry().invalidate(user_id)
@@ -14,8 +14,9 @@ from typing import Any
 
 from pydantic import BaseModel, Field
 
-from app.core.gemini import generate_structured_list, ThinkingLevel
+from app.core.gemini import generate_structured_list, GeminiPriority, ThinkingLevel
 from app.core.supabase import get_supabase
+from app.services.product_catalog import invalidate_product_catalog
 
 logger = logging.getLogger(__name__)
 
@@ -153,6 +154,8 @@ def match_products_for_user(user_id: str) -> dict[str, Any]:
             prompt=prompt,
             item_schema=ProductMatch,
             thinking_level=ThinkingLevel.HIGH,
+            priority=GeminiPriority.BULK_MATCH,
+            tenant_id=user_id,
         )
     except Exception as e:
         logger.error(f"Gemini matching failed: {e}")
@@ -244,6 +247,8 @@ def match_products_for_user(user_id: str) -> dict[str, Any]:
             failed_count += 1
 
     logger.info(f"Matching complete: {matched_count} matched, {failed_count} unmatched")
+    if matched_count:
+        invalidate_product_catalog(user_id)  # last_price changed
 
     return {
         "matched_count": matched_count,
@@ -318,6 +323,8 @@ def match_products_for_invoice(user_id: str, invoice_id: str) -> dict[str, Any]:
             prompt=prompt,
             item_schema=ProductMatch,
             thinking_level=ThinkingLevel.MEDIUM,
+            priority=GeminiPriority.BULK_MATCH,
+            tenant_id=user_id,
         )
     except Exception as e:
         logger.error(f"Gemini matching failed: {e}")
@@ -369,6 +376,9 @@ def match_products_for_invoice(user_id: str, invoice_id: str) -> dict[str, Any]:
             except Exception as e:
                 logger.error(f"Failed to apply match: {e}")
 
+    if matched_count:
+        invalidate_product_catalog(user_id)  # last_price changed
+
     return {
         "matched_count": matched_count,
         "total_items": len(items),
@@ -2,33 +2,194 @@
 Product Recognition Service using Gemini 3 Flash.
 
 Provides AI-powered product recognition for:
-- Single product scans (fast, MINIMAL thinking)
-- Shelf scans with multiple products (MEDIUM thinking)
-
-Prompts follow Gemini 3 best practices:
+- Single product scans (fast, MINIMAL thinking first)
+- Shelf scans with multiple products (LOW thinking first)
+
+Thinking is tiered: the cheap level runs first and the request is repeated
+at the next level only when the answer is uncertain (low confidence,
+"Unbekannt" category, "Unbekanntes Produkt"). Escalation rates per tier
+are tracked in escalation_stats().
+
+Each entry point has an async twin (arecognize_*) for use from async
+endpoints, so model calls don't block the event loop.
+
+Photos are normalized (EXIF rotation, downscale, re-encode) before upload,
+and single product results are cached by perceptual image hash (see
+recognition_cache), so repeat photos of the same bottle skip the model.
+Large shelf photos are recognized as overlapping tiles in parallel and
+merged across seams (see shelf_tiling). astream_shelf() yields shelf
+products one by one while the model is still answering.
+
+Prompts are passed as system_prompt so their static text is served from
+Gemini's context cache. They follow Gemini 3 best practices:
 - Structured with XML tags
 - Clear persona and context
 - Few-shot examples
 - Constraints at the end
 """
 
-import base64
+import asyncio
 import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import AsyncIterator, Optional
+
+import anyio
 
+from app.core.config import settings
 from app.core.gemini import (
+    agenerate_structured,
+    agenerate_structured_list,
+    astream_structured_list,
     generate_structured,
     generate_structured_list,
+    GeminiError,
+    GeminiPriority,
     ThinkingLevel,
 )
 from app.schemas.gemini_responses import ProductRecognitionResponse
+from app.services.category_cache import category_prompt_text
+from app.services.image_preprocessing import NormalizedImage, normalize_image
+from app.services.recognition_cache import (
+    cache_namespace,
+    get_recognition_cache,
+    image_fingerprint,
+)
+from app.services.shelf_tiling import (
+    ImageTile,
+    TileTiming,
+    is_same_product,
+    merge_tile_results,
+    record_shelf_scan,
+    split_into_tiles,
+)
 
 logger = logging.getLogger(__name__)
 
+# Bump when _build_single_prompt changes - invalidates cached recognitions
+SINGLE_PROMPT_VERSION = "single-v2"
+
+CacheKey = tuple[str, int]
+
+# _build_*_prompt() is the static system_prompt (context cached); the
+# request itself only carries the photo and this line
+SINGLE_SCAN_REQUEST = "Analysiere das Produktbild."
+SHELF_SCAN_REQUEST = "Analysiere das Regalfoto."
+
+UNKNOWN_CATEGORY = "Unbekannt"
+UNKNOWN_PRODUCT = "Unbekanntes Produkt"
+
+# Shelf products below this confidence are dropped
+SHELF_MIN_CONFIDENCE = 0.6
+
+
+@dataclass
+class ShelfRecognition:
+    """Shelf scan products plus per-tile timings (empty when sent whole)."""
+
+    products: list[ProductRecognitionResponse]
+    tiles: list[TileTiming] = field(default_factory=list)
+
+
+# Tile results, timing, and the error when the tile failed
+TileOutcome = tuple[
+    list[ProductRecognitionResponse] | None, TileTiming, GeminiError | None
+]
+
+
+class _EscalationStats:
+    """Per pipeline and tier: calls, and how many were escalated further."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[tuple[str, str], int] = defaultdict(int)
+        self._escalated: dict[tuple[str, str], int] = defaultdict(int)
+
+    def record(self, pipeline: str, level: ThinkingLevel, escalated: bool) -> None:
+        with self._lock:
+            self._calls[(pipeline, level.value)] += 1
+            if escalated:
+                self._escalated[(pipeline, level.value)] += 1
+
+    def snapshot(self) -> dict[str, dict[str, dict[str, float]]]:
+        with self._lock:
+            stats: dict[str, dict[str, dict[str, float]]] = defaultdict(dict)
+            for (pipeline, level), calls in sorted(self._calls.items()):
+                escalated = self._escalated[(pipeline, level)]
+                stats[pipeline][level] = {
+                    "calls": calls,
+                    "escalated": escalated,
+                    "escalation_rate": round(escalated / calls, 3) if calls else 0.0,
+                }
+            return dict(stats)
+
+
+_escalation_stats = _EscalationStats()
+
+
+def escalation_stats() -> dict[str, dict[str, dict[str, float]]]:
+    """Thinking-tier escalation counters since process start."""
+    return _escalation_stats.snapshot()
+
+
+def _thinking_tiers(value: str, default: ThinkingLevel) -> list[ThinkingLevel]:
+    """Parse "minimal,low" into ThinkingLevels, cheapest first."""
+    tiers: list[ThinkingLevel] = []
+    for name in value.split(","):
+        try:
+            level = ThinkingLevel(name.strip().lower())
+        except ValueError:
+            logger.warning(f"Ignoring unknown thinking level '{name}'")
+            continue
+        if level not in tiers:
+            tiers.append(level)
+    return tiers or [default]
+
+
+def _is_uncertain(result: ProductRecognitionResponse) -> bool:
+    return (
+        result.confidence < settings.RECOGNITION_ESCALATION_CONFIDENCE
+        or result.category == UNKNOWN_CATEGORY
+        or result.product_name == UNKNOWN_PRODUCT
+    )
+
+
+def _shelf_is_uncertain(
+    results: list[ProductRecognitionResponse], empty_is_uncertain: bool = True
+) -> bool:
+    # An empty tile is usually wall or floor, not a missed product
+    if not results:
+        return empty_is_uncertain
+    uncertain = sum(1 for result in results if _is_uncertain(result))
+    return uncertain / len(results) > settings.SHELF_ESCALATION_UNCERTAIN_SHARE
+
+
+def _pick_single(
+    previous: ProductRecognitionResponse | None,
+    candidate: ProductRecognitionResponse,
+) -> ProductRecognitionResponse:
+    # The higher tier wins, unless it is still uncertain and less confident
+    if (
+        previous is not None
+        and _is_uncertain(candidate)
+        and previous.confidence > candidate.confidence
+    ):
+        return previous
+    return candidate
+
 
 def _build_single_prompt(categories: list[str]) -> str:
     """Build optimized prompt for single product recognition."""
-    categories_text = ", ".join(categories) if categories else "Unbekannt"
+    return _render_single_prompt(category_prompt_text(categories))
 
+
+@lru_cache(maxsize=32)
+def _render_single_prompt(categories_text: str) -> str:
+    # Rendered once per category set, reused by every scan
     return f"""<role>
 Du bist ein Experte fuer Getraenke- und Lebensmittel-Erkennung in der deutschen Gastronomie.
 Du arbeitest fuer ein Inventur-System das Gastronomen hilft, ihren Warenbestand zu erfassen.
@@ -84,9 +245,19 @@ WICHTIG fuer product_name:
 </constraints>"""
 
 
-def _build_shelf_prompt(categories: list[str]) -> str:
+def _build_shelf_prompt(categories: list[str], tiled: bool = False) -> str:
     """Build optimized prompt for shelf/multi-product recognition."""
-    categories_text = ", ".join(categories) if categories else "Unbekannt"
+    return _render_shelf_prompt(category_prompt_text(categories), tiled)
+
+
+@lru_cache(maxsize=32)
+def _render_shelf_prompt(categories_text: str, tiled: bool) -> str:
+    tile_context = (
+        "\nDas Bild ist ein Ausschnitt eines groesseren Regalfotos. Produkte am Bildrand"
+        "\nkoennen abgeschnitten sein - erfasse sie, wenn Marke oder Name erkennbar ist."
+        if tiled
+        else ""
+    )
 
     return f"""<role>
 Du bist ein Experte fuer Getraenke-Erkennung mit Fokus auf Mengenerfassung.
@@ -96,7 +267,7 @@ Du analysierst Regalfotos fuer ein Gastronomie-Inventursystem.
 <context>
 Ein Gastronom fotografiert ein Regal, eine Kuehltheke oder einen Getraenkebereich.
 Das Bild enthaelt MEHRERE verschiedene Produkte, oft in unterschiedlichen Mengen.
-Ziel ist die schnelle Erfassung des gesamten sichtbaren Bestands.
+Ziel ist die schnelle Erfassung des gesamten sichtbaren Bestands.{tile_context}
 </context>
 
 <task>
@@ -135,20 +306,110 @@ WICHTIG:
 </constraints>"""
 
 
+def _finalize_recognition(data: dict) -> ProductRecognitionResponse:
+    result = ProductRecognitionResponse.model_validate(data)
+
+    # Ensure product_name is never empty
+    if not result.product_name or result.product_name.strip() == "":
+        result.product_name = UNKNOWN_PRODUCT
+        result.confidence = min(result.confidence, 0.2)
+
+    return result
+
+
+def _cached_recognition(
+    image_bytes: bytes | memoryview, categories: list[str]
+) -> tuple[ProductRecognitionResponse | None, CacheKey | None]:
+    """Look up a previous recognition of this (or a near-identical) photo."""
+    cache = get_recognition_cache()
+    if cache is None:
+        return None, None
+
+    fingerprint = image_fingerprint(image_bytes)
+    if fingerprint is None:
+        return None, None
+
+    cache_key = (cache_namespace(SINGLE_PROMPT_VERSION, categories), fingerprint)
+    cached = cache.get(*cache_key)
+    if cached is None:
+        return None, cache_key
+
+    logger.info("Recognition cache hit, skipping Gemini")
+    return ProductRecognitionResponse.model_validate(cached), cache_key
+
+
+def _prepare_single(
+    image_bytes: bytes | memoryview,
+    mime_type: str,
+    categories: list[str],
+    preprocessed: bool = False,
+) -> tuple[NormalizedImage, ProductRecognitionResponse | None, CacheKey | None]:
+    """Normalize the photo (unless already done) and check the cache."""
+    if preprocessed:
+        image = NormalizedImage(
+            data=image_bytes, mime_type=mime_type, original_size=len(image_bytes)
+        )
+    else:
+        image = normalize_image(image_bytes, mime_type)
+    cached, cache_key = _cached_recognition(image.data, categories)
+    return image, cached, cache_key
+
+
+def _prepare_shelf(
+    image_bytes: bytes | memoryview, mime_type: str
+) -> tuple[NormalizedImage, list[ImageTile]]:
+    # Shelf photos keep more pixels - labels of many products are small
+    image = normalize_image(
+        image_bytes, mime_type, max_edge=settings.IMAGE_SHELF_MAX_EDGE
+    )
+    return image, split_into_tiles(image)
+
+
+def _store_recognition(
+    cache_key: CacheKey | None, result: ProductRecognitionResponse
+) -> None:
+    # Don't cache shaky answers - a retake should get a fresh model call
+    if cache_key is None:
+        return
+    if result.confidence < settings.RECOGNITION_CACHE_MIN_CONFIDENCE:
+        return
+    cache = get_recognition_cache()
+    if cache is not None:
+        cache.put(*cache_key, result.model_dump())
+
+
+def _filter_shelf_results(
+    results: list[ProductRecognitionResponse],
+) -> list[ProductRecognitionResponse]:
+    # Filter out low-confidence results (< 0.6)
+    filtered_results = [r for r in results if r.confidence >= SHELF_MIN_CONFIDENCE]
+    logger.info(
+        f"Recognized {len(results)} products, filtered to {len(filtered_results)} "
+        f"with confidence >= {SHELF_MIN_CONFIDENCE}"
+    )
+    return filtered_results
+
+
 def recognize_product(
-    image_base64: str,
+    image_bytes: bytes | memoryview,
     categories: list[str],
     mime_type: str = "image/jpeg",
+    tenant_id: str | None = None,
+    preprocessed: bool = False,
 ) -> ProductRecognitionResponse:
     """
     Recognize a single product from an image.
 
-    Uses MINIMAL thinking for fast response (~1-2s).
+    Uses MINIMAL thinking for fast response (~1-2s) and escalates through
+    RECOGNITION_THINKING_TIERS only for uncertain answers. Repeat photos
+    are served from the recognition cache.
 
     Args:
-        image_base64: Base64 encoded image
+        image_bytes: Raw image data (bytes or memoryview)
         categories: List of valid categories
         mime_type: Image MIME type
+        tenant_id: Owner user id (Gemini fair-share scheduling)
+        preprocessed: Image already went through normalize_image()
 
     Returns:
         ProductRecognitionResponse with recognized product data
@@ -158,81 +419,525 @@ def recognize_product(
     """
     logger.info(f"Recognizing single product, categories={len(categories)}")
 
-    image_bytes = base64.b64decode(image_base64)
+    image, cached, cache_key = _prepare_single(
+        image_bytes, mime_type, categories, preprocessed
+    )
+    if cached is not None:
+        return cached
+
     prompt = _build_single_prompt(categories)
+    tiers = _thinking_tiers(
+        settings.RECOGNITION_THINKING_TIERS, ThinkingLevel.MINIMAL
+    )
 
-    # Use structured output with MINIMAL thinking for speed
-    data = generate_structured(
-        prompt=prompt,
-        response_schema=ProductRecognitionResponse,
-        image_bytes=image_bytes,
-        mime_type=mime_type,
-        thinking_level=ThinkingLevel.MINIMAL,
+    result: ProductRecognitionResponse | None = None
+    for index, level in enumerate(tiers):
+        try:
+            data = generate_structured(
+                prompt=SINGLE_SCAN_REQUEST,
+                system_prompt=prompt,
+                response_schema=ProductRecognitionResponse,
+                image_bytes=image.data,
+                mime_type=image.mime_type,
+                thinking_level=level,
+                priority=GeminiPriority.INTERACTIVE_SCAN,
+                tenant_id=tenant_id,
+                hedge=True,
+            )
+        except GeminiError as e:
+            if result is None:
+                raise
+            logger.warning(f"Escalation to {level.value} failed, keeping answer: {e}")
+            break
+
+        candidate = _finalize_recognition(data)
+        result = _pick_single(result, candidate)
+        escalate = index + 1 < len(tiers) and _is_uncertain(candidate)
+        _escalation_stats.record("single", level, escalate)
+        if not escalate:
+            break
+        logger.info(f"Uncertain recognition at {level.value}, escalating")
+
+    assert result is not None
+    logger.info(
+        f"Product recognized: {result.brand} {result.product_name}, "
+        f"confidence={result.confidence}"
     )
+    _store_recognition(cache_key, result)
+    return result
 
-    result = ProductRecognitionResponse.model_validate(data)
 
-    # Ensure product_name is never empty
-    if not result.product_name or result.product_name.strip() == "":
-        result.product_name = "Unbekanntes Produkt"
-        result.confidence = min(result.confidence, 0.2)
+async def arecognize_product(
+    image_bytes: bytes | memoryview,
+    categories: list[str],
+    mime_type: str = "image/jpeg",
+    tenant_id: str | None = None,
+    preprocessed: bool = False,
+) -> ProductRecognitionResponse:
+    """Async variant of recognize_product()."""
+    logger.info(f"Recognizing single product, categories={len(categories)}")
+
+    # Image decoding/re-encoding is CPU work, keep it off the event loop
+    image, cached, cache_key = await anyio.to_thread.run_sync(
+        _prepare_single, image_bytes, mime_type, categories, preprocessed
+    )
+    if cached is not None:
+        return cached
+
+    prompt = _build_single_prompt(categories)
+    tiers = _thinking_tiers(
+        settings.RECOGNITION_THINKING_TIERS, ThinkingLevel.MINIMAL
+    )
 
+    result: ProductRecognitionResponse | None = None
+    for index, level in enumerate(tiers):
+        try:
+            data = await agenerate_structured(
+                prompt=SINGLE_SCAN_REQUEST,
+                system_prompt=prompt,
+                response_schema=ProductRecognitionResponse,
+                image_bytes=image.data,
+                mime_type=image.mime_type,
+                thinking_level=level,
+                priority=GeminiPriority.INTERACTIVE_SCAN,
+                tenant_id=tenant_id,
+                hedge=True,
+            )
+        except GeminiError as e:
+            if result is None:
+                raise
+            logger.warning(f"Escalation to {level.value} failed, keeping answer: {e}")
+            break
+
+        candidate = _finalize_recognition(data)
+        result = _pick_single(result, candidate)
+        escalate = index + 1 < len(tiers) and _is_uncertain(candidate)
+        _escalation_stats.record("single", level, escalate)
+        if not escalate:
+            break
+        logger.info(f"Uncertain recognition at {level.value}, escalating")
+
+    assert result is not None
     logger.info(
         f"Product recognized: {result.brand} {result.product_name}, "
         f"confidence={result.confidence}"
     )
+    await anyio.to_thread.run_sync(_store_recognition, cache_key, result)
     return result
 
 
-def recognize_multiple_products(
-    image_base64: str,
+def _recognize_shelf_image(
+    image_data: bytes | memoryview,
+    mime_type: str,
+    prompt: str,
+    tenant_id: str | None,
+    tiled: bool = False,
+) -> list[ProductRecognitionResponse]:
+    """Run the shelf thinking tiers on one photo or tile (unfiltered)."""
+    tiers = _thinking_tiers(settings.SHELF_THINKING_TIERS, ThinkingLevel.MEDIUM)
+
+    results: list[ProductRecognitionResponse] | None = None
+    for index, level in enumerate(tiers):
+        try:
+            items = generate_structured_list(
+                prompt=SHELF_SCAN_REQUEST,
+                system_prompt=prompt,
+                item_schema=ProductRecognitionResponse,
+                image_bytes=image_data,
+                mime_type=mime_type,
+                thinking_level=level,
+                priority=GeminiPriority.SHELF_SCAN,
+                tenant_id=tenant_id,
+            )
+        except GeminiError as e:
+            if results is None:
+                raise
+            logger.warning(f"Escalation to {level.value} failed, keeping answer: {e}")
+            break
+
+        candidates = [_finalize_recognition(item) for item in items]
+        # An empty escalated answer never replaces products already found
+        if candidates or results is None:
+            results = candidates
+        escalate = index + 1 < len(tiers) and _shelf_is_uncertain(
+            candidates, empty_is_uncertain=not tiled
+        )
+        _escalation_stats.record("shelf", level, escalate)
+        if not escalate:
+            break
+        logger.info(f"Uncertain shelf scan at {level.value}, escalating")
+
+    return results or []
+
+
+async def _arecognize_shelf_image(
+    image_data: bytes | memoryview,
+    mime_type: str,
+    prompt: str,
+    tenant_id: str | None,
+    tiled: bool = False,
+) -> list[ProductRecognitionResponse]:
+    """Async variant of _recognize_shelf_image()."""
+    tiers = _thinking_tiers(settings.SHELF_THINKING_TIERS, ThinkingLevel.MEDIUM)
+
+    results: list[ProductRecognitionResponse] | None = None
+    for index, level in enumerate(tiers):
+        try:
+            items = await agenerate_structured_list(
+                prompt=SHELF_SCAN_REQUEST,
+                system_prompt=prompt,
+                item_schema=ProductRecognitionResponse,
+                image_bytes=image_data,
+                mime_type=mime_type,
+                thinking_level=level,
+                priority=GeminiPriority.SHELF_SCAN,
+                tenant_id=tenant_id,
+            )
+        except GeminiError as e:
+            if results is None:
+                raise
+            logger.warning(f"Escalation to {level.value} failed, keeping answer: {e}")
+            break
+
+        candidates = [_finalize_recognition(item) for item in items]
+        if candidates or results is None:
+            results = candidates
+        escalate = index + 1 < len(tiers) and _shelf_is_uncertain(
+            candidates, empty_is_uncertain=not tiled
+        )
+        _escalation_stats.record("shelf", level, escalate)
+        if not escalate:
+            break
+        logger.info(f"Uncertain shelf scan at {level.value}, escalating")
+
+    return results or []
+
+
+def _tile_timing(
+    tile: ImageTile, started: float, products: int, error: GeminiError | None = None
+) -> TileTiming:
+    timing = TileTiming(
+        index=tile.index,
+        box=tile.box,
+        latency_ms=round((time.perf_counter() - started) * 1000, 1),
+        products=products,
+        error=str(error) if error else None,
+    )
+    logger.info(
+        f"Shelf tile {tile.index} {tile.box}: {timing.products} products "
+        f"in {timing.latency_ms} ms" + (f", failed: {error}" if error else "")
+    )
+    return timing
+
+
+def _recognize_tile(
+    tile: ImageTile, prompt: str, tenant_id: str | None
+) -> TileOutcome:
+    started = time.perf_counter()
+    try:
+        results = _recognize_shelf_image(
+            tile.data, tile.mime_type, prompt, tenant_id, tiled=True
+        )
+    except GeminiError as e:
+        return None, _tile_timing(tile, started, 0, e), e
+    return results, _tile_timing(tile, started, len(results)), None
+
+
+async def _arecognize_tile(
+    tile: ImageTile, prompt: str, tenant_id: str | None
+) -> TileOutcome:
+    started = time.perf_counter()
+    try:
+        results = await _arecognize_shelf_image(
+            tile.data, tile.mime_type, prompt, tenant_id, tiled=True
+        )
+    except GeminiError as e:
+        return None, _tile_timing(tile, started, 0, e), e
+    return results, _tile_timing(tile, started, len(results)), None
+
+
+def _merge_tiles(outcomes: list[TileOutcome]) -> ShelfRecognition:
+    """Merge tile results; fails only when every tile failed."""
+    timings = [timing for _, timing, _ in outcomes]
+    succeeded = [results for results, _, _ in outcomes if results is not None]
+    if not succeeded:
+        record_shelf_scan(timings)
+        error = next(error for _, _, error in outcomes if error is not None)
+        raise error
+
+    products, duplicates = merge_tile_results(succeeded)
+    record_shelf_scan(timings, duplicates)
+    logger.info(
+        f"Merged {len(succeeded)}/{len(outcomes)} tiles into {len(products)} "
+        f"products ({duplicates} seam duplicates)"
+    )
+    return ShelfRecognition(products=_filter_shelf_results(products), tiles=timings)
+
+
+_tile_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_tile_executor() -> ThreadPoolExecutor:
+    global _tile_executor
+    if _tile_executor is None:
+        _tile_executor = ThreadPoolExecutor(
+            max_workers=max(2, settings.SHELF_TILE_MAX_TILES),
+            thread_name_prefix="shelf-tile",
+        )
+    return _tile_executor
+
+
+def recognize_shelf(
+    image_bytes: bytes | memoryview,
     categories: list[str],
     mime_type: str = "image/jpeg",
-) -> list[ProductRecognitionResponse]:
+    tenant_id: str | None = None,
+) -> ShelfRecognition:
     """
-    Recognize multiple products from an image (shelf scan).
+    Recognize multiple products from a shelf photo.
 
-    Uses MEDIUM thinking for accurate multi-product recognition.
+    Large photos are split into overlapping tiles that are recognized
+    concurrently and merged across seams; smaller ones are sent whole.
+    Each image starts at the first SHELF_THINKING_TIERS level (LOW) and
+    repeats at the next one (MEDIUM) when it comes back mostly uncertain.
 
     Args:
-        image_base64: Base64 encoded image
+        image_bytes: Raw image data (bytes or memoryview)
         categories: List of valid categories
         mime_type: Image MIME type
+        tenant_id: Owner user id (Gemini fair-share scheduling)
 
     Returns:
-        List of ProductRecognitionResponse for each recognized product
+        ShelfRecognition with the products and per-tile timings
 
     Raises:
-        GeminiError: When AI processing fails
+        GeminiError: When AI processing fails (for every tile)
     """
     logger.info(
         f"Recognizing multiple products (shelf scan), categories={len(categories)}"
     )
 
-    image_bytes = base64.b64decode(image_base64)
-    prompt = _build_shelf_prompt(categories)
+    image, tiles = _prepare_shelf(image_bytes, mime_type)
+    if not tiles:
+        results = _recognize_shelf_image(
+            image.data, image.mime_type, _build_shelf_prompt(categories), tenant_id
+        )
+        record_shelf_scan([])
+        return ShelfRecognition(products=_filter_shelf_results(results))
+
+    prompt = _build_shelf_prompt(categories, tiled=True)
+    outcomes = list(
+        _get_tile_executor().map(
+            lambda tile: _recognize_tile(tile, prompt, tenant_id), tiles
+        )
+    )
+    return _merge_tiles(outcomes)
+
+
+async def arecognize_shelf(
+    image_bytes: bytes | memoryview,
+    categories: list[str],
+    mime_type: str = "image/jpeg",
+    tenant_id: str | None = None,
+) -> ShelfRecognition:
+    """Async variant of recognize_shelf()."""
+    logger.info(
+        f"Recognizing multiple products (shelf scan), categories={len(categories)}"
+    )
 
-    # Use structured list output with MEDIUM thinking
-    items = generate_structured_list(
-        prompt=prompt,
-        item_schema=ProductRecognitionResponse,
-        image_bytes=image_bytes,
-        mime_type=mime_type,
-        thinking_level=ThinkingLevel.MEDIUM,
+    # Decoding and cutting tiles is CPU work, keep it off the event loop
+    image, tiles = await anyio.to_thread.run_sync(
+        _prepare_shelf, image_bytes, mime_type
+    )
+    if not tiles:
+        results = await _arecognize_shelf_image(
+            image.data, image.mime_type, _build_shelf_prompt(categories), tenant_id
+        )
+        record_shelf_scan([])
+        return ShelfRecognition(products=_filter_shelf_results(results))
+
+    prompt = _build_shelf_prompt(categories, tiled=True)
+    outcomes = await asyncio.gather(
+        *(_arecognize_tile(tile, prompt, tenant_id) for tile in tiles)
     )
+    return _merge_tiles(list(outcomes))
 
-    results = []
-    for item in items:
-        result = ProductRecognitionResponse.model_validate(item)
-        # Ensure product_name is never empty
-        if not result.product_name or result.product_name.strip() == "":
-            result.product_name = "Unbekanntes Produkt"
-            result.confidence = min(result.confidence, 0.2)
-        results.append(result)
 
-    # Filter out low-confidence results (< 0.6)
-    filtered_results = [r for r in results if r.confidence >= 0.6]
+def recognize_multiple_products(
+    image_bytes: bytes | memoryview,
+    categories: list[str],
+    mime_type: str = "image/jpeg",
+    tenant_id: str | None = None,
+) -> list[ProductRecognitionResponse]:
+    """
+    Recognize multiple products from an image (shelf scan).
+
+    See recognize_shelf() for tiling and thinking escalation.
+
+    Returns:
+        List of ProductRecognitionResponse for each recognized product
+
+    Raises:
+        GeminiError: When AI processing fails
+    """
+    return recognize_shelf(image_bytes, categories, mime_type, tenant_id).products
+
+
+async def arecognize_multiple_products(
+    image_bytes: bytes | memoryview,
+    categories: list[str],
+    mime_type: str = "image/jpeg",
+    tenant_id: str | None = None,
+) -> list[ProductRecognitionResponse]:
+    """Async variant of recognize_multiple_products()."""
+    shelf = await arecognize_shelf(image_bytes, categories, mime_type, tenant_id)
+    return shelf.products
+
+
+class _SentProducts:
+    """Products a shelf stream already yielded, to skip repeats."""
+
+    def __init__(self):
+        self._sent: list[tuple[int, ProductRecognitionResponse]] = []
+        self.duplicates = 0
+
+    def accept(self, result: ProductRecognitionResponse, source: int) -> bool:
+        """
+        Whether to yield a product from a tile or thinking tier (source).
+
+        Products of the same source are never duplicates of each other -
+        the model lists each product once per image.
+        """
+        if result.confidence < SHELF_MIN_CONFIDENCE:
+            return False
+        for other_source, other in self._sent:
+            if other_source != source and is_same_product(other, result):
+                self.duplicates += 1
+                return False
+        self._sent.append((source, result))
+        return True
+
+    def __len__(self) -> int:
+        return len(self._sent)
+
+
+async def _astream_tiles(
+    tiles: list[ImageTile],
+    prompt: str,
+    tenant_id: str | None,
+    sent: _SentProducts,
+    tile_timings: list[TileTiming],
+) -> AsyncIterator[ProductRecognitionResponse]:
+    tasks = [
+        asyncio.create_task(_arecognize_tile(tile, prompt, tenant_id))
+        for tile in tiles
+    ]
+    errors: list[GeminiError] = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            results, timing, error = await next_done
+            tile_timings.append(timing)
+            if error is not None:
+                errors.append(error)
+                continue
+            for result in results or []:
+                if sent.accept(result, timing.index):
+                    yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    record_shelf_scan(tile_timings, sent.duplicates)
+    if len(errors) == len(tiles):
+        raise errors[0]
+
+
+async def _astream_whole(
+    image: NormalizedImage,
+    prompt: str,
+    tenant_id: str | None,
+    sent: _SentProducts,
+) -> AsyncIterator[ProductRecognitionResponse]:
+    tiers = _thinking_tiers(settings.SHELF_THINKING_TIERS, ThinkingLevel.MEDIUM)
+
+    for index, level in enumerate(tiers):
+        candidates: list[ProductRecognitionResponse] = []
+        try:
+            async for item in astream_structured_list(
+                prompt=SHELF_SCAN_REQUEST,
+                system_prompt=prompt,
+                item_schema=ProductRecognitionResponse,
+                image_bytes=image.data,
+                mime_type=image.mime_type,
+                thinking_level=level,
+                priority=GeminiPriority.SHELF_SCAN,
+                tenant_id=tenant_id,
+            ):
+                result = _finalize_recognition(item)
+                candidates.append(result)
+                if sent.accept(result, index):
+                    yield result
+        except GeminiError as e:
+            if index == 0 and not len(sent):
+                raise
+            logger.warning(f"Shelf stream at {level.value} failed, keeping products: {e}")
+            break
+
+        # Escalation only adds products the cheaper tier missed
+        escalate = index + 1 < len(tiers) and _shelf_is_uncertain(candidates)
+        _escalation_stats.record("shelf", level, escalate)
+        if not escalate:
+            break
+        logger.info(f"Uncertain shelf scan at {level.value}, escalating")
+
+    record_shelf_scan([])
+
+
+async def astream_shelf(
+    image_bytes: bytes | memoryview,
+    categories: list[str],
+    mime_type: str = "image/jpeg",
+    tenant_id: str | None = None,
+    tile_timings: list[TileTiming] | None = None,
+) -> AsyncIterator[ProductRecognitionResponse]:
+    """
+    Streaming variant of arecognize_shelf(): yield products as they come.
+
+    A whole photo streams the model's output, so the first product arrives
+    while the rest is still being written; tiled photos yield each tile's
+    products as soon as the tile finishes. Products already yielded are
+    never taken back - escalation and later tiles only add new ones.
+
+    Args:
+        image_bytes: Raw image data (bytes or memoryview)
+        categories: List of valid categories
+        mime_type: Image MIME type
+        tenant_id: Owner user id (Gemini fair-share scheduling)
+        tile_timings: Filled with per-tile timings, in completion order
+
+    Raises:
+        GeminiError: When AI processing fails before any product was found
+    """
     logger.info(
-        f"Recognized {len(results)} products, filtered to {len(filtered_results)} with confidence >= 0.6"
+        f"Streaming multiple products (shelf scan), categories={len(categories)}"
     )
-    return filtered_results
+
+    image, tiles = await anyio.to_thread.run_sync(
+        _prepare_shelf, image_bytes, mime_type
+    )
+    sent = _SentProducts()
+    if tiles:
+        stream = _astream_tiles(
+            tiles,
+            _build_shelf_prompt(categories, tiled=True),
+            tenant_id,
+            sent,
+            tile_timings if tile_timings is not None else [],
+        )
+    else:
+        stream = _astream_whole(
+            image, _build_shelf_prompt(categories), tenant_id, sent
+        )
+
+    async for result in stream:
+        yield result
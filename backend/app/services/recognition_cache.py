@@ -0,0 +1,330 @@
+"""
+Recognition Cache for product scans.
+
+Staff photograph the same bottle many times per inventory. Results are
+keyed by a perceptual image hash (dHash) plus prompt version plus the
+category set, so repeat and near-duplicate photos are answered without
+calling Gemini.
+
+Features:
+- 64-bit difference hash, tolerant to recompression / small exposure changes
+- Near-duplicate lookup by Hamming distance
+- LRU eviction + TTL
+- Pluggable backend: in-memory (default) or on-disk (SQLite)
+- Hit/miss counters
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8  # 8x8 comparisons -> 64-bit hash
+
+
+def image_fingerprint(image_bytes: bytes | memoryview) -> int | None:
+    """
+    Compute a 64-bit difference hash (dHash) of an image.
+
+    Returns None when the image cannot be decoded.
+    """
+    try:
+        from PIL import Image
+    except Exception as exc:
+        logger.warning("Pillow not available for image fingerprinting: %s", exc)
+        return None
+
+    try:
+        with Image.open(BytesIO(image_bytes)) as image:
+            # JPEG: let the decoder downscale while decoding (much faster)
+            image.draft("L", (HASH_SIZE * 16, HASH_SIZE * 16))
+            small = image.convert("L").resize(
+                (HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS
+            )
+    except Exception as exc:
+        logger.debug("Could not fingerprint image: %s", exc)
+        return None
+
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def cache_namespace(prompt_version: str, categories: list[str]) -> str:
+    """Namespace for a prompt version + category set (order-insensitive)."""
+    digest = hashlib.sha1(
+        "\n".join(sorted(categories)).encode("utf-8")
+    ).hexdigest()[:12]
+    return f"{prompt_version}:{digest}"
+
+
+class RecognitionCacheBackend(ABC):
+    """Storage interface for cached recognition payloads."""
+
+    @abstractmethod
+    def get(
+        self, namespace: str, fingerprint: int, max_distance: int
+    ) -> tuple[dict[str, Any], int] | None:
+        """Return (payload, distance) of the closest live entry, or None."""
+
+    @abstractmethod
+    def set(self, namespace: str, fingerprint: int, payload: dict[str, Any]) -> None:
+        """Store a payload under this fingerprint (replacing an older one)."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drop all entries."""
+
+    @abstractmethod
+    def size(self) -> int:
+        """Number of stored entries."""
+
+
+class MemoryCacheBackend(RecognitionCacheBackend):
+    """In-process LRU with TTL. Per worker process, lost on restart."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, int], tuple[dict[str, Any], float]] = (
+            OrderedDict()
+        )
+
+    def get(
+        self, namespace: str, fingerprint: int, max_distance: int
+    ) -> tuple[dict[str, Any], int] | None:
+        now = time.time()
+        with self._lock:
+            key = (namespace, fingerprint)
+            best_key: tuple[str, int] | None = None
+            best_distance = max_distance + 1
+
+            if key in self._entries:
+                best_key, best_distance = key, 0
+            elif max_distance > 0:
+                for entry_key in self._entries:
+                    if entry_key[0] != namespace:
+                        continue
+                    distance = hamming_distance(entry_key[1], fingerprint)
+                    if distance < best_distance:
+                        best_key, best_distance = entry_key, distance
+
+            if best_key is None:
+                return None
+
+            payload, stored_at = self._entries[best_key]
+            if now - stored_at > self.ttl_seconds:
+                del self._entries[best_key]
+                return None
+
+            self._entries.move_to_end(best_key)
+            return payload, best_distance
+
+    def set(self, namespace: str, fingerprint: int, payload: dict[str, Any]) -> None:
+        with self._lock:
+            key = (namespace, fingerprint)
+            self._entries[key] = (payload, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend(RecognitionCacheBackend):
+    """On-disk cache (SQLite), shared by worker processes on the same host."""
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS recognition_cache (
+                    namespace TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, fingerprint)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_recognition_cache_accessed "
+                "ON recognition_cache (accessed_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(
+        self, namespace: str, fingerprint: int, max_distance: int
+    ) -> tuple[dict[str, Any], int] | None:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM recognition_cache WHERE stored_at < ?",
+                (now - self.ttl_seconds,),
+            )
+            if max_distance > 0:
+                rows = conn.execute(
+                    "SELECT fingerprint, payload FROM recognition_cache "
+                    "WHERE namespace = ?",
+                    (namespace,),
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT fingerprint, payload FROM recognition_cache "
+                    "WHERE namespace = ? AND fingerprint = ?",
+                    (namespace, f"{fingerprint:016x}"),
+                ).fetchall()
+
+            best: tuple[str, str] | None = None
+            best_distance = max_distance + 1
+            for stored_fingerprint, payload in rows:
+                distance = hamming_distance(int(stored_fingerprint, 16), fingerprint)
+                if distance < best_distance:
+                    best, best_distance = (stored_fingerprint, payload), distance
+
+            if best is None:
+                return None
+
+            conn.execute(
+                "UPDATE recognition_cache SET accessed_at = ? "
+                "WHERE namespace = ? AND fingerprint = ?",
+                (now, namespace, best[0]),
+            )
+            return json.loads(best[1]), best_distance
+
+    def set(self, namespace: str, fingerprint: int, payload: dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO recognition_cache "
+                "(namespace, fingerprint, payload, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (namespace, f"{fingerprint:016x}", json.dumps(payload), now, now),
+            )
+            conn.execute(
+                """
+                DELETE FROM recognition_cache WHERE rowid IN (
+                    SELECT rowid FROM recognition_cache
+                    ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM recognition_cache")
+
+    def size(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM recognition_cache").fetchone()[0]
+
+
+class RecognitionCache:
+    """Recognition result cache with hit/miss accounting."""
+
+    def __init__(self, backend: RecognitionCacheBackend, max_distance: int):
+        self.backend = backend
+        self.max_distance = max(0, max_distance)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def get(self, namespace: str, fingerprint: int) -> dict[str, Any] | None:
+        try:
+            found = self.backend.get(namespace, fingerprint, self.max_distance)
+        except Exception as exc:
+            logger.warning("Recognition cache lookup failed: %s", exc)
+            found = None
+
+        with self._lock:
+            if found is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if found[1] > 0:
+                self.near_hits += 1
+        return found[0]
+
+    def put(self, namespace: str, fingerprint: int, payload: dict[str, Any]) -> None:
+        try:
+            self.backend.set(namespace, fingerprint, payload)
+        except Exception as exc:
+            logger.warning("Recognition cache store failed: %s", exc)
+            return
+        with self._lock:
+            self.stores += 1
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": self.backend.size(),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+# Singleton instance
+_recognition_cache: Optional[RecognitionCache] = None
+
+
+def get_recognition_cache() -> RecognitionCache | None:
+    """Get the recognition cache singleton (None when disabled)."""
+    global _recognition_cache
+    if settings.RECOGNITION_CACHE_BACKEND == "off":
+        return None
+    if _recognition_cache is None:
+        if settings.RECOGNITION_CACHE_BACKEND == "disk":
+            backend: RecognitionCacheBackend = SQLiteCacheBackend(
+                settings.RECOGNITION_CACHE_PATH,
+                max_entries=settings.RECOGNITION_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.RECOGNITION_CACHE_TTL_SECONDS,
+            )
+        else:
+            backend = MemoryCacheBackend(
+                max_entries=settings.RECOGNITION_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.RECOGNITION_CACHE_TTL_SECONDS,
+            )
+        _recognition_cache = RecognitionCache(
+            backend, max_distance=settings.RECOGNITION_CACHE_MAX_DISTANCE
+        )
+    return _recognition_cache
@@ -0,0 +1,369 @@
+"""
+Recognition memory: scans the user already confirmed.
+
+Every inventory re-scans the same products at the same location. When a
+scan result is added to a session, the product the user confirmed is
+remembered for that photo and for the model's reading of it, so later
+scans resolve straight to the product:
+- Image keys: dHash of the normalized photo, exact matches only - skips
+  the model call entirely (reported with reduced confidence)
+- Label keys: normalized (brand, name, size) of the recognition - skips
+  fuzzy product matching
+
+Scan endpoints hand out a scan_id per result; add_session_item passes it
+back and the confirmation is learned automatically (latest confirmation
+wins). The scan_id is signed with SECRET_KEY and carries the observation
+itself, so any worker process can confirm it. Entries are kept per tenant
+in memory (reloaded after RECOGNITION_MEMORY_TTL_SECONDS, other workers
+learn too) and persisted to the recognition_memory table when
+RECOGNITION_MEMORY_PERSIST is set.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from app.core.config import settings
+from app.core.supabase import get_supabase
+from app.schemas.gemini_responses import ProductRecognitionResponse
+from app.services.product_catalog import normalize_text
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+MAX_TENANTS = 500
+
+IMAGE_KEY = "image"
+LABEL_KEY = "label"
+
+UNKNOWN_NAMES = {"", "unbekanntes produkt"}
+
+
+def label_key(recognition: ProductRecognitionResponse) -> str | None:
+    """Normalized (brand, name, size) of a recognition, None if unknown."""
+    name = normalize_text(recognition.product_name)
+    if name in UNKNOWN_NAMES:
+        return None
+    brand = normalize_text(recognition.brand)
+    size = normalize_text(recognition.size_display) or str(recognition.size_ml or "")
+    return f"{brand}|{name}|{size}"
+
+
+def _fingerprint_key(fingerprint: int) -> str:
+    return f"{fingerprint:016x}"
+
+
+@dataclass(frozen=True)
+class ScanObservation:
+    """What a scan saw, waiting for the user's confirmation."""
+
+    tenant_id: str
+    fingerprint: int | None
+    label: str | None
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _signature(payload: str) -> str:
+    digest = hmac.new(
+        settings.SECRET_KEY.encode("utf-8"), payload.encode("ascii"), hashlib.sha256
+    ).digest()
+    return _b64encode(digest)
+
+
+def encode_scan_id(observation: ScanObservation, ttl_seconds: float) -> str:
+    """Signed, self-contained scan_id (no server-side state)."""
+    payload = _b64encode(
+        json.dumps(
+            {
+                "t": observation.tenant_id,
+                "f": (
+                    _fingerprint_key(observation.fingerprint)
+                    if observation.fingerprint is not None
+                    else None
+                ),
+                "l": observation.label,
+                "e": int(time.time() + ttl_seconds),
+            },
+            separators=(",", ":"),
+        ).encode("utf-8")
+    )
+    return f"{payload}.{_signature(payload)}"
+
+
+def decode_scan_id(scan_id: str) -> ScanObservation | None:
+    """Observation of a valid, unexpired scan_id; None otherwise."""
+    payload, _, signature = scan_id.partition(".")
+    if not payload or not hmac.compare_digest(signature, _signature(payload)):
+        return None
+    try:
+        data = json.loads(_b64decode(payload))
+        if data["e"] < time.time():
+            return None
+        fingerprint = int(data["f"], 16) if data.get("f") else None
+        return ScanObservation(
+            tenant_id=data["t"], fingerprint=fingerprint, label=data.get("l")
+        )
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class _MemoryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.image_hits = 0
+        self.label_hits = 0
+        self.misses = 0
+        self.confirmations = 0
+        self.expired = 0
+
+    def record(self, field_name: str) -> None:
+        with self._lock:
+            setattr(self, field_name, getattr(self, field_name) + 1)
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "image_hits": self.image_hits,
+                "label_hits": self.label_hits,
+                "misses": self.misses,
+                "confirmations": self.confirmations,
+                "expired_scan_ids": self.expired,
+            }
+
+
+class TenantMemory:
+    """Confirmed image/label keys of one tenant (insertion order = age)."""
+
+    def __init__(self, max_entries: int):
+        self._max_entries = max_entries
+        self.images: OrderedDict[int, str] = OrderedDict()
+        self.labels: OrderedDict[str, str] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.images) + len(self.labels)
+
+    def add(self, kind: str, key: str, product_id: str) -> None:
+        if kind == IMAGE_KEY:
+            fingerprint = int(key, 16)
+            self.images.pop(fingerprint, None)
+            self.images[fingerprint] = product_id
+            while len(self.images) > self._max_entries:
+                self.images.popitem(last=False)
+        else:
+            self.labels.pop(key, None)
+            self.labels[key] = product_id
+            while len(self.labels) > self._max_entries:
+                self.labels.popitem(last=False)
+
+    def forget_product(self, product_id: str) -> None:
+        for mapping in (self.images, self.labels):
+            for key in [k for k, pid in mapping.items() if pid == product_id]:
+                del mapping[key]
+
+
+def _load_tenant_rows(supabase, tenant_id: str) -> list[dict[str, Any]]:
+    rows: list[dict[str, Any]] = []
+    start = 0
+    while True:
+        page = (
+            supabase.table("recognition_memory")
+            .select("kind, key, product_id")
+            .eq("user_id", tenant_id)
+            .order("confirmed_at")
+            .range(start, start + PAGE_SIZE - 1)
+            .execute()
+        )
+        batch = [row for row in page.data or [] if isinstance(row, dict)]
+        rows.extend(batch)
+        if len(batch) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+class RecognitionMemory:
+    """Per-tenant memories plus the scans awaiting confirmation."""
+
+    def __init__(
+        self,
+        persist: bool,
+        max_entries: int,
+        ttl_seconds: float,
+        pending_ttl_seconds: float,
+    ):
+        self._persist = persist
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._pending_ttl_seconds = pending_ttl_seconds
+        self._lock = threading.Lock()
+        self._tenants: OrderedDict[str, tuple[float, TenantMemory]] = OrderedDict()
+        self.stats = _MemoryStats()
+
+    def _tenant(self, tenant_id: str, supabase=None) -> TenantMemory:
+        with self._lock:
+            entry = self._tenants.get(tenant_id)
+            if entry is not None:
+                loaded_at, memory = entry
+                # Without persistence there is nothing to reload from
+                if (
+                    not self._persist
+                    or time.monotonic() - loaded_at <= self._ttl_seconds
+                ):
+                    self._tenants.move_to_end(tenant_id)
+                    return memory
+
+        memory = TenantMemory(self._max_entries)
+        if self._persist:
+            try:
+                for row in _load_tenant_rows(supabase or get_supabase(), tenant_id):
+                    memory.add(row["kind"], row["key"], row["product_id"])
+            except Exception as e:
+                # Memory is an optimization - scans work without it
+                logger.warning(f"Recognition memory load failed: {e}")
+
+        with self._lock:
+            # Another request may have reloaded it meanwhile - keep the newer
+            entry = self._tenants.get(tenant_id)
+            if entry is None or time.monotonic() - entry[0] > self._ttl_seconds:
+                entry = (time.monotonic(), memory)
+                self._tenants[tenant_id] = entry
+            self._tenants.move_to_end(tenant_id)
+            while len(self._tenants) > MAX_TENANTS:
+                self._tenants.popitem(last=False)
+            return entry[1]
+
+    def find_by_image(
+        self, tenant_id: str, fingerprint: int | None, supabase=None
+    ) -> str | None:
+        """Product confirmed for this exact photo hash."""
+        if fingerprint is None:
+            return None
+        memory = self._tenant(tenant_id, supabase)
+        with self._lock:
+            product_id = memory.images.get(fingerprint)
+        self.stats.record("image_hits" if product_id else "misses")
+        return product_id
+
+    def find_by_label(
+        self, tenant_id: str, recognition: ProductRecognitionResponse, supabase=None
+    ) -> str | None:
+        """Product confirmed for this brand/name/size reading."""
+        key = label_key(recognition)
+        if key is None:
+            return None
+        memory = self._tenant(tenant_id, supabase)
+        with self._lock:
+            product_id = memory.labels.get(key)
+        self.stats.record("label_hits" if product_id else "misses")
+        return product_id
+
+    def forget_product(self, tenant_id: str, product_id: str) -> None:
+        """Drop entries pointing at a product that no longer exists."""
+        with self._lock:
+            entry = self._tenants.get(tenant_id)
+            if entry is not None:
+                entry[1].forget_product(product_id)
+
+    def remember_scan(
+        self,
+        tenant_id: str,
+        fingerprint: int | None,
+        recognition: ProductRecognitionResponse | None,
+    ) -> str | None:
+        """scan_id carrying what the scan saw, until it is confirmed."""
+        label = label_key(recognition) if recognition is not None else None
+        if fingerprint is None and label is None:
+            return None
+        return encode_scan_id(
+            ScanObservation(tenant_id=tenant_id, fingerprint=fingerprint, label=label),
+            self._pending_ttl_seconds,
+        )
+
+    def confirm(
+        self, tenant_id: str, scan_id: str, product_id: str, supabase=None
+    ) -> bool:
+        """Learn that scan_id showed product_id. False if invalid/expired."""
+        observation = decode_scan_id(scan_id)
+        if observation is None or observation.tenant_id != tenant_id:
+            self.stats.record("expired")
+            return False
+
+        keys: list[tuple[str, str]] = []
+        if observation.fingerprint is not None:
+            keys.append((IMAGE_KEY, _fingerprint_key(observation.fingerprint)))
+        if observation.label is not None:
+            keys.append((LABEL_KEY, observation.label))
+
+        memory = self._tenant(tenant_id, supabase)
+        with self._lock:
+            for kind, key in keys:
+                memory.add(kind, key, product_id)
+        self.stats.record("confirmations")
+
+        if self._persist:
+            confirmed_at = datetime.now(timezone.utc).isoformat()
+            try:
+                (supabase or get_supabase()).table("recognition_memory").upsert(
+                    [
+                        {
+                            "user_id": tenant_id,
+                            "kind": kind,
+                            "key": key,
+                            "product_id": product_id,
+                            "confirmed_at": confirmed_at,
+                        }
+                        for kind, key in keys
+                    ],
+                    on_conflict="user_id,kind,key",
+                ).execute()
+            except Exception as e:
+                logger.warning(f"Recognition memory persist failed: {e}")
+        return True
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            counts = {
+                "tenants": len(self._tenants),
+                "entries": sum(len(m) for _, m in self._tenants.values()),
+            }
+        return {**counts, **self.stats.snapshot()}
+
+
+_memory: RecognitionMemory | None = None
+_memory_lock = threading.Lock()
+
+
+def get_recognition_memory() -> RecognitionMemory | None:
+    """Process-wide recognition memory, None when disabled."""
+    global _memory
+    if not settings.RECOGNITION_MEMORY_ENABLED:
+        return None
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                _memory = RecognitionMemory(
+                    persist=settings.RECOGNITION_MEMORY_PERSIST,
+                    max_entries=settings.RECOGNITION_MEMORY_MAX_ENTRIES,
+                    ttl_seconds=settings.RECOGNITION_MEMORY_TTL_SECONDS,
+                    pending_ttl_seconds=settings.RECOGNITION_MEMORY_PENDING_TTL_SECONDS,
+                )
+    return _memory
+
+
+def recognition_memory_stats() -> dict[str, Any]:
+    memory = get_recognition_memory()
+    return memory.snapshot() if memory is not None else {"enabled": False}
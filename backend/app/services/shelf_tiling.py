@@ -0,0 +1,291 @@
+"""
+Shelf scan tiling.
+
+Cooler and shelf photos hold dozens of small labels. Sent as one image,
+dense shelves time out or come back with products missing. Above a size
+threshold the normalized photo is cut into overlapping tiles, the tiles are
+recognized concurrently and the results merged back into one list.
+
+Features:
+- Overlapping grid, so a product on a seam is whole in at least one tile
+- Duplicates across seams merged by brand/name/size similarity
+- Per-tile latency and merge counters
+"""
+
+import logging
+import math
+import re
+import threading
+import unicodedata
+from collections import deque
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from io import BytesIO
+
+from app.core.config import settings
+from app.schemas.gemini_responses import ProductRecognitionResponse
+from app.services.image_preprocessing import OUTPUT_MIME_TYPES, NormalizedImage
+
+logger = logging.getLogger(__name__)
+
+Box = tuple[int, int, int, int]  # left, top, right, bottom
+
+# Fields a merged product takes from a less confident duplicate when missing
+_FILL_FIELDS = ("variant", "size_ml", "size_display", "packaging", "barcode")
+
+
+@dataclass
+class ImageTile:
+    """One cut-out of a shelf photo, encoded for upload."""
+
+    index: int
+    box: Box
+    data: bytes
+    mime_type: str
+
+
+@dataclass
+class TileTiming:
+    """Outcome of recognizing one tile."""
+
+    index: int
+    box: Box
+    latency_ms: float
+    products: int
+    error: str | None = None
+
+    def as_dict(self) -> dict:
+        return {
+            "index": self.index,
+            "box": list(self.box),
+            "latency_ms": self.latency_ms,
+            "products": self.products,
+            "error": self.error,
+        }
+
+
+class _TilingStats:
+    def __init__(self, window: int = 500):
+        self._lock = threading.Lock()
+        self.scans = 0
+        self.tiled_scans = 0
+        self.tiles = 0
+        self.tile_errors = 0
+        self.duplicates_merged = 0
+        self._latencies: deque[float] = deque(maxlen=window)
+
+    def record_scan(self, timings: list[TileTiming], merged: int) -> None:
+        with self._lock:
+            self.scans += 1
+            if not timings:
+                return
+            self.tiled_scans += 1
+            self.tiles += len(timings)
+            self.tile_errors += sum(1 for t in timings if t.error)
+            self.duplicates_merged += merged
+            self._latencies.extend(t.latency_ms for t in timings)
+
+    def snapshot(self) -> dict[str, int | float | None]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "enabled": settings.SHELF_TILING_ENABLED,
+                "scans": self.scans,
+                "tiled_scans": self.tiled_scans,
+                "tiles": self.tiles,
+                "tile_errors": self.tile_errors,
+                "duplicates_merged": self.duplicates_merged,
+                "tile_latency_p50_ms": _percentile(latencies, 0.5),
+                "tile_latency_p95_ms": _percentile(latencies, 0.95),
+            }
+
+
+def _percentile(samples: list[float], q: float) -> float | None:
+    if not samples:
+        return None
+    return round(samples[min(len(samples) - 1, int(q * len(samples)))], 1)
+
+
+_stats = _TilingStats()
+
+
+def tiling_stats() -> dict[str, int | float | None]:
+    """Tiling and per-tile latency counters since process start."""
+    return _stats.snapshot()
+
+
+def record_shelf_scan(timings: list[TileTiming], merged: int = 0) -> None:
+    _stats.record_scan(timings, merged)
+
+
+def _tile_starts(length: int, tile: int, overlap: int) -> list[int]:
+    """Evenly spaced tile offsets covering 0..length with at least `overlap`."""
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - overlap) / (tile - overlap))
+    step = (length - tile) / (count - 1)
+    return [round(i * step) for i in range(count)]
+
+
+def tile_grid(width: int, height: int) -> list[Box]:
+    """
+    Overlapping tile boxes for an image, row by row.
+
+    Returns a single box when the image is below SHELF_TILING_MIN_EDGE.
+    Tiles grow until the grid fits into SHELF_TILE_MAX_TILES.
+    """
+    if max(width, height) < settings.SHELF_TILING_MIN_EDGE:
+        return [(0, 0, width, height)]
+
+    tile = settings.SHELF_TILE_SIZE
+    overlap_share = min(max(settings.SHELF_TILE_OVERLAP, 0.0), 0.5)
+    while True:
+        overlap = int(tile * overlap_share)
+        xs = _tile_starts(width, tile, overlap)
+        ys = _tile_starts(height, tile, overlap)
+        if len(xs) * len(ys) <= max(1, settings.SHELF_TILE_MAX_TILES):
+            break
+        tile = int(tile * 1.25)
+
+    return [
+        (x, y, min(x + tile, width), min(y + tile, height)) for y in ys for x in xs
+    ]
+
+
+def split_into_tiles(image: NormalizedImage) -> list[ImageTile]:
+    """
+    Cut a normalized shelf photo into overlapping tiles.
+
+    Returns an empty list when tiling is disabled, the photo is small enough
+    to send whole, or it can't be decoded - the caller then sends the
+    photo as is.
+    """
+    if not settings.SHELF_TILING_ENABLED or not image.data:
+        return []
+
+    try:
+        from PIL import Image, ImageOps
+    except Exception as exc:
+        logger.warning("Pillow not available for shelf tiling: %s", exc)
+        return []
+
+    output_format = settings.IMAGE_OUTPUT_FORMAT.upper()
+    if output_format not in OUTPUT_MIME_TYPES:
+        output_format = "JPEG"
+
+    tiles: list[ImageTile] = []
+    try:
+        with Image.open(BytesIO(image.data)) as source:
+            decoded = ImageOps.exif_transpose(source)
+            if decoded.mode != "RGB":
+                decoded = decoded.convert("RGB")
+            boxes = tile_grid(*decoded.size)
+            if len(boxes) < 2:
+                return []
+            for index, box in enumerate(boxes):
+                buffer = BytesIO()
+                decoded.crop(box).save(
+                    buffer, format=output_format, quality=settings.IMAGE_QUALITY
+                )
+                tiles.append(
+                    ImageTile(
+                        index=index,
+                        box=box,
+                        data=buffer.getvalue(),
+                        mime_type=OUTPUT_MIME_TYPES[output_format],
+                    )
+                )
+            width, height = decoded.size
+    except Exception as exc:
+        logger.warning("Shelf tiling failed, sending whole photo: %s", exc)
+        return []
+
+    logger.info(f"Shelf photo {width}x{height} split into {len(tiles)} tiles")
+    return tiles
+
+
+def _normalize_text(value: str | None) -> str:
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKD", value.lower())
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", value).split())
+
+
+def _normalize_size(value: str | None) -> str:
+    return re.sub(r"\s+", "", (value or "").lower().replace(",", "."))
+
+
+def _similar(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    return SequenceMatcher(None, a, b).ratio() >= settings.SHELF_MERGE_SIMILARITY
+
+
+def is_same_product(
+    a: ProductRecognitionResponse, b: ProductRecognitionResponse
+) -> bool:
+    """Whether two recognitions from neighbouring tiles describe one product."""
+    if a.barcode and b.barcode:
+        return a.barcode == b.barcode
+
+    if a.size_ml and b.size_ml:
+        if a.size_ml != b.size_ml:
+            return False
+    elif a.size_display and b.size_display:
+        if _normalize_size(a.size_display) != _normalize_size(b.size_display):
+            return False
+
+    brand_a, brand_b = _normalize_text(a.brand), _normalize_text(b.brand)
+    if brand_a and brand_b and not _similar(brand_a, brand_b):
+        return False
+
+    name_a = _normalize_text(f"{a.product_name} {a.variant or ''}")
+    name_b = _normalize_text(f"{b.product_name} {b.variant or ''}")
+    return bool(name_a and name_b) and _similar(name_a, name_b)
+
+
+def _merge_group(
+    group: list[ProductRecognitionResponse],
+) -> ProductRecognitionResponse:
+    best = max(group, key=lambda result: result.confidence)
+    merged = best.model_copy()
+    for field in _FILL_FIELDS:
+        if getattr(merged, field) is None:
+            for other in group:
+                if getattr(other, field) is not None:
+                    setattr(merged, field, getattr(other, field))
+                    break
+    if not merged.brand:
+        merged.brand = next((r.brand for r in group if r.brand), "")
+    return merged
+
+
+def merge_tile_results(
+    tile_results: list[list[ProductRecognitionResponse]],
+) -> tuple[list[ProductRecognitionResponse], int]:
+    """
+    Merge per-tile product lists into one, in tile (reading) order.
+
+    Entries of the same tile are never merged with each other - the model
+    already lists each product once per image.
+
+    Returns:
+        Tuple of (merged products, number of duplicates folded in)
+    """
+    groups: list[list[ProductRecognitionResponse]] = []
+    group_tiles: list[set[int]] = []
+    for tile_index, results in enumerate(tile_results):
+        for result in results:
+            for group, tiles in zip(groups, group_tiles):
+                if tile_index not in tiles and is_same_product(group[0], result):
+                    group.append(result)
+                    tiles.add(tile_index)
+                    break
+            else:
+                groups.append([result])
+                group_tiles.append({tile_index})
+
+    merged = [_merge_group(group) for group in groups]
+    duplicates = sum(len(group) - 1 for group in groups)
+    return merged, duplicates
@@ -6,12 +6,14 @@ Based on CrewChecker implementation for consistency.
 
 import logging
 import mimetypes
+import shutil
 import uuid
 from datetime import datetime
 from pathlib import Path
 from typing import BinaryIO, Optional
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError
 
@@ -125,6 +127,48 @@ class StorageService:
         else:
             return await self._upload_local(file_bytes, key)
 
+    def upload_stream(
+        self, file: BinaryIO, key: str, content_type: str | None = None
+    ) -> str:
+        """
+        Upload a file-like object without reading it into memory.
+
+        Blocking (run it in a thread). R2 uploads go out in multipart
+        chunks of STORAGE_UPLOAD_CHUNK_BYTES, one chunk in memory at a time.
+
+        Returns:
+            Public URL for the uploaded file
+        """
+        if not content_type:
+            content_type, _ = mimetypes.guess_type(key)
+            content_type = content_type or "application/octet-stream"
+
+        if self.provider == "r2":
+            chunk = settings.STORAGE_UPLOAD_CHUNK_BYTES
+            try:
+                self._s3_client.upload_fileobj(
+                    file,
+                    settings.R2_BUCKET_NAME,
+                    key,
+                    ExtraArgs={"ContentType": content_type},
+                    Config=TransferConfig(
+                        multipart_threshold=chunk,
+                        multipart_chunksize=chunk,
+                        use_threads=False,
+                    ),
+                )
+            except ClientError as e:
+                logger.error(f"R2 upload failed: {e}")
+                raise
+            logger.info(f"Uploaded to R2: {key}")
+        else:
+            file_path = self._local_base / key
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            with file_path.open("wb") as target:
+                shutil.copyfileobj(file, target)
+            logger.info(f"Saved locally: {file_path}")
+        return self.get_url(key)
+
     async def _upload_r2(self, content: bytes, key: str, content_type: str) -> str:
         """Upload to Cloudflare R2."""
         try:
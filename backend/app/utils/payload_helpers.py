@@ -0,0 +1,44 @@
+"""
+Payload Helper Utilities for uploaded files.
+
+Endpoints accept files either as multipart upload (raw bytes) or as base64
+in a JSON body. Base64 is decoded exactly once, here, so services only ever
+see raw bytes.
+"""
+
+import base64
+import binascii
+
+from fastapi import HTTPException, status
+
+
+def strip_data_prefix(value: str) -> str:
+    """Strip data URL prefix (``data:image/jpeg;base64,``) from base64 string."""
+    if "," in value:
+        return value.split(",", 1)[1]
+    return value
+
+
+def decode_base64_payload(value: str | None) -> bytes | None:
+    """
+    Decode a base64 JSON field (optionally a data URL) into raw bytes.
+
+    Args:
+        value: Base64 string from the request body
+
+    Returns:
+        Decoded bytes, or None when the field is missing/empty
+
+    Raises:
+        HTTPException: 400 when the value is not valid base64
+    """
+    if not value:
+        return None
+
+    try:
+        return base64.b64decode(strip_data_prefix(value))
+    except (binascii.Error, ValueError) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid base64 payload",
+        ) from exc
@@ -0,0 +1,63 @@
+"""
+Background job worker process.
+
+Runs the durable jobs queued by the API (see app.core.jobs), e.g. invoice
+processing. Start one or more next to the web process:
+
+    python -m app.worker
+
+SIGTERM/SIGINT stop claiming new jobs; running jobs get
+JOB_SHUTDOWN_GRACE_SECONDS to finish, unfinished ones are picked up by
+another worker once their lease expires.
+"""
+
+import asyncio
+import importlib
+import logging
+import signal
+
+from app.core.config import settings
+from app.core.gemini import get_gemini_client_manager
+from app.core.gemini_context_cache import get_context_cache
+from app.core.gemini_usage import get_usage_registry
+from app.core.jobs import JobWorker, get_job_store
+from app.services.pdf_pages import get_page_renderer
+
+logger = logging.getLogger(__name__)
+
+# Modules that register job handlers and sweeps
+JOB_MODULES = ("app.api.endpoints.invoices",)
+
+
+def load_job_modules() -> None:
+    for module in JOB_MODULES:
+        importlib.import_module(module)
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    load_job_modules()
+    worker = JobWorker(get_job_store(), settings.JOB_WORKER_CONCURRENCY)
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, stopping job worker")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    try:
+        worker.run()
+    finally:
+        # Same shutdown as the API process (app.main lifespan)
+        get_usage_registry().flush()
+        get_context_cache().close()
+        get_page_renderer().close()
+        asyncio.run(get_gemini_client_manager().aclose())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Microbenchmark: per-call overhead of building structured-output configs.
+
+Compares the old path (new ListWrapper class + GenerateContentConfig + SDK
+schema conversion on every call) with the cached registry in app.core.gemini.
+No network calls are made.
+
+Usage (from backend/):
+    python -m scripts.bench_gemini_config [iterations]
+"""
+
+import sys
+import time
+
+from google.genai import _transformers as genai_transformers
+from google.genai import types
+from pydantic import BaseModel
+
+from app.core.gemini import ThinkingLevel, _build_config, _list_wrapper
+from app.schemas.gemini_responses import (
+    InvoiceExtractionResponse,
+    ProductRecognitionResponse,
+)
+
+
+def _uncached_list_config() -> types.GenerateContentConfig:
+    class ListWrapper(BaseModel):
+        items: list[ProductRecognitionResponse]
+
+    return types.GenerateContentConfig(
+        thinking_config=types.ThinkingConfig(thinking_level=ThinkingLevel.MEDIUM.value),
+        response_mime_type="application/json",
+        response_schema=ListWrapper,
+    )
+
+
+def _uncached_invoice_config() -> types.GenerateContentConfig:
+    return types.GenerateContentConfig(
+        thinking_config=types.ThinkingConfig(thinking_level=ThinkingLevel.HIGH.value),
+        response_mime_type="application/json",
+        response_schema=InvoiceExtractionResponse,
+    )
+
+
+def _cached_list_config() -> types.GenerateContentConfig:
+    return _build_config(
+        ThinkingLevel.MEDIUM, _list_wrapper(ProductRecognitionResponse)
+    )
+
+
+def _cached_invoice_config() -> types.GenerateContentConfig:
+    return _build_config(ThinkingLevel.HIGH, InvoiceExtractionResponse)
+
+
+def _per_call_us(build, iterations: int) -> float:
+    """Build the config and run the SDK's request-time schema conversion."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        config = build()
+        genai_transformers.t_schema(None, config.response_schema)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    cases = [
+        ("shelf list", _uncached_list_config, _cached_list_config),
+        ("invoice", _uncached_invoice_config, _cached_invoice_config),
+    ]
+    for name, uncached, cached in cases:
+        cached()  # warm the registry
+        before = _per_call_us(uncached, iterations)
+        after = _per_call_us(cached, iterations)
+        print(
+            f"{name:<12} uncached {before:8.1f} us/call  "
+            f"cached {after:8.1f} us/call  saved {before - after:8.1f} us "
+            f"({before / after:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Live benchmark: HIGH-thinking invoice extraction with and without the
+Gemini context cache for the static invoice prompt.
+
+Runs the same invoice N times with the prefix sent inline, then N times
+served from an explicit context cache, and compares billed input tokens
+and wall time per call. Needs GOOGLE_GEMINI_API_KEY and GEMINI_BACKEND=live;
+every call is a real (billed) request.
+
+Usage (from backend/):
+    python -m scripts.bench_invoice_context_cache invoice.pdf --runs 3
+"""
+
+import argparse
+import mimetypes
+import statistics
+import time
+from pathlib import Path
+
+from app.core.gemini_context_cache import get_context_cache
+from app.core.gemini_usage import get_usage_registry
+from app.services.invoice_extraction import extract_invoice
+
+
+def _run(file_bytes: bytes, mime_type: str, runs: int) -> list[dict]:
+    calls = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        extract_invoice(file_bytes, mime_type)
+        wall = time.perf_counter() - started
+        usage = get_usage_registry().recent(1)[-1]
+        calls.append(
+            {
+                "wall": wall,
+                "input": usage["input_tokens"],
+                "cached": usage["cached_tokens"],
+                "billed_input": usage["input_tokens"] - usage["cached_tokens"],
+                "cost": usage["cost_usd"],
+            }
+        )
+    return calls
+
+
+def _summary(name: str, calls: list[dict]) -> dict[str, float]:
+    summary = {
+        key: statistics.mean(call[key] for call in calls)
+        for key in ("wall", "input", "cached", "billed_input", "cost")
+    }
+    print(
+        f"{name:<8} wall {summary['wall']:6.2f}s  input {summary['input']:7.0f}  "
+        f"cached {summary['cached']:7.0f}  billed input {summary['billed_input']:7.0f}  "
+        f"cost ${summary['cost']:.5f}"
+    )
+    return summary
+
+
+def _wait_for_cache(timeout: float = 30.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if get_context_cache().snapshot()["caches"]:
+            return True
+        time.sleep(0.5)
+    return False
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("invoice", type=Path)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    file_bytes = args.invoice.read_bytes()
+    mime_type = mimetypes.guess_type(args.invoice.name)[0] or "application/pdf"
+    context_cache = get_context_cache()
+
+    try:
+        context_cache.enabled = False
+        inline = _summary("inline", _run(file_bytes, mime_type, args.runs))
+
+        context_cache.enabled = True
+        extract_invoice(file_bytes, mime_type)  # Triggers cache creation
+        if not _wait_for_cache():
+            snapshot = context_cache.snapshot()
+            print(
+                "No context cache was created "
+                f"(create_failures={snapshot['create_failures']}) - "
+                "prefix below the model's minimum or caching unsupported"
+            )
+            return
+        cached = _summary("cached", _run(file_bytes, mime_type, args.runs))
+
+        print(
+            f"saved    wall {inline['wall'] - cached['wall']:6.2f}s  "
+            f"billed input {inline['billed_input'] - cached['billed_input']:7.0f} "
+            f"tokens  cost ${inline['cost'] - cached['cost']:.5f} per call"
+        )
+    finally:
+        context_cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Offline load test for scan and invoice throughput.
+
+Drives the real service functions (preprocessing, cache, scheduler, retries,
+usage accounting) against the synthetic or replay Gemini backend, so no
+network or API key is needed.
+
+Usage (from backend/):
+    GEMINI_BACKEND=synthetic python -m scripts.load_test_gemini \
+        --scans 200 --shelves 20 --invoices 20 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from app.core.config import settings
+from app.core.gemini import get_gemini_scheduler
+from app.core.gemini_backends import get_gemini_backend
+from app.core.gemini_usage import get_usage_registry
+from app.services.invoice_extraction import aextract_invoice
+from app.services.product_recognition import (
+    arecognize_multiple_products,
+    arecognize_product,
+)
+from app.services.shelf_tiling import tiling_stats
+
+CATEGORIES = ["Bier", "Wein", "Spirituosen", "Softdrinks"]
+
+
+def _photo(seed: int, size: tuple[int, int]) -> bytes:
+    """Distinct noisy JPEG roughly the size of a phone photo."""
+    image = Image.effect_noise(size, 20 + seed % 60).convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+async def _timed(kind: str, call, results: list[tuple[str, float, bool]]) -> None:
+    started = time.perf_counter()
+    try:
+        await call
+        ok = True
+    except Exception:
+        ok = False
+    results.append((kind, time.perf_counter() - started, ok))
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run(args: argparse.Namespace) -> None:
+    photos = [
+        _photo(seed, (args.photo_width, args.photo_height))
+        for seed in range(args.distinct_photos)
+    ]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results: list[tuple[str, float, bool]] = []
+
+    async def limited(kind: str, factory) -> None:
+        async with semaphore:
+            await _timed(kind, factory(), results)
+
+    jobs = []
+    for index in range(args.scans):
+        photo = random.choice(photos)
+        jobs.append(
+            limited(
+                "scan",
+                lambda p=photo, i=index: arecognize_product(
+                    p, CATEGORIES, tenant_id=f"tenant-{i % args.tenants}"
+                ),
+            )
+        )
+    for index in range(args.shelves):
+        photo = random.choice(photos)
+        jobs.append(
+            limited(
+                "shelf",
+                lambda p=photo, i=index: arecognize_multiple_products(
+                    p, CATEGORIES, tenant_id=f"tenant-{i % args.tenants}"
+                ),
+            )
+        )
+    for index in range(args.invoices):
+        photo = random.choice(photos)
+        jobs.append(
+            limited(
+                "invoice",
+                lambda p=photo, i=index: aextract_invoice(
+                    p, mime_type="image/jpeg", tenant_id=f"tenant-{i % args.tenants}"
+                ),
+            )
+        )
+    random.shuffle(jobs)
+
+    started = time.perf_counter()
+    await asyncio.gather(*jobs)
+    elapsed = time.perf_counter() - started
+
+    print(f"backend={get_gemini_backend().mode} elapsed={elapsed:.2f}s")
+    for kind in ("scan", "shelf", "invoice"):
+        latencies = [seconds for k, seconds, _ in results if k == kind]
+        if not latencies:
+            continue
+        failures = sum(1 for k, _, ok in results if k == kind and not ok)
+        print(
+            f"{kind:<8} n={len(latencies):<5} "
+            f"throughput={len(latencies) / elapsed:6.1f}/s "
+            f"p50={statistics.median(latencies):6.2f}s "
+            f"p95={_percentile(latencies, 0.95):6.2f}s "
+            f"failures={failures}"
+        )
+    print("scheduler:", get_gemini_scheduler().stats())
+    print("shelf tiling:", tiling_stats())
+    print("usage:", get_usage_registry().snapshot()["total"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scans", type=int, default=100)
+    parser.add_argument("--shelves", type=int, default=10)
+    parser.add_argument("--invoices", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--tenants", type=int, default=5)
+    parser.add_argument("--distinct-photos", type=int, default=20)
+    # Full 12 MP phone photos make preprocessing the bottleneck; start smaller
+    parser.add_argument("--photo-width", type=int, default=1512)
+    parser.add_argument("--photo-height", type=int, default=2016)
+    args = parser.parse_args()
+
+    if settings.GEMINI_BACKEND == "live":
+        parser.error("Set GEMINI_BACKEND=synthetic or replay for load tests")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
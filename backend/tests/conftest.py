@@ -0,0 +1,7 @@
+import os
+
+# Settings are read at import time; tests never talk to these services
+os.environ.setdefault("SECRET_KEY", "test-secret-key-with-at-least-32-chars")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "test-service-key")
+os.environ.setdefault("GOOGLE_GEMINI_API_KEY", "test-gemini-key")
@@ -0,0 +1,91 @@
+import io
+import threading
+import time
+from contextlib import aclosing
+from zipfile import ZipFile
+
+import anyio
+import pytest
+
+from app.core.config import settings
+from app.services.invoice_zip import select_entries, store_entries
+
+
+class FakeStorage:
+    """Records uploads and deletes; each upload takes a moment."""
+
+    def __init__(self):
+        self.uploaded: list[str] = []
+        self.deleted: list[str] = []
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def generate_key(self, user_id, category, filename, include_date=True):
+        with self._lock:
+            self._counter += 1
+            return f"{user_id}/{category}/{self._counter}-{filename}"
+
+    def upload_stream(self, file, key, content_type=None):
+        file.read()
+        time.sleep(0.05)
+        with self._lock:
+            self.uploaded.append(key)
+        return key
+
+    async def delete(self, key):
+        self.deleted.append(key)
+        return True
+
+
+def _zip_file(count: int) -> ZipFile:
+    buffer = io.BytesIO()
+    with ZipFile(buffer, "w") as archive:
+        for index in range(count):
+            archive.writestr(f"invoice-{index}.pdf", b"%PDF-1.4 test")
+    buffer.seek(0)
+    return ZipFile(buffer)
+
+
+@pytest.fixture(autouse=True)
+def upload_concurrency(monkeypatch):
+    monkeypatch.setattr(settings, "INVOICE_ZIP_UPLOAD_CONCURRENCY", 3)
+
+
+def test_store_entries_yields_every_entry():
+    storage = FakeStorage()
+    zip_file = _zip_file(5)
+    entries, _ = select_entries(zip_file)
+
+    async def run():
+        async with aclosing(store_entries(zip_file, entries, storage, "u1")) as items:
+            return [item async for item in items]
+
+    results = anyio.run(run)
+
+    assert len(results) == 5
+    assert all(item.ok for item in results)
+    assert storage.deleted == []
+
+
+def test_closing_early_deletes_uploads_the_caller_never_received():
+    storage = FakeStorage()
+    zip_file = _zip_file(6)
+    entries, _ = select_entries(zip_file)
+
+    async def run():
+        received = []
+        async with aclosing(store_entries(zip_file, entries, storage, "u1")) as items:
+            async for item in items:
+                received.append(item.storage_key)
+                # The other uploads are still running in threads
+                break
+        return received
+
+    received = anyio.run(run)
+
+    # Closing waited for the running uploads and deleted them again
+    assert len(storage.uploaded) > len(received)
+    assert set(storage.uploaded) - set(received) <= set(storage.deleted)
+    assert not set(received) & set(storage.deleted)
+    # Entries not started yet were never uploaded
+    assert len(storage.uploaded) < len(entries)
@@ -0,0 +1,251 @@
+import pytest
+
+from app.core import jobs
+from app.core.config import settings
+from app.core.jobs import Job, SqliteJobStore, retry_delay
+
+
+class FakeTime:
+    """Stands in for the time module inside app.core.jobs."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(jobs, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def store(clock):
+    return SqliteJobStore(":memory:")
+
+
+def test_enqueue_reuses_active_job_with_same_dedupe_key(store):
+    first = store.enqueue("invoice", {"n": 1}, dedupe_key="inv-1")
+    second = store.enqueue("invoice", {"n": 2}, dedupe_key="inv-1")
+    other = store.enqueue("invoice", {"n": 3}, dedupe_key="inv-2")
+
+    assert second == first
+    assert other != first
+    assert store.counts()["queued"] == 2
+
+
+def test_enqueue_after_finished_job_creates_new_one(store):
+    first = store.enqueue("invoice", {}, dedupe_key="inv-1")
+    [job] = store.claim("w1", ["invoice"], limit=1, lease_seconds=60)
+    store.complete(job.id, "w1")
+
+    assert store.enqueue("invoice", {}, dedupe_key="inv-1") != first
+
+
+def test_claim_leases_job_to_one_worker(store):
+    store.enqueue("invoice", {"invoice_id": "a"}, user_id="u1")
+
+    [job] = store.claim("w1", ["invoice"], limit=5, lease_seconds=60)
+
+    assert job.payload == {"invoice_id": "a"}
+    assert job.user_id == "u1"
+    assert job.attempts == 1
+    assert store.claim("w2", ["invoice"], limit=5, lease_seconds=60) == []
+    assert store.counts()["running"] == 1
+
+
+def test_claim_skips_other_kinds_and_delayed_jobs(store, clock):
+    store.enqueue("other", {})
+    store.enqueue("invoice", {}, delay_seconds=30)
+
+    assert store.claim("w1", ["invoice"], limit=5, lease_seconds=60) == []
+    clock.advance(31)
+    assert len(store.claim("w1", ["invoice"], limit=5, lease_seconds=60)) == 1
+
+
+def test_expired_lease_is_claimed_again(store, clock):
+    store.enqueue("invoice", {}, max_attempts=3)
+    [first] = store.claim("w1", ["invoice"], limit=1, lease_seconds=60)
+
+    clock.advance(61)
+    [second] = store.claim("w2", ["invoice"], limit=1, lease_seconds=60)
+
+    assert second.id == first.id
+    assert second.attempts == 2
+
+
+def test_expired_lease_on_last_attempt_fails_job(store, clock):
+    store.enqueue("invoice", {}, max_attempts=2)
+    store.claim("w1", ["invoice"], limit=1, lease_seconds=60)
+    clock.advance(61)
+    [job] = store.claim("w2", ["invoice"], limit=1, lease_seconds=60)
+    assert job.final_attempt
+
+    clock.advance(61)
+
+    assert store.claim("w3", ["invoice"], limit=1, lease_seconds=60) == []
+    assert store.counts()["failed"] == 1
+
+
+def test_extend_keeps_lease(store, clock):
+    store.enqueue("invoice", {})
+    [job] = store.claim("w1", ["invoice"], limit=1, lease_seconds=60)
+
+    clock.advance(50)
+    assert store.extend(job.id, "w1", 60)
+    clock.advance(50)
+
+    assert store.claim("w2", ["invoice"], limit=1, lease_seconds=60) == []
+
+
+def test_stale_worker_cannot_complete_reclaimed_job(store, clock):
+    store.enqueue("invoice", {})
+    [job] = store.claim("w1", ["invoice"], limit=1, lease_seconds=60)
+    clock.advance(61)
+    store.claim("w2", ["invoice"], limit=1, lease_seconds=60)
+
+    store.complete(job.id, "w1")
+
+    assert not store.extend(job.id, "w1", 60)
+    assert store.counts()["running"] == 1
+    assert store.counts()["done"] == 0
+
+    store.complete(job.id, "w2")
+    assert store.counts()["done"] == 1
+
+
+def test_retry_requeues_after_delay(store, clock):
+    store.enqueue("invoice", {})
+    [job] = store.claim("w1", ["invoice"], limit=1, lease_seconds=60)
+
+    store.retry(job.id, "w1", delay_seconds=30, error="boom")
+
+    assert store.counts()["queued"] == 1
+    assert store.claim("w1", ["invoice"], limit=1, lease_seconds=60) == []
+    clock.advance(31)
+    [again] = store.claim("w1", ["invoice"], limit=1, lease_seconds=60)
+    assert again.attempts == 2
+
+
+def test_retry_delay_grows_exponentially_up_to_max(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETRY_BASE_DELAY_SECONDS", 10.0)
+    monkeypatch.setattr(settings, "JOB_RETRY_MAX_DELAY_SECONDS", 100.0)
+    monkeypatch.setattr(jobs.random, "uniform", lambda low, high: high)
+
+    assert [retry_delay(attempt) for attempt in range(1, 6)] == [
+        10.0,
+        20.0,
+        40.0,
+        80.0,
+        100.0,
+    ]
+
+
+def test_retry_delay_has_jitter_within_lower_half():
+    for attempt in range(1, 5):
+        ceiling = min(
+            settings.JOB_RETRY_MAX_DELAY_SECONDS,
+            settings.JOB_RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1),
+        )
+        assert ceiling / 2 <= retry_delay(attempt) <= ceiling
+
+
+def test_waiting_seconds_and_worker_activity(store, clock):
+    assert store.waiting_seconds() == 0.0
+    assert not store.worker_active_within(300)
+
+    store.enqueue("invoice", {})
+    clock.advance(400)
+    assert store.waiting_seconds() == pytest.approx(400)
+
+    [job] = store.claim("w1", ["invoice"], limit=1, lease_seconds=60)
+    assert store.worker_active_within(300)
+    store.complete(job.id, "w1")
+    clock.advance(301)
+    assert not store.worker_active_within(300)
+
+
+# --- process_invoice_job lock states ---------------------------------------
+
+
+class FakeQuery:
+    def __init__(self, calls: list):
+        self._calls = calls
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            self._calls.append((name, args))
+            return self
+
+        return record
+
+    def execute(self):
+        # No invoice in a lockable state: the job is a no-op
+        return type("Response", (), {"data": []})()
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.calls: list = []
+
+    def table(self, name):
+        self.calls.append(("table", (name,)))
+        return FakeQuery(self.calls)
+
+
+@pytest.fixture
+def invoices_module(monkeypatch):
+    from app.api.endpoints import invoices
+
+    supabase = FakeSupabase()
+    monkeypatch.setattr(invoices, "get_supabase", lambda: supabase)
+    monkeypatch.setattr(invoices, "get_storage_service", lambda: None)
+    return invoices, supabase
+
+
+def _lock_states(supabase: FakeSupabase) -> list[str]:
+    [states] = [args[1] for name, args in supabase.calls if name == "in_"]
+    return states
+
+
+def _invoice_job(attempts: int, **payload) -> Job:
+    return Job(
+        id="job-1",
+        kind="invoice.process",
+        payload={"invoice_id": "inv-1", "user_id": "u1", **payload},
+        attempts=attempts,
+        max_attempts=5,
+    )
+
+
+def test_first_attempt_does_not_take_over_processing(invoices_module):
+    invoices, supabase = invoices_module
+
+    invoices.process_invoice_job(_invoice_job(attempts=1))
+
+    assert _lock_states(supabase) == ["pending", "error"]
+
+
+def test_retry_takes_over_processing(invoices_module):
+    invoices, supabase = invoices_module
+
+    invoices.process_invoice_job(_invoice_job(attempts=2))
+
+    assert "processing" in _lock_states(supabase)
+
+
+def test_takeover_payload_takes_over_processing(invoices_module):
+    invoices, supabase = invoices_module
+
+    invoices.process_invoice_job(_invoice_job(attempts=1, takeover=True))
+
+    assert "processing" in _lock_states(supabase)
@@ -0,0 +1,29 @@
+-- Per-call Gemini usage (written by the backend when GEMINI_USAGE_PERSIST=true)
+CREATE TABLE IF NOT EXISTS public.gemini_usage (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    tenant_id UUID REFERENCES auth.users(id) ON DELETE SET NULL,
+    operation TEXT NOT NULL,
+    schema TEXT NOT NULL,
+    thinking_level TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    success BOOLEAN NOT NULL,
+    error TEXT,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    thinking_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    image_bytes INTEGER NOT NULL DEFAULT 0,
+    wall_seconds NUMERIC(10, 4) NOT NULL,
+    cost_usd NUMERIC(14, 8) NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Backend writes with the service key; no end-user access
+ALTER TABLE public.gemini_usage ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_gemini_usage_tenant_created
+    ON public.gemini_usage(tenant_id, created_at);
+
+CREATE INDEX IF NOT EXISTS idx_gemini_usage_operation_created
+    ON public.gemini_usage(operation, created_at);
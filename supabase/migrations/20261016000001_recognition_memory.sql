@@ -0,0 +1,25 @@
+-- Products users confirmed for earlier scans (written by the backend)
+-- kind = 'image': key is the 64-bit dHash of the photo as 16 hex digits
+-- kind = 'label': key is the normalized "brand|name|size" of the recognition
+CREATE TABLE IF NOT EXISTS public.recognition_memory (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL CHECK (kind IN ('image', 'label')),
+    key TEXT NOT NULL,
+    product_id UUID NOT NULL REFERENCES public.products(id) ON DELETE CASCADE,
+    confirmed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE public.recognition_memory ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Owner can manage own recognition memory" ON public.recognition_memory
+    FOR ALL USING (auth.uid() = user_id);
+
+CREATE POLICY "Manager can access owner recognition memory" ON public.recognition_memory
+    FOR ALL USING (user_id = public.get_effective_owner_id());
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_recognition_memory_unique
+    ON public.recognition_memory(user_id, kind, key);
+
+CREATE INDEX IF NOT EXISTS idx_recognition_memory_product
+    ON public.recognition_memory(product_id);
@@ -0,0 +1,31 @@
+-- Learned invoice layouts per supplier (written by the backend)
+-- supplier_key: normalized supplier name as printed on the invoice
+-- template: column roles, header labels and price bases (see invoice_templates.py)
+-- samples: number of user-confirmed invoices with this exact layout
+CREATE TABLE IF NOT EXISTS public.invoice_templates (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    supplier_key TEXT NOT NULL,
+    template JSONB NOT NULL,
+    samples INTEGER NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE public.invoice_templates ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Owner can manage own invoice templates" ON public.invoice_templates
+    FOR ALL USING (auth.uid() = user_id);
+
+CREATE POLICY "Manager can access owner invoice templates" ON public.invoice_templates
+    FOR ALL USING (user_id = public.get_effective_owner_id());
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_invoice_templates_unique
+    ON public.invoice_templates(user_id, supplier_key);
+
+CREATE INDEX IF NOT EXISTS idx_invoice_items_user_raw_text
+    ON public.invoice_items(user_id, raw_text);
+
+-- Layout of a reconciled extraction, kept until the user confirms the invoice
+-- (every item matched); only then it counts towards invoice_templates
+ALTER TABLE public.invoices
+    ADD COLUMN IF NOT EXISTS template_candidate JSONB;
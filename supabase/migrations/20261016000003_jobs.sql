@@ -0,0 +1,129 @@
+-- Durable background jobs (written and claimed by the backend worker)
+-- status: queued -> running (leased until locked_until) -> done | failed
+-- A running job whose lease expired is claimed again by another worker
+CREATE TABLE IF NOT EXISTS public.jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    kind TEXT NOT NULL,
+    user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    dedupe_key TEXT,
+    status TEXT NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_by TEXT,
+    locked_until TIMESTAMPTZ,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMPTZ
+);
+
+-- Backend uses the service key; no end-user access
+ALTER TABLE public.jobs ENABLE ROW LEVEL SECURITY;
+
+-- At most one active job per (kind, dedupe_key), e.g. per invoice
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_dedupe
+    ON public.jobs(kind, dedupe_key)
+    WHERE status IN ('queued', 'running') AND dedupe_key IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_jobs_queued_run_at
+    ON public.jobs(run_at) WHERE status = 'queued';
+
+CREATE INDEX IF NOT EXISTS idx_jobs_running_locked_until
+    ON public.jobs(locked_until) WHERE status = 'running';
+
+CREATE INDEX IF NOT EXISTS idx_jobs_kind_dedupe_created
+    ON public.jobs(kind, dedupe_key, created_at);
+
+-- /health/jobs checks whether any worker finished a job recently
+CREATE INDEX IF NOT EXISTS idx_jobs_finished_at
+    ON public.jobs(finished_at) WHERE finished_at IS NOT NULL;
+
+-- Queue a job; with a dedupe key an active job of that key is reused
+CREATE OR REPLACE FUNCTION public.enqueue_job(
+    p_kind TEXT,
+    p_payload JSONB,
+    p_user_id UUID DEFAULT NULL,
+    p_dedupe_key TEXT DEFAULT NULL,
+    p_max_attempts INTEGER DEFAULT 5,
+    p_delay_seconds DOUBLE PRECISION DEFAULT 0
+) RETURNS UUID AS $$
+DECLARE
+    v_id UUID;
+BEGIN
+    INSERT INTO public.jobs (kind, payload, user_id, dedupe_key, max_attempts, run_at)
+    VALUES (
+        p_kind,
+        COALESCE(p_payload, '{}'::jsonb),
+        p_user_id,
+        p_dedupe_key,
+        p_max_attempts,
+        NOW() + make_interval(secs => p_delay_seconds)
+    )
+    ON CONFLICT (kind, dedupe_key)
+        WHERE status IN ('queued', 'running') AND dedupe_key IS NOT NULL
+        DO NOTHING
+    RETURNING id INTO v_id;
+
+    IF v_id IS NULL THEN
+        SELECT id INTO v_id
+        FROM public.jobs
+        WHERE kind = p_kind
+        AND dedupe_key = p_dedupe_key
+        AND status IN ('queued', 'running');
+    END IF;
+
+    RETURN v_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Lease due jobs (and jobs whose lease expired) to one worker
+CREATE OR REPLACE FUNCTION public.claim_jobs(
+    p_worker_id TEXT,
+    p_kinds TEXT[],
+    p_limit INTEGER,
+    p_lease_seconds INTEGER
+) RETURNS SETOF public.jobs AS $$
+BEGIN
+    -- Lease expired on the last allowed attempt: give up
+    UPDATE public.jobs
+    SET status = 'failed',
+        locked_by = NULL,
+        locked_until = NULL,
+        last_error = COALESCE(last_error, 'Lease expired'),
+        finished_at = NOW(),
+        updated_at = NOW()
+    WHERE kind = ANY(p_kinds)
+    AND status = 'running'
+    AND locked_until < NOW()
+    AND attempts >= max_attempts;
+
+    RETURN QUERY
+    WITH due AS (
+        SELECT id
+        FROM public.jobs
+        WHERE kind = ANY(p_kinds)
+        AND (
+            (status = 'queued' AND run_at <= NOW())
+            OR (status = 'running' AND locked_until < NOW())
+        )
+        ORDER BY run_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE public.jobs j
+    SET status = 'running',
+        attempts = j.attempts + 1,
+        locked_by = p_worker_id,
+        locked_until = NOW() + make_interval(secs => p_lease_seconds),
+        updated_at = NOW()
+    FROM due
+    WHERE j.id = due.id
+    RETURNING j.*;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION public.enqueue_job FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.claim_jobs FROM PUBLIC, anon, authenticated;